@@ -2,37 +2,10 @@
 # Licensed under the MIT license. See LICENSE file on the project webpage for details.
 
 """
-Runtime will load the XBlock class from here.
-"""
-import django
-from django.conf import settings
-import mock
-
-if not settings.configured:
-
-    import sys
-
-    sys.modules['azure_video_pipeline'] = mock.MagicMock()
-    sys.modules['azure_video_pipeline.media_service'] = mock.MagicMock()
-    sys.modules['azure_video_pipeline.utils'] = mock.MagicMock()
-
-    sys.modules['edxval'] = mock.MagicMock()
-    sys.modules['edxval.models'] = mock.MagicMock()
+Azure Media Services xBlock package.
 
-    sys.modules['util'] = mock.MagicMock()
-    sys.modules['util.views'] = mock.MagicMock()
-
-    sys.modules['opaque_keys'] = mock.MagicMock()
-    sys.modules['opaque_keys.edx'] = mock.MagicMock()
-    sys.modules['opaque_keys.edx.keys'] = mock.MagicMock()
-
-    sys.modules['xmodule'] = mock.MagicMock()
-    sys.modules['xmodule.modulestore'] = mock.MagicMock()
-    sys.modules['xmodule.modulestore.django'] = mock.MagicMock()
-
-    settings.configure(
-        LMS_ROOT_URL='http://lms.com'
-    )
-    django.setup()
+The package import is kept free of dependencies: runtime loads the XBlock class from `ams` module
+(see `xblock.v1` entry point), other modules are imported only by the code that uses them.
+"""
 
-from .ams import AMSXBlock  # noqa: F401
+default_app_config = 'azure_media_services.apps.AzureMediaServicesConfig'
@@ -6,43 +6,120 @@ Licensed under the MIT license. See LICENSE file on the project webpage for deta
 
 XBlock to allow for video playback from Azure Media Services
 Built using documentation from: http://amp.azure.net/libs/amp/latest/docs/index.html
+
+edx-platform and `azure_video_pipeline` modules are imported on first use, so that workers
+which never render the block don't pay for loading them.
 """
+from collections import OrderedDict
+import functools
 import logging
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.urlresolvers import NoReverseMatch, reverse
-from django.http import HttpResponseBadRequest
-from edxval.models import Video
-from opaque_keys.edx.keys import UsageKey
-import requests
-from util.views import ensure_valid_usage_key
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http import Http404, HttpResponseBadRequest
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+import six
+from webob import Response
 from xblock.core import XBlock
-from xblock.fields import Boolean, List, Scope, String
+from xblock.exceptions import JsonHandlerError
+from xblock.fields import Boolean, Dict, Float, Integer, List, Scope, String
 from xblock.fragment import Fragment
-from xblockutils.resources import ResourceLoader
 from xblockutils.studio_editable import StudioEditableXBlockMixin
-from xmodule.modulestore.django import modulestore
-
-from .utils import _, AssetsMode
-
-APP_AZURE_VIDEO_PIPELINE = True
-
-try:
-    from azure_video_pipeline.media_service import LocatorTypes
-    from azure_video_pipeline.utils import (
-        get_azure_config, get_media_service_client, get_captions_info, get_video_info
-    )
-except ImportError:
-    APP_AZURE_VIDEO_PIPELINE = False
 
+from . import metrics, search
+from .assets import get_batch_executor, get_executor, get_poster_url, get_video_asset_info
+from .bundle import get_bundle_paths
+from .embed import get_block_embed_settings, get_embed_etag, get_embed_max_age
+from .progress import add_interval, watched_fraction, watched_seconds
+from .resilience import AzureServiceError
+from .resources import load_resource, render_template, STUDENT_VIEW_TEMPLATE, STUDIO_VIEW_TEMPLATE
+from .streaming import get_streaming_sources
+from .tokens import get_protection_token
+from .transcripts import (
+    fetch_transcript_content, fetch_transcript_cues, get_transcript_content_type, get_transcript_cues, iter_gzip,
+    iter_transcript_stream, open_transcript_stream, read_stored_transcript, store_transcript, stored_transcript_exists,
+    stored_transcript_url
+)
+from .utils import _, AssetsMode, azure_video_pipeline_installed, decode_cursor, encode_cursor, get_setting
 
 log = logging.getLogger(__name__)
-loader = ResourceLoader(__name__)
 
 # According to edx-platform vertical xblocks
 CLASS_PRIORITY = ['video']
 
+STREAM_VIDEO_STATUSES = ["file_complete", "file_encrypted"]
+STREAM_VIDEOS_PAGE_SIZE = 50
+STREAM_VIDEOS_MAX_PAGE_SIZE = 200
+VIDEO_INFO_MAX_BATCH_SIZE = 500
+# Version of the precomputed render context, contexts of other versions are rebuilt on render:
+RENDER_CONTEXT_VERSION = 3
+
+# Note: DO NOT USE the "latest" folder in production, but specify a version from https://aka.ms/ampchangelog .
+# This allows us to run a test pass prior to ingesting later versions.
+AMP_SCRIPT_URL = '//amp.azure.net/libs/amp/2.1.5/azuremediaplayer.min.js'
+AMP_CSS_URL = '//amp.azure.net/libs/amp/2.1.5/skins/amp-default/azuremediaplayer.min.css'
+# Player is created when its facade comes this number of pixels close to the viewport:
+PLAYER_FACADE_MARGIN = 200
+
+# Client request headers passed to the transcript source and source response headers passed back by the proxy:
+TRANSCRIPT_PROXY_REQUEST_HEADERS = ('Range', 'If-None-Match', 'If-Modified-Since')
+TRANSCRIPT_PROXY_RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Content-Range', 'Accept-Ranges', 'Cache-Control')
+TRANSCRIPT_PROXY_STATUSES = (200, 206, 304, 416)
+
+# Player events are sent to `publish_event` in batches, every EVENTS_FLUSH_INTERVAL seconds (0 - immediately):
+EVENTS_FLUSH_INTERVAL = 5
+EVENTS_MAX_BATCH_SIZE = 100
+# Player reports watched segments every PROGRESS_HEARTBEAT_INTERVAL seconds of playback (0 - disabled):
+PROGRESS_HEARTBEAT_INTERVAL = 10
+PROGRESS_MAX_SEGMENTS = 100
+# Progress events are published when the watched part of the video passes these percents:
+PROGRESS_MILESTONES = (25, 50, 75)
+# The block is completed when this part of the video is watched:
+COMPLETION_THRESHOLD = 0.95
+
+
+def instrumented(kind):
+    """
+    Report duration of the decorated xBlock view or handler, labeled with its name and the course organization.
+
+    :param kind: metric name and the label the method name is reported with ('view' or 'handler')
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with metrics.timed(kind, org=self.location.org, **{kind: func.__name__}):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ReplacedDict(Dict):
+    """
+    Dict field which is only replaced as a whole, never changed in place.
+
+    Mutable fields are deep copied on the first read to track in-place changes; values of this field aren't,
+    so reading a large precomputed value costs nothing.
+    """
+
+    MUTABLE = False
+
+
+class ProgressCompletion(object):
+    """
+    Class attribute telling whether the block publishes completion itself, read by the completion API.
+
+    Completion is published when the video is watched (see `AMSXBlock.report_progress`) if the player reports
+    progress. When progress tracking is disabled the runtime marks the block complete on view.
+    """
+
+    def __get__(self, instance, owner):
+        return bool(get_setting('PROGRESS_HEARTBEAT_INTERVAL', PROGRESS_HEARTBEAT_INTERVAL))
+
 
 @XBlock.needs('i18n')
 class AMSXBlock(StudioEditableXBlockMixin, XBlock):
@@ -51,6 +128,7 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
     """
 
     RESOURCE = 'https://rest.media.azure.net'
+    has_custom_completion = ProgressCompletion()
 
     display_name = String(
         display_name=_("Display Name"),
@@ -73,6 +151,21 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         default="",
         scope=Scope.settings
     )
+    # Streaming sources (DASH, Smooth, HLS) of the video URL, see `streaming.get_streaming_sources`:
+    video_sources = List(
+        default=[],
+        scope=Scope.settings
+    )
+    # Learner independent part of the student view context, precomputed on save (see `get_render_context`):
+    render_context = ReplacedDict(
+        default={},
+        scope=Scope.settings
+    )
+    # Video thumbnail from the Azure asset files, see `resolve_poster_url`:
+    poster_url = String(
+        default="",
+        scope=Scope.settings
+    )
     # Ultimately this should come via some secure means, but this is OK for a PoC
     verification_key = String(
         display_name=_("Verification Key"),
@@ -115,6 +208,11 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         default=[],
         scope=Scope.settings
     )
+    # Caption source URL -> storage name of the transcript copy (see `transcripts.store_transcript`):
+    stored_transcripts = Dict(
+        default={},
+        scope=Scope.settings
+    )
     transcripts_enabled = Boolean(
         display_name=_("Transcripts enabled"),
         help=_("Transcripts switch"),
@@ -139,6 +237,24 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         scope=Scope.settings
     )
 
+    # Merged watched intervals of the video, see `progress.add_interval`:
+    watched_intervals = List(
+        default=[],
+        scope=Scope.user_state
+    )
+    watched_duration = Float(
+        default=0.0,
+        scope=Scope.user_state
+    )
+    progress_milestone = Integer(
+        default=0,
+        scope=Scope.user_state
+    )
+    watched_completed = Boolean(
+        default=False,
+        scope=Scope.user_state
+    )
+
     share = String(
         display_name=_("Share the video"),
         values=(
@@ -160,22 +276,24 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         'edx_video_id', 'caption_ids'
     )
 
+    @instrumented('view')
     def studio_view(self, context):
         """
         Render a form for editing this XBlock.
         """
-        try:
-            azure_config = get_azure_config(self.location.org) if APP_AZURE_VIDEO_PIPELINE else {}
-        except ImproperlyConfigured:
-            azure_config = {}
-        list_stream_videos = []
+        azure_config = {}
+        if azure_video_pipeline_installed():
+            from azure_video_pipeline.utils import get_azure_config
 
-        if azure_config:
-            list_stream_videos = self.get_list_stream_videos()
+            try:
+                azure_config = get_azure_config(self.location.org)
+            except ImproperlyConfigured:
+                pass
+        # Available stream videos are loaded page by page with `get_stream_videos` handler.
         context = {
             'fields': [],
             'has_azure_config': len(azure_config) != 0,
-            'list_stream_videos': list_stream_videos,
+            'stream_video_statuses': STREAM_VIDEO_STATUSES,
             'edx_video_id': self.edx_video_id,
             'caption_ids': self.caption_ids
         }
@@ -197,35 +315,96 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             field_info = self._make_field_info(field_name, field)
             if field_info is not None:
                 context["fields"].append(field_info)
-        fragment.content = loader.render_django_template('templates/studio_edit.html', context)
-        fragment.add_css(loader.load_unicode('public/css/studio.css'))
-        fragment.add_javascript(loader.load_unicode('static/js/studio_edit.js'))
+        fragment.content = render_template(STUDIO_VIEW_TEMPLATE, context)
+        fragment.add_css(load_resource('public/css/studio.css'))
+        fragment.add_javascript(load_resource('static/js/studio_edit.js'))
         fragment.initialize_js('StudioEditableXBlockMixin')
         return fragment
 
+    @XBlock.handler
+    def submit_studio_edits(self, request, suffix=''):
+        """
+        Save the Studio edits and precompute the render context of the saved fields (see `get_render_context`).
+        """
+        response = super(AMSXBlock, self).submit_studio_edits(request, suffix)
+        if response.status_code == 200:
+            self.render_context = self.build_render_context()
+        return response
+
+    def build_render_context(self):
+        """
+        Return the learner independent part of the student view context and the player JS arguments.
+
+        The context is built for the block usage id, which is kept in it. The embed player path is resolved
+        for shared blocks only. Storage URLs of the transcripts copies are not included: signed storage URLs expire.
+        """
+        transcripts_enabled = bool(self.transcripts_enabled and self.captions)
+        video_sources = self.get_video_sources()
+        return {
+            'version': RENDER_CONTEXT_VERSION,
+            'usage_id': six.text_type(self.scope_ids.usage_id),
+            'video_url': self.video_url,
+            'video_sources': video_sources,
+            'poster_url': self.poster_url,
+            'protection_type': self.protection_type,
+            'transcripts_enabled': transcripts_enabled,
+            'download_url': self.download_url,
+            'assets_download': self.assets_download in [AssetsMode.edx, AssetsMode.combined],
+            'embed_path': self.get_embed_path() if self.share != 'off' else None,
+            'json_args': {
+                'transcripts_enabled': transcripts_enabled,
+                'video_download_uri': self.download_url,
+                'assets_download': self.assets_download in [AssetsMode.amp, AssetsMode.combined],
+                'video_url': self.video_url,
+                'video_sources': video_sources,
+                'protection_type': self.protection_type,
+            },
+        }
+
+    def get_render_context(self):
+        """
+        Return the render context precomputed on save, build it if it wasn't saved for this block.
+
+        Settings are copied when a block is duplicated or its course is rerun (and they are exported in OLX with
+        the context), so the context saved for another usage id is not used. Blocks saved before the context was
+        introduced or with an older version of it build the context on every render.
+        """
+        render_context = self.render_context
+        if (render_context.get('version') == RENDER_CONTEXT_VERSION and
+                render_context['usage_id'] == six.text_type(self.scope_ids.usage_id)):
+            return render_context
+        return self.build_render_context()
+
     def _get_context_for_template(self, embedded):
         """
-        Add parameters for the student view.
+        Add parameters for the student view: the precomputed render context and the learner specific ones.
         """
+        render_context = self.get_render_context()
         context = {
-            "video_url": self.video_url,
-            "protection_type": self.protection_type,
-            "captions": self.captions,
-            "transcripts_enabled": bool(self.transcripts_enabled and self.captions),
-            "download_url": self.download_url,
-            "assets_download": self.assets_download in [AssetsMode.edx, AssetsMode.combined],
+            "render_context": render_context,
+            "video_url": render_context['video_url'],
+            "video_sources": render_context['video_sources'],
+            "poster_url": render_context['poster_url'],
+            "player_facade": get_setting('PLAYER_FACADE', True),
+            "protection_type": render_context['protection_type'],
+            "captions": self.get_captions(proxied=bool(self.runtime.user_id)),
+            "transcripts_enabled": render_context['transcripts_enabled'],
+            "download_url": render_context['download_url'],
+            "assets_download": render_context['assets_download'],
             "share": False
         }
 
         if self.protection_type:
+            token = self.get_protection_token()
             context.update({
-                "auth_token": self.verification_key,
+                "auth_token": token and token['token'],
+                "auth_token_refresh_in": token and token['refresh_in'],
             })
 
-        if self.share and not embedded:
-            embed_url = self.get_embed_url()
-            if embed_url and (self.share == 'all' and self.runtime.user_id or
-                              self.share == 'staff_only' and self.runtime.user_is_staff):
+        if not embedded and (self.share == 'all' and self.runtime.user_id or
+                             self.share == 'staff_only' and self.runtime.user_is_staff):
+            embed_url = self.get_embed_url(render_context['embed_path'])
+            if embed_url:
                 context.update({
                     "share": True,
                     "embed_url": embed_url
@@ -233,6 +412,7 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
 
         return context
 
+    @instrumented('view')
     def student_view(self, context):
         """
         Student view of this component.
@@ -243,35 +423,45 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
         fragment = Fragment()
 
         context.update(self._get_context_for_template(context.get('embedded')))
-        fragment.add_content(loader.render_django_template('/templates/player.html', context))
+        fragment.add_content(render_template(STUDENT_VIEW_TEMPLATE, context))
 
-        '''
-        Note: DO NOT USE the "latest" folder in production, but specify a version
-                from https://aka.ms/ampchangelog . This allows us to run a test
-                pass prior to ingesting later versions.
-        '''
-        fragment.add_javascript(loader.load_unicode('node_modules/videojs-vtt.js/lib/vttcue.js'))
+        bundle_paths = get_bundle_paths() if get_setting('STATIC_BUNDLE', True) else {}
+        if bundle_paths:
+            fragment.add_javascript_url(self.runtime.local_resource_url(self, bundle_paths['vttcue.js']))
+        else:
+            fragment.add_javascript(load_resource('node_modules/videojs-vtt.js/lib/vttcue.js'))
 
-        fragment.add_css_url('//amp.azure.net/libs/amp/2.1.5/skins/amp-default/azuremediaplayer.min.css')
-        fragment.add_javascript_url('//amp.azure.net/libs/amp/2.1.5/azuremediaplayer.min.js')
+        # With the player facade Azure Media Player is loaded by the page script once the first player is created:
+        if not context['player_facade']:
+            fragment.add_css_url(AMP_CSS_URL)
+            fragment.add_javascript_url(AMP_SCRIPT_URL)
 
-        fragment.add_javascript(loader.load_unicode('static/js/plugins/transcriptsAmpPlugin.js'))
-        fragment.add_javascript(loader.load_unicode('static/js/player.js'))
+        if bundle_paths:
+            fragment.add_javascript_url(self.runtime.local_resource_url(self, bundle_paths['player.js']))
+            fragment.add_css_url(self.runtime.local_resource_url(self, bundle_paths['player.css']))
+        else:
+            fragment.add_javascript(load_resource('static/js/plugins/transcriptsAmpPlugin.js'))
+            fragment.add_javascript(load_resource('static/js/player.js'))
 
-        fragment.add_css(loader.load_unicode('static/js/plugins/transcriptsAmpPlugin.css'))
-        fragment.add_css(loader.load_unicode('public/css/player.css'))
+            fragment.add_css(load_resource('static/js/plugins/transcriptsAmpPlugin.css'))
+            fragment.add_css(load_resource('public/css/player.css'))
 
         # @TODO: Make sure all fields are well structured/formatted, if it is not correct, then
         # print out an error msg in view rather than just silently failing
         fragment.initialize_js(
             'AzureMediaServicesBlock',
-            json_args={
-                'transcripts_enabled': context['transcripts_enabled'],
-                'transcripts': self.captions,
-                'video_download_uri': context['download_url'],
-                'assets_download': self.assets_download in [AssetsMode.amp, AssetsMode.combined],
-                'user_is_authenticated': bool(self.runtime.user_id)
-            }
+            json_args=dict(
+                context['render_context']['json_args'],
+                transcripts=context['captions'],
+                user_is_authenticated=bool(self.runtime.user_id),
+                protection_token_refresh_in=context.get('auth_token_refresh_in'),
+                events_flush_interval=get_setting('EVENTS_FLUSH_INTERVAL', EVENTS_FLUSH_INTERVAL),
+                events_max_batch_size=get_setting('EVENTS_MAX_BATCH_SIZE', EVENTS_MAX_BATCH_SIZE),
+                progress_heartbeat_interval=get_setting('PROGRESS_HEARTBEAT_INTERVAL', PROGRESS_HEARTBEAT_INTERVAL),
+                amp_script_url=AMP_SCRIPT_URL,
+                amp_css_url=AMP_CSS_URL,
+                player_facade_margin=get_setting('PLAYER_FACADE_MARGIN', PLAYER_FACADE_MARGIN)
+            )
         )
         return fragment
 
@@ -287,51 +477,252 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
                 new_class = higher_class
         return new_class
 
-    def get_embed_url(self):
+    def get_embed_path(self):
         try:
-            embed_url = reverse(
+            return reverse(
                 'embed_player',
                 kwargs={'usage_key_string': unicode(self.scope_ids.usage_id).encode('utf-8')}
             )
-            embed_url = "{}{}?embedded=true".format(settings.LMS_ROOT_URL, embed_url)
         except NoReverseMatch:
-            embed_url = None
-        return embed_url
+            return None
+
+    def get_embed_url(self, embed_path=None):
+        """
+        Return URL of the embedded player, None if the embed player view isn't available.
+
+        :param embed_path: the player path precomputed on save (see `build_render_context`), resolved if not given
+        """
+        embed_path = embed_path or self.get_embed_path()
+        if not embed_path:
+            return None
+        return "{}{}?embedded=true".format(settings.LMS_ROOT_URL, embed_path)
+
+    def get_protection_token(self):
+        """
+        Return the current user's token of the protected video (see `tokens.get_protection_token`).
+
+        :return: dict of `token`, `expires_at` and `refresh_in` or None if the verification key is invalid
+        """
+        try:
+            return get_protection_token(
+                self.runtime.user_id, self.verification_key, self.token_issuer, self.token_scope
+            )
+        except ValueError:
+            log.exception("Protection token can't be issued: %s", self.location)
+            return None
+
+    def get_video_sources(self):
+        """
+        Return streaming sources of the video, precomputed on save (computed if the video URL was changed since).
+        """
+        if any(source['src'] == self.video_url for source in self.video_sources):
+            return self.video_sources
+        return get_streaming_sources(self.video_url)
 
     def get_list_stream_videos(self):
+        from edxval.models import Video
+
         return Video.objects.filter(
             courses__course_id=self.location.course_key,
             courses__is_hidden=False,
-            status__in=["file_complete", "file_encrypted"]
+            status__in=STREAM_VIDEO_STATUSES
         ).order_by('-created', 'edx_video_id')
 
+    def get_captions(self, proxied=False):
+        """
+        Return captions with the sources replaced by URLs of the stored transcripts copies where they exist.
+
+        :param proxied: replace other sources with the `transcript` handler URLs (if `TRANSCRIPT_PROXY` is enabled),
+            so transcripts are loaded from the same origin; handlers are available to signed in users only
+        """
+        proxied = proxied and get_setting('TRANSCRIPT_PROXY', True)
+        stored_transcripts = self.get_stored_transcripts()
+        if not stored_transcripts and not proxied:
+            return self.captions
+
+        captions = []
+        for caption in self.captions:
+            if caption.get('src') in stored_transcripts:
+                caption = dict(caption, src=stored_transcript_url(stored_transcripts[caption['src']]))
+            elif proxied and caption.get('src') and caption.get('srclang'):
+                caption = dict(caption, src=self.get_transcript_proxy_url(caption['srclang']))
+            captions.append(caption)
+        return captions
+
+    def get_stored_transcripts(self):
+        """
+        Return caption source URL -> storage name of the transcripts copies which are in the storage.
+
+        `stored_transcripts` is exported in OLX, so blocks imported from another instance refer to copies
+        missing here; their captions are served from the sources until the block is saved again.
+        """
+        return {src: name for src, name in self.stored_transcripts.items() if stored_transcript_exists(name)}
+
+    def get_transcript_proxy_url(self, language):
+        return self.runtime.handler_url(self, 'transcript', language)
+
+    def get_caption_source(self, language):
+        for caption in self.captions:
+            if caption.get('srclang') == language and caption.get('src'):
+                return caption['src']
+        return None
+
+    def get_stored_transcript_name(self, language):
+        """
+        Return storage name of the stored copy of the caption transcript (None if it isn't stored).
+
+        The copy is found by the caption source rather than by its storage URL: storage URLs may be signed,
+        so the URL a page was rendered with doesn't have to match the current one.
+        """
+        src = self.get_caption_source(language)
+        return src and self.get_stored_transcripts().get(src)
+
+    def read_transcript(self, url, language):
+        """
+        Return content of the caption transcript, reading stored copies from the storage.
+
+        :raise IOError: if the transcript can't be fetched or read
+        """
+        stored_name = self.get_stored_transcript_name(language)
+        if stored_name:
+            return read_stored_transcript(stored_name)
+        return fetch_transcript_content(url, language)
+
+    def store_transcripts(self, captions):
+        """
+        Store copies of the captions transcripts (transcripts stored earlier are reused).
+
+        Transcripts which can't be stored are left to be served from their sources.
+
+        :return: caption source URL -> storage name of the transcript copy
+        """
+        stored = {}
+        pending = {}
+        stored_transcripts = self.get_stored_transcripts()
+        for caption in captions:
+            src = caption.get('src')
+            if not src:
+                continue
+            if src in stored_transcripts:
+                stored[src] = stored_transcripts[src]
+            else:
+                pending[src] = get_executor().submit(store_transcript, src, caption.get('srclang'))
+
+        for src, future in pending.items():
+            try:
+                stored[src] = future.result()
+            except (IOError, ValueError):
+                log.exception("Transcript can't be stored, it is served from the source: %s", src)
+        return stored
+
+    def resolve_poster_url(self, edx_video_id):
+        """
+        Return URL of the video thumbnail from the files of its Azure asset, None if it can't be resolved.
+        """
+        if not edx_video_id or not azure_video_pipeline_installed():
+            return None
+        try:
+            asset_info = get_video_asset_info(self.location.org, edx_video_id)
+        except (IOError, ImproperlyConfigured) as error:
+            log.warning("Poster of %s can't be resolved: %s", edx_video_id, error)
+            return None
+        if not asset_info['asset']:
+            return None
+        return get_poster_url(asset_info['asset_files'], asset_info['locator_sas'])
+
+    def clean_studio_edits(self, data):
+        """
+        Precompute streaming sources and the poster, store copies of the saved captions transcripts.
+
+        See `StudioEditableXBlockMixin.submit_studio_edits`.
+        """
+        if 'video_url' in data:
+            data['video_sources'] = get_streaming_sources(data['video_url'])
+        if 'edx_video_id' in data:
+            data['poster_url'] = self.resolve_poster_url(data['edx_video_id']) or ''
+        if 'captions' in data and get_setting('STORE_TRANSCRIPTS', True):
+            data['stored_transcripts'] = self.store_transcripts(data['captions'])
+
     def drop_http_or_https(self, url):
         """
         In order to avoid mixing HTTP/HTTPS which can cause some warnings to appear in some browsers.
         """
         return url.replace("https:", "").replace("http:", "")
 
-    # Xblock handlers:
-    @XBlock.json_handler
-    def get_captions_and_video_info(self, data, suffix=''):
-        edx_video_id = data.get('edx_video_id')
+    def resolve_captions_and_video_info(self, edx_video_id):
+        """
+        Resolve captions and video info of the Azure encoded asset of the video.
+
+        Media service calls are made with the Azure call policy (see `resilience.call_azure`): while Azure Media
+        Services is degraded an error message is returned without waiting for it.
+
+        :return: dict of `error_message` (empty on success), `video_info` and `captions`
+        """
+        from edxval.models import Video
 
         try:
             video = Video.objects.get(edx_video_id=edx_video_id)
         except Video.DoesNotExist:
-            asset = None
-        else:
-            media_service = get_media_service_client(self.location.org)
-            asset = media_service.get_input_asset_by_video_id(edx_video_id, 'ENCODED')
+            video = None
+
+        return self._resolve_available_captions_and_video_info(video, edx_video_id)
+
+    def resolve_captions_and_video_info_batch(self, edx_video_ids):
+        """
+        Resolve captions and video info of many videos at once.
+
+        `Video` rows are fetched with a single query, videos are resolved concurrently on the batch
+        thread pool (`VIDEO_INFO_BATCH_WORKERS` threads), a failure of one video doesn't fail the others.
+
+        :return: list of `resolve_captions_and_video_info` results with `edx_video_id`, in order of the ids
+        """
+        from edxval.models import Video
+
+        videos = {video.edx_video_id: video for video in Video.objects.filter(edx_video_id__in=edx_video_ids)}
+
+        def resolve(edx_video_id):
+            try:
+                return self._resolve_available_captions_and_video_info(videos.get(edx_video_id), edx_video_id)
+            finally:
+                # Pool threads outlive requests, so their database connections are closed as at a request end:
+                close_old_connections()
+
+        executor = get_batch_executor()
+        pending = [(edx_video_id, executor.submit(resolve, edx_video_id)) for edx_video_id in edx_video_ids]
+        results = []
+        for edx_video_id, future in pending:
+            try:
+                result = future.result()
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Video info of %s can't be resolved", edx_video_id)
+                result = {'error_message': _("Video info can't be resolved."), 'video_info': {}, 'captions': []}
+            result['edx_video_id'] = edx_video_id
+            results.append(result)
+        return results
+
+    def _resolve_available_captions_and_video_info(self, video, edx_video_id):
+        try:
+            return self._resolve_captions_and_video_info(video, edx_video_id)
+        except AzureServiceError as error:
+            log.warning("Video info of %s can't be resolved: %s", edx_video_id, error)
+            return {'error_message': _("Azure Media Services is temporarily unavailable, please try again later."),
+                    'video_info': {},
+                    'captions': []}
+
+    def _resolve_captions_and_video_info(self, video, edx_video_id):
+        from azure_video_pipeline.utils import get_captions_info, get_video_info
+
+        org = self.location.org
+        asset_info = get_video_asset_info(org, edx_video_id) if video is not None else {'asset': None}
 
         error_message = _("Target Video is no longer available on Azure or is corrupted in some way.")
         captions = []
         video_info = {}
         asset_files = None
 
-        if asset:
-            locator_on_demand = media_service.get_asset_locators(asset['Id'], LocatorTypes.OnDemandOrigin)
-            locator_sas = media_service.get_asset_locators(asset['Id'], LocatorTypes.SAS)
+        if asset_info['asset']:
+            locator_on_demand = asset_info['locator_on_demand']
+            locator_sas = asset_info['locator_sas']
 
             if locator_on_demand:
                 error_message = ''
@@ -340,41 +731,353 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
 
                 if locator_sas:
                     path_locator_sas = self.drop_http_or_https(locator_sas.get('Path'))
-                    captions = get_captions_info(video, path_locator_sas)
-                    asset_files = media_service.get_asset_files(asset['Id'])
+                    with metrics.timed('azure.call', method='get_captions_info', org=org):
+                        captions = get_captions_info(video, path_locator_sas)
+                    asset_files = asset_info['asset_files']
                 else:
                     error_message = _("To be able to use captions/transcripts auto-fetching, "
                                       "AMS Asset should be published properly "
                                       "(in addition to 'streaming' locator a 'progressive' "
                                       "locator must be created as well).")
 
-                video_info = get_video_info(video, path_locator_on_demand, path_locator_sas, asset_files)
+                with metrics.timed('azure.call', method='get_video_info', org=org):
+                    video_info = get_video_info(video, path_locator_on_demand, path_locator_sas, asset_files)
 
         return {'error_message': error_message,
                 'video_info': video_info,
                 'captions': captions}
 
+    # Xblock handlers:
     @XBlock.json_handler
-    def publish_event(self, data, suffix=''):
+    @instrumented('handler')
+    def get_captions_and_video_info(self, data, suffix=''):
+        return self.resolve_captions_and_video_info(data.get('edx_video_id'))
+
+    @XBlock.json_handler
+    @instrumented('handler')
+    def get_captions_and_video_info_batch(self, data, suffix=''):
+        """
+        Xblock handler to resolve captions and video info of many videos in one request (course audits, migrations).
+
+        :param data: `edx_video_ids` - list of video ids, up to `VIDEO_INFO_MAX_BATCH_SIZE` of them
+        :param suffix: not using
+        :return: `videos` - per video results in order of the ids (duplicates are dropped), each one has
+            `edx_video_id`, `error_message` (empty on success), `video_info` and `captions`
+        """
+        edx_video_ids = data.get('edx_video_ids')
+        if not isinstance(edx_video_ids, list) or not all(
+                isinstance(edx_video_id, six.string_types) and edx_video_id for edx_video_id in edx_video_ids
+        ):
+            return {'result': 'error', 'message': _('`edx_video_ids` must be a list of video ids')}
+
+        edx_video_ids = list(OrderedDict.fromkeys(edx_video_ids))
+        max_batch_size = get_setting('VIDEO_INFO_MAX_BATCH_SIZE', VIDEO_INFO_MAX_BATCH_SIZE)
+        if len(edx_video_ids) > max_batch_size:
+            return {'result': 'error', 'message': _('At most {} videos can be resolved at once').format(max_batch_size)}
+        return {'result': 'success', 'videos': self.resolve_captions_and_video_info_batch(edx_video_ids)}
+
+    @XBlock.json_handler
+    @instrumented('handler')
+    def get_stream_videos(self, data, suffix=''):
+        """
+        Xblock handler to list course stream videos page by page.
+
+        Keyset pagination over (-created, edx_video_id) ordering is used, so a page costs the same
+        regardless of its position.
+
+        :param data: optional `search` (video name or id part), `status`, `page_size`
+            (clamped to 1..STREAM_VIDEOS_MAX_PAGE_SIZE) and `cursor` (`next_cursor` of the previous page)
+        :param suffix: not using
+        :return: page of videos and the cursor of the next page (None for the last page)
+        :raises JsonHandlerError: 400 if `page_size` isn't an integer
+        """
         try:
-            event_type = data.pop('event_type')
-        except KeyError:
-            return {'result': 'error', 'message': _('Missing event_type in JSON data')}
+            page_size = int(data.get('page_size') or STREAM_VIDEOS_PAGE_SIZE)
+        except (ValueError, TypeError):
+            raise JsonHandlerError(400, _('Invalid page size'))
+        page_size = max(1, min(page_size, STREAM_VIDEOS_MAX_PAGE_SIZE))
+        try:
+            cursor_created, cursor_edx_video_id = decode_cursor(data['cursor']) if data.get('cursor') else (None, None)
+            cursor_created = cursor_created and parse_datetime(cursor_created)
+        except (ValueError, TypeError):
+            return {'result': 'error', 'message': _('Invalid pagination parameters')}
+
+        videos = self.get_list_stream_videos()
+
+        if data.get('status') in STREAM_VIDEO_STATUSES:
+            videos = videos.filter(status=data['status'])
+
+        search = (data.get('search') or '').strip()
+        if search:
+            videos = videos.filter(Q(client_video_id__icontains=search) | Q(edx_video_id__icontains=search))
+
+        if cursor_created:
+            videos = videos.filter(
+                Q(created__lt=cursor_created) | Q(created=cursor_created, edx_video_id__gt=cursor_edx_video_id)
+            )
+
+        page = list(videos.values('edx_video_id', 'client_video_id', 'status', 'created')[:page_size + 1])
+        next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_cursor = encode_cursor(page[-1]['created'].isoformat(), page[-1]['edx_video_id'])
+
+        return {
+            'result': 'success',
+            'videos': [
+                {'edx_video_id': video['edx_video_id'], 'client_video_id': video['client_video_id'],
+                 'status': video['status']}
+                for video in page
+            ],
+            'next_cursor': next_cursor,
+        }
+
+    def _publish_player_event(self, data):
+        """
+        Publish single player event, return False if it isn't a dict with `event_type`.
+        """
+        if not isinstance(data, dict) or 'event_type' not in data:
+            return False
+        event_type = data.pop('event_type')
 
         data['video_url'] = self.video_url
         data['user_id'] = self.scope_ids.user_id
 
         self.runtime.publish(self, event_type, data)
-        return {'result': 'success'}
+        return True
+
+    @XBlock.json_handler
+    @instrumented('handler')
+    def publish_event(self, data, suffix=''):
+        """
+        Xblock handler to publish player events.
+
+        :param data: single event dict or a batch - list of event dicts (each one has its own `event_type`)
+        :param suffix: not using
+        """
+        if not isinstance(data, list):
+            if not self._publish_player_event(data):
+                return {'result': 'error', 'message': _('Missing event_type in JSON data')}
+            return {'result': 'success'}
+
+        max_batch_size = get_setting('EVENTS_MAX_BATCH_SIZE', EVENTS_MAX_BATCH_SIZE)
+        published = len([event for event in data[:max_batch_size] if self._publish_player_event(event)])
+        if published != len(data):
+            log.warning("Player events batch: %s of %s events were not published", len(data) - published, len(data))
+        return {'result': 'success', 'published': published}
+
+    def get_watched_progress(self):
+        """
+        Return how much of the video the user has watched: `watched_seconds`, `watched_fraction` and `completed`.
+        """
+        return {
+            'watched_seconds': watched_seconds(self.watched_intervals),
+            'watched_fraction': watched_fraction(self.watched_intervals, self.watched_duration),
+            'completed': self.watched_completed,
+        }
+
+    def _publish_progress(self, fraction):
+        """
+        Publish progress event once per passed milestone and completion once the video is watched.
+        """
+        milestone = max([percent for percent in PROGRESS_MILESTONES if fraction * 100 >= percent] or [0])
+        if milestone > self.progress_milestone:
+            self.progress_milestone = milestone
+            self.runtime.publish(self, 'edx.video.progress', {
+                'milestone': milestone,
+                'watched_seconds': watched_seconds(self.watched_intervals),
+                'duration': self.watched_duration,
+                'video_url': self.video_url,
+                'user_id': self.scope_ids.user_id,
+            })
+        if not self.watched_completed and fraction >= get_setting('COMPLETION_THRESHOLD', COMPLETION_THRESHOLD):
+            self.watched_completed = True
+            self.runtime.publish(self, 'completion', {'completion': 1.0})
 
     @XBlock.json_handler
+    @instrumented('handler')
+    def report_progress(self, data, suffix=''):
+        """
+        Xblock handler to merge segments watched since the previous player heartbeat into the user's watched intervals.
+
+        Summarized progress and completion events are published instead of every position change.
+
+        :param data: `segments` - list of watched [start, end] (seconds), `duration` - video duration
+        :param suffix: not using
+        :return: watched progress (see `get_watched_progress`)
+        """
+        if not self.runtime.user_id:
+            return {'result': 'error', 'message': _('Progress is tracked for signed in users only')}
+        try:
+            duration = float(data['duration'])
+            segments = [(float(start), float(end)) for start, end in data['segments'][:PROGRESS_MAX_SEGMENTS]]
+        except (KeyError, ValueError, TypeError):
+            return {'result': 'error', 'message': _('Invalid watched segments')}
+        # Also rejects NaN and infinite durations:
+        if not 0 < duration < float('inf'):
+            return {'result': 'error', 'message': _('Invalid video duration')}
+
+        intervals = list(self.watched_intervals)
+        for start, end in segments:
+            if 0 <= start < end:
+                add_interval(intervals, start, min(end, duration))
+        self.watched_intervals = intervals
+        self.watched_duration = duration
+
+        self._publish_progress(watched_fraction(intervals, duration))
+        return dict(self.get_watched_progress(), result='success')
+
+    @XBlock.json_handler
+    @instrumented('handler')
+    def refresh_protection_token(self, data, suffix=''):
+        """
+        Xblock handler to get a new protection token before the current one expires, without page reload.
+
+        :return: token, its expiration time and the number of seconds till it should be refreshed
+        """
+        token = self.get_protection_token() if self.protection_type else None
+        if token is None:
+            return {'result': 'error', 'message': _('Protection token is not available')}
+        return dict(token, result='success')
+
+    @XBlock.json_handler
+    @instrumented('handler')
+    def search_transcripts(self, data, suffix=''):
+        """
+        Xblock handler to search transcripts of the course videos available to the user (see `search.search`).
+
+        :param data: `query`, optional `language` and `limit` (number of returned cues)
+        :param suffix: not using
+        :return: matching cues with their block usage id and start/end time, so the player can seek to them
+        :raises JsonHandlerError: 400 if `query` isn't a string
+        """
+        query = data.get('query') or ''
+        if not isinstance(query, six.string_types):
+            raise JsonHandlerError(400, _('Invalid search query'))
+        query = query.strip()
+        if not query:
+            return {'result': 'error', 'message': _('Missing search query')}
+        try:
+            limit = min(int(data.get('limit') or search.DEFAULT_SEARCH_RESULTS_LIMIT), search.MAX_SEARCH_RESULTS_LIMIT)
+        except (ValueError, TypeError):
+            return {'result': 'error', 'message': _('Invalid results limit')}
+
+        try:
+            matches = search.search(
+                self.location.course_key, query, data.get('language'), limit, self.get_block_access_check()
+            )
+        except (IOError, ValueError):
+            log.exception("Transcripts search index of %s can't be read", self.location.course_key)
+            return {'result': 'error', 'message': _('Transcripts search is not available')}
+        return {'result': 'success', 'usage_id': u'{}'.format(self.location), 'matches': matches}
+
+    def get_block_access_check(self):
+        """
+        Return check if the user can access the course block: usage id -> bool.
+
+        LMS access rules (release dates, staff only visibility, cohorts and content groups) are applied to signed
+        in users; elsewhere (e.g. anonymous users, Studio preview) only this block is accessible.
+        """
+        current_usage_id = u'{}'.format(self.location)
+        if not self.runtime.user_id or not hasattr(self.runtime, 'get_real_user'):
+            return lambda usage_id: usage_id == current_usage_id
+
+        from lms.djangoapps.courseware.access import has_access
+        from opaque_keys import InvalidKeyError
+        from opaque_keys.edx.keys import UsageKey
+        from xmodule.modulestore.django import modulestore
+        from xmodule.modulestore.exceptions import ItemNotFoundError
+
+        user = self.runtime.get_real_user(self.runtime.anonymous_student_id)
+        store = modulestore()
+
+        def is_accessible(usage_id):
+            if usage_id == current_usage_id:
+                return True
+            try:
+                block = store.get_item(UsageKey.from_string(usage_id))
+            except (InvalidKeyError, ItemNotFoundError):
+                return False
+            return bool(has_access(user, 'load', block, self.location.course_key))
+        return is_accessible
+
+    @XBlock.handler
+    @instrumented('handler')
+    def transcript(self, request, suffix=''):
+        """
+        Xblock handler to stream the caption transcript from its source, so players load it from the same origin.
+
+        The transcript is passed through in chunks and never held in memory; `Range` and conditional requests are
+        passed to the source, full responses are gzip-compressed on the fly if the client accepts it.
+
+        :param request: webob request
+        :param suffix: caption language code
+        :return: webob response streaming the transcript
+        """
+        src = self.get_caption_source(suffix)
+        if src is None:
+            return Response(status=404)
+        stored_transcripts = self.get_stored_transcripts()
+        if src in stored_transcripts:
+            return Response(status=302, location=stored_transcript_url(stored_transcripts[src]))
+
+        headers = {name: request.headers[name] for name in TRANSCRIPT_PROXY_REQUEST_HEADERS if name in request.headers}
+        try:
+            source_response = open_transcript_stream(src, suffix, headers)
+        except IOError:
+            log.exception("Transcript source can't be connected: language [%s]", suffix)
+            return Response(status=502)
+        if source_response.status_code not in TRANSCRIPT_PROXY_STATUSES:
+            log.warning("Transcript source has responded with %s: language [%s]", source_response.status_code, suffix)
+            source_response.close()
+            return Response(status=502)
+
+        return self._make_transcript_proxy_response(request, src, source_response)
+
+    @staticmethod
+    def _make_transcript_proxy_response(request, src, source_response):
+        """
+        Pass the transcript source response to the client (see `transcript` handler).
+        """
+        response = Response(status=source_response.status_code)
+        for name in TRANSCRIPT_PROXY_RESPONSE_HEADERS:
+            if name in source_response.headers:
+                response.headers[name] = source_response.headers[name]
+        response.headers['Vary'] = 'Accept-Encoding'
+        if source_response.status_code not in (200, 206):
+            source_response.close()
+            del response.content_type
+            return response
+
+        response.headers['Content-Type'] = get_transcript_content_type(
+            src, source_response.headers.get('Content-Type')
+        )
+        chunks = iter_transcript_stream(source_response)
+        # Ranges are byte ranges of the not compressed transcript:
+        if source_response.status_code == 200 and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response.headers['Content-Encoding'] = 'gzip'
+            response.app_iter = iter_gzip(chunks)
+        else:
+            response.app_iter = chunks
+            # `requests` decodes compressed sources, so their length is unknown:
+            if 'Content-Length' in source_response.headers and 'Content-Encoding' not in source_response.headers:
+                response.headers['Content-Length'] = source_response.headers['Content-Length']
+        return response
+
+    @XBlock.json_handler
+    @instrumented('handler')
     def fetch_transcript(self, data, _suffix=''):
         """
         Xblock handler to perform actual transcript content fetching.
 
-        :param data: transcript language code and transcript URL
+        Content is served from the transcripts cache when possible (see `transcripts.fetch_transcript_content`),
+        stored transcripts copies are read from the storage.
+        If `format` is 'cues' the transcript is returned parsed into compact cues
+        (`{'start': [...], 'end': [...], 'text': [...]}`) instead of the raw text.
+
+        :param data: transcript language code, transcript URL and optional response format
         :param _suffix: not using
-        :return: transcript's text content
+        :return: transcript's text content or cues
         """
         handler_response = {'result': 'error', 'message': _('Missing required transcript data: `src` and `srcLang`')}
 
@@ -383,13 +1086,25 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             transcript_lang = data.pop('srcLang')
         except KeyError:
             return handler_response
+        if transcript_url == self.get_transcript_proxy_url(transcript_lang):
+            transcript_url = self.get_caption_source(transcript_lang) or transcript_url
 
         failure_message = "Transcript fetching failure: language [{}]".format(transcript_lang)
+        stored_name = self.get_stored_transcript_name(transcript_lang)
         try:
-            response = requests.get(transcript_url)
+            if stored_name:
+                content = read_stored_transcript(stored_name)
+                if data.get('format') == 'cues':
+                    return {'result': 'success', 'cues': get_transcript_cues(content)}
+                return {'result': 'success', 'content': content}
+            if data.get('format') == 'cues':
+                return {
+                    'result': 'success',
+                    'cues': fetch_transcript_cues(transcript_url, transcript_lang)
+                }
             return {
                 'result': 'success',
-                'content': response.content
+                'content': fetch_transcript_content(transcript_url, transcript_lang)
             }
         except IOError:
             log.exception(failure_message)
@@ -401,20 +1116,57 @@ class AMSXBlock(StudioEditableXBlockMixin, XBlock):
             return handler_response
 
 
-@ensure_valid_usage_key
 def embed_player(request, usage_key_string):
-    from lms.djangoapps.courseware.module_render import get_module_by_usage_id
+    """
+    Render the embedded player of the shared block.
+
+    The block share and protection settings are cached per usage key (see `embed.get_block_embed_settings`),
+    so the block is loaded from the modulestore only once, by `render_xblock`. Not protected players shared with
+    all are cacheable by browsers and CDNs and validated with ETag changing on the course publishing.
+    """
+    from util.views import ensure_valid_usage_key
+
+    return ensure_valid_usage_key(_embed_player)(request, usage_key_string)
+
+
+def _embed_player(request, usage_key_string):
     from lms.djangoapps.courseware.views.views import render_xblock
+    from opaque_keys.edx.keys import UsageKey
+    from xmodule.modulestore.django import modulestore
+    from xmodule.modulestore.exceptions import ItemNotFoundError
 
     usage_key = UsageKey.from_string(usage_key_string)
     usage_key = usage_key.replace(course_key=modulestore().fill_in_run(usage_key.course_key))
-    course_key = usage_key.course_key
-    with modulestore().bulk_operations(course_key):
-        block, _ = get_module_by_usage_id(
-            request, unicode(course_key), unicode(usage_key), disable_staff_debug_info=True,
-        )
 
-    if block.share != 'off':
+    try:
+        embed_settings = get_block_embed_settings(usage_key)
+    except ItemNotFoundError:
+        raise Http404("Block is not found.")
+
+    share = embed_settings['share']
+    if share == 'off':
+        return HttpResponseBadRequest("Embed player is not supported.")
+    if share != 'all':
         return render_xblock(request, usage_key_string, check_if_enrolled=False)
+    if embed_settings['protection_type']:
+        # The page holds a protection token issued on render, which expires:
+        response = render_xblock(request, usage_key_string, check_if_enrolled=False)
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+    etag = quote_etag(get_embed_etag(usage_key))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render_xblock(request, usage_key_string, check_if_enrolled=False)
+        if response.status_code != 200:
+            return response
 
-    return HttpResponseBadRequest("Embed player is not supported.")
+    response['ETag'] = etag
+    # Pages of the signed in users may hold user specific content and responses setting cookies (e.g. a new session)
+    # must not be shared, so they are cached by browsers only:
+    if request.user.is_authenticated() or response.cookies or response.has_header('Set-Cookie'):
+        patch_cache_control(response, private=True, max_age=get_embed_max_age())
+    else:
+        patch_cache_control(response, public=True, max_age=get_embed_max_age())
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Django application config: used when `azure_media_services` is added to `INSTALLED_APPS`.
+"""
+from django.apps import AppConfig
+
+
+class AzureMediaServicesConfig(AppConfig):
+    """
+    Connect cache invalidation and transcripts search indexing to the course publishing.
+    """
+
+    name = 'azure_media_services'
+    verbose_name = 'Azure Media Services xBlock'
+
+    def ready(self):
+        from xmodule.modulestore.django import SignalHandler
+
+        from . import embed, search
+
+        SignalHandler.course_published.connect(
+            embed.course_published_handler, dispatch_uid='azure_media_services.embed.course_published'
+        )
+        SignalHandler.course_published.connect(
+            search.course_published_handler, dispatch_uid='azure_media_services.search.course_published'
+        )
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Azure Media Services asset lookups (encoded asset, its locators and files) with caching.
+"""
+import calendar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+import re
+import threading
+import time
+
+from six.moves.urllib.parse import quote
+
+from . import metrics
+from .cache import get_django_cache, make_cache_key, SingleFlight
+from .resilience import call_azure
+from .utils import get_setting
+
+log = logging.getLogger(__name__)
+
+# Lifetime (seconds) of the cached asset and asset files lookups:
+DEFAULT_ASSET_CACHE_TTL = 15 * 60
+# Cached locator is dropped this number of seconds before the locator itself expires:
+LOCATOR_EXPIRATION_MARGIN = 5 * 60
+DEFAULT_AZURE_LOOKUP_WORKERS = 8
+DEFAULT_VIDEO_INFO_BATCH_WORKERS = 8
+# Asset files used as the video poster (thumbnails generated by the encoding preset):
+POSTER_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+_MISSING = object()
+_ODATA_DATE_RE = re.compile(r'^/Date\((-?\d+)\)/$')
+
+_single_flight = SingleFlight()
+_executor = None
+_batch_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return module-level thread pool used to run independent Azure lookups concurrently.
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_setting('AZURE_LOOKUP_WORKERS', DEFAULT_AZURE_LOOKUP_WORKERS)
+                )
+    return _executor
+
+
+def get_batch_executor():
+    """
+    Return module-level thread pool used to resolve videos of batch requests with bounded concurrency.
+
+    Batch tasks wait for the lookups they submit to `get_executor` pool, so they must not run on it.
+    """
+    global _batch_executor
+
+    if _batch_executor is None:
+        with _executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=get_setting('VIDEO_INFO_BATCH_WORKERS', DEFAULT_VIDEO_INFO_BATCH_WORKERS)
+                )
+    return _batch_executor
+
+
+def locator_expires_at(locator):
+    """
+    Return locator expiration time (UNIX timestamp) or None if it is unknown.
+
+    Both ISO 8601 (`2118-06-13T08:48:55.97`) and OData (`/Date(1528879735970)/`) formats are supported.
+    """
+    value = (locator or {}).get('ExpirationDateTime')
+    if not value:
+        return None
+
+    match = _ODATA_DATE_RE.match(value)
+    if match:
+        return int(match.group(1)) / 1000.0
+    try:
+        expires = datetime.strptime(value.rstrip('Z').split('.')[0], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        log.warning("Unknown locator expiration format: %s", value)
+        return None
+    return calendar.timegm(expires.timetuple())
+
+
+def _locator_ttl(locator):
+    ttl = get_setting('ASSET_CACHE_TTL', DEFAULT_ASSET_CACHE_TTL)
+    expires_at = locator_expires_at(locator)
+    if expires_at is not None:
+        ttl = min(ttl, int(expires_at - time.time() - LOCATOR_EXPIRATION_MARGIN))
+    return ttl
+
+
+def _cached_lookup(key, lookup, get_ttl, kind):
+    """
+    Return cached lookup result, otherwise perform the lookup once for all concurrent callers and cache it.
+
+    Empty results are not cached.
+    """
+    cache = get_django_cache()
+    value = cache.get(key, _MISSING)
+    result = 'miss' if value is _MISSING else 'hit'
+    metrics.increment('cache', cache=kind, result=result)
+    metrics.label(cache=result)
+    if value is not _MISSING:
+        return value
+
+    def lookup_and_store():
+        result = lookup()
+        ttl = get_ttl(result)
+        if result and ttl > 0:
+            cache.set(key, result, ttl)
+        return result
+
+    return _single_flight.do(key, lookup_and_store)
+
+
+class _LazyMediaServiceClient(object):
+    """
+    Create media service client on the first lookup cache miss only.
+    """
+
+    def __init__(self, org):
+        """
+        Remember the organization the client is created for.
+        """
+        self.org = org
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        from azure_video_pipeline.utils import get_media_service_client
+
+        with self._lock:
+            if self._client is None:
+                self._client = get_media_service_client(self.org)
+        return self._client
+
+    def call(self, method, *args):
+        """
+        Call the media service client method with the Azure call policy (see `resilience.call_azure`).
+
+        Lookups (`get_*` methods) are idempotent, so they are retried on failures.
+        """
+        with metrics.timed('azure.call', method=method, org=self.org):
+            return call_azure(
+                self.org, method, lambda: getattr(self(), method)(*args), idempotent=method.startswith('get_')
+            )
+
+
+def get_video_asset_info(org, edx_video_id):
+    """
+    Resolve encoded asset of the video along with its locators and files.
+
+    Lookups are cached by `edx_video_id` (and locator type); locators are cached until shortly before
+    they expire. On cache miss the locators and files lookups are performed concurrently.
+
+    :return: dict with `asset`, `locator_on_demand`, `locator_sas` and `asset_files` keys
+        (`asset` is None if there is no encoded asset for the video)
+    :raise resilience.AzureServiceError: if Azure Media Services is unavailable
+    """
+    from azure_video_pipeline.media_service import LocatorTypes
+
+    client = _LazyMediaServiceClient(org)
+    asset_ttl = get_setting('ASSET_CACHE_TTL', DEFAULT_ASSET_CACHE_TTL)
+    info = {'asset': None, 'locator_on_demand': None, 'locator_sas': None, 'asset_files': None}
+
+    info['asset'] = _cached_lookup(
+        make_cache_key('asset', org, edx_video_id),
+        lambda: client.call('get_input_asset_by_video_id', edx_video_id, 'ENCODED'),
+        lambda _asset: asset_ttl,
+        'asset'
+    )
+    if not info['asset']:
+        return info
+
+    asset_id = info['asset']['Id']
+
+    def get_locator(locator_type):
+        return _cached_lookup(
+            make_cache_key('asset_locator', org, edx_video_id, locator_type),
+            lambda: client.call('get_asset_locators', asset_id, locator_type),
+            _locator_ttl,
+            'asset_locator'
+        )
+
+    executor = get_executor()
+    locator_on_demand = executor.submit(get_locator, LocatorTypes.OnDemandOrigin)
+    locator_sas = executor.submit(get_locator, LocatorTypes.SAS)
+    asset_files = executor.submit(
+        _cached_lookup,
+        make_cache_key('asset_files', org, edx_video_id),
+        lambda: client.call('get_asset_files', asset_id),
+        lambda _files: asset_ttl,
+        'asset_files'
+    )
+
+    info.update(
+        locator_on_demand=locator_on_demand.result(),
+        locator_sas=locator_sas.result(),
+        asset_files=asset_files.result(),
+    )
+    return info
+
+
+def invalidate_video_asset_info(org, edx_video_id):
+    """
+    Drop cached lookups of the video (e.g. when the asset was re-published on Azure).
+    """
+    from azure_video_pipeline.media_service import LocatorTypes
+
+    get_django_cache().delete_many([
+        make_cache_key('asset', org, edx_video_id),
+        make_cache_key('asset_locator', org, edx_video_id, LocatorTypes.OnDemandOrigin),
+        make_cache_key('asset_locator', org, edx_video_id, LocatorTypes.SAS),
+        make_cache_key('asset_files', org, edx_video_id),
+    ])
+
+
+def get_poster_url(asset_files, locator_sas):
+    """
+    Return URL of the video thumbnail among the asset files, None if there is none.
+
+    Files are read by the SAS locator: its path is the asset container URL followed by the access signature.
+    Thumbnails are numbered by the encoding preset, so the first one by name is used.
+    """
+    names = sorted(
+        asset_file['Name'] for asset_file in asset_files or []
+        if asset_file.get('Name', '').lower().endswith(POSTER_EXTENSIONS)
+    )
+    if not names or not (locator_sas or {}).get('Path'):
+        return None
+    path, _, signature = locator_sas['Path'].partition('?')
+    url = '{}/{}'.format(path.rstrip('/'), quote(names[0].encode('utf-8')))
+    return '{}?{}'.format(url, signature) if signature else url
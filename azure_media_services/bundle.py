@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Content-hashed static bundles of the student view JS/CSS.
+
+Bundles are built into the package `public/` directory (`make bundle` or
+`python -m azure_media_services.bundle`) and served by URL, so browsers and CDNs cache them across pages.
+A bundle is used only while it matches the current resources, otherwise views fall back to inlining.
+"""
+from __future__ import print_function
+
+import glob
+import hashlib
+import json
+import logging
+import os
+
+import pkg_resources
+
+from .resources import load_resource
+
+log = logging.getLogger(__name__)
+
+BUNDLE_DIR = 'public/bundle'
+MANIFEST_NAME = 'manifest.json'
+# Bundle name -> ordered list of resources it is built from:
+BUNDLES = (
+    # VTTCue polyfill must be loaded before Azure Media Player, the rest of the scripts - after it:
+    ('vttcue.js', (
+        'node_modules/videojs-vtt.js/lib/vttcue.js',
+    )),
+    ('player.js', (
+        'static/js/plugins/transcriptsAmpPlugin.js',
+        'static/js/player.js',
+    )),
+    ('player.css', (
+        'static/js/plugins/transcriptsAmpPlugin.css',
+        'public/css/player.css',
+    )),
+)
+
+_bundle_paths = None
+
+
+def sources_digest(sources):
+    digest = hashlib.md5()
+    for path in sources:
+        digest.update(load_resource(path).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_bundle_content(name, sources):
+    """
+    Concatenate bundle sources and minify the result if minifiers (`rjsmin`, `rcssmin`) are installed.
+    """
+    try:
+        from rcssmin import cssmin
+        from rjsmin import jsmin
+    except ImportError:
+        cssmin = jsmin = None
+
+    if name.endswith('.js'):
+        content = u'\n;\n'.join(load_resource(path) for path in sources)
+        return jsmin(content) if jsmin else content
+    content = u'\n'.join(load_resource(path) for path in sources)
+    return cssmin(content) if cssmin else content
+
+
+def build(output_dir=None):
+    """
+    Build all bundles and their manifest, replacing previously built ones.
+
+    :return: manifest dict: bundle name -> {`file`, `sources_digest`}
+    """
+    output_dir = output_dir or pkg_resources.resource_filename('azure_media_services', BUNDLE_DIR)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    manifest = {}
+    for name, sources in BUNDLES:
+        content = build_bundle_content(name, sources).encode('utf-8')
+        base, extension = os.path.splitext(name)
+        file_name = '{}.{}{}'.format(base, hashlib.md5(content).hexdigest()[:12], extension)
+
+        for outdated in glob.glob(os.path.join(output_dir, '{}.*{}'.format(base, extension))):
+            os.remove(outdated)
+        with open(os.path.join(output_dir, file_name), 'wb') as bundle_file:
+            bundle_file.write(content)
+        manifest[name] = {'file': file_name, 'sources_digest': sources_digest(sources)}
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return manifest
+
+
+def _load_bundle_paths():
+    try:
+        manifest = json.loads(load_resource('{}/{}'.format(BUNDLE_DIR, MANIFEST_NAME)))
+    except (IOError, OSError, ValueError):
+        log.info("Static bundles are not built, resources are inlined.")
+        return {}
+
+    paths = {}
+    for name, sources in BUNDLES:
+        entry = manifest.get(name)
+        if not entry or entry['sources_digest'] != sources_digest(sources):
+            log.warning("Static bundle %s is outdated, resources are inlined. Rebuild bundles.", name)
+            return {}
+        paths[name] = '{}/{}'.format(BUNDLE_DIR, entry['file'])
+    return paths
+
+
+def get_bundle_paths():
+    """
+    Return resource paths of the built bundles by bundle name, empty dict if bundles are missing or outdated.
+    """
+    global _bundle_paths
+
+    if _bundle_paths is None:
+        _bundle_paths = _load_bundle_paths()
+    return _bundle_paths
+
+
+def clear():
+    global _bundle_paths
+
+    _bundle_paths = None
+
+
+if __name__ == '__main__':
+    for bundle_name, bundle in sorted(build().items()):
+        print('{} -> {}'.format(bundle_name, bundle['file']))
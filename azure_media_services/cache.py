@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Caching primitives shared by the xBlock: process-local LRU storage and Django cache helpers.
+"""
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+
+from .utils import get_setting
+
+CACHE_KEY_PREFIX = 'azure_media_services'
+
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+def make_cache_key(namespace, *parts):
+    """
+    Build a Django cache key which is safe for every cache backend (memcached included).
+
+    Key parts are hashed, so arbitrary long values (e.g. SAS URLs) may be used.
+    """
+    digest = hashlib.md5(u'\n'.join(u'{}'.format(part) for part in parts).encode('utf-8')).hexdigest()
+    return '{}:{}:{}'.format(CACHE_KEY_PREFIX, namespace, digest)
+
+
+def get_django_cache():
+    """
+    Return Django cache backend configured for the xBlock (`CACHE_ALIAS` setting).
+    """
+    return caches[get_setting('CACHE_ALIAS', 'default')]
+
+
+def get_version(namespace, key, ttl):
+    """
+    Return the current version (random token) of the cached data set, creating it if there is none.
+
+    Cache keys made with the version are invalidated at once by deleting the version (see `drop_version`).
+    """
+    cache = get_django_cache()
+    version_key = make_cache_key(namespace, key)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, ttl)
+        # Another process may have added its version first:
+        version = cache.get(version_key)
+    return version
+
+
+def drop_version(namespace, key):
+    get_django_cache().delete(make_cache_key(namespace, key))
+
+
+class LRUCache(object):
+    """
+    Thread-safe process-local cache with TTL and least-recently-used eviction.
+    """
+
+    def __init__(self, max_entries=128, ttl=None):
+        """
+        Keep at most `max_entries` values; `ttl` (seconds) is the default entry lifetime (`None` - forever).
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= time.time():
+                return default
+            # Re-insert to mark the entry as the most recently used one:
+            self._data[key] = (value, expires_at)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_local_cache(name, max_entries_setting, default_max_entries):
+    """
+    Return module-level LRU cache of the name, created on first use.
+
+    Its size is read from the settings when the cache is created, so importing the modules which use it doesn't
+    require configured Django settings.
+    """
+    local_cache = _local_caches.get(name)
+    if local_cache is None:
+        with _local_caches_lock:
+            local_cache = _local_caches.get(name)
+            if local_cache is None:
+                local_cache = _local_caches[name] = LRUCache(
+                    max_entries=get_setting(max_entries_setting, default_max_entries)
+                )
+    return local_cache
+
+
+class _Call(object):
+    """
+    In-flight call state shared by `SingleFlight` waiters.
+    """
+
+    def __init__(self):
+        """
+        Initialize pending call.
+        """
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls with the same key into a single call (within the process).
+
+    The first caller performs the call, the others wait for it and get the same result (or exception).
+    """
+
+    def __init__(self):
+        """
+        Initialize empty in-flight calls registry.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
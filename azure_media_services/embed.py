@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Embedded player fast path: cached block share and protection settings and HTTP caching validators.
+
+Cached values of a course are keyed by the course embed version, which is replaced when the course
+is published (see `apps.AzureMediaServicesConfig`), so all of them are invalidated at once.
+"""
+import hashlib
+
+from .cache import drop_version, get_django_cache, get_version, make_cache_key
+from .utils import get_setting
+
+# Lifetime (seconds) of the cached share settings; bounds staleness if publish signals are not received:
+DEFAULT_EMBED_CACHE_TTL = 60 * 60
+# Period (seconds) browsers and CDNs may serve the publicly shared embedded player without revalidation:
+DEFAULT_EMBED_MAX_AGE = 5 * 60
+
+
+def get_embed_cache_ttl():
+    return get_setting('EMBED_CACHE_TTL', DEFAULT_EMBED_CACHE_TTL)
+
+
+def get_embed_version(course_key):
+    """
+    Return the current embed version of the course, creating it if there is none.
+    """
+    return get_version('embed_version', course_key, get_embed_cache_ttl())
+
+
+def invalidate_embed_cache(course_key):
+    """
+    Drop cached share settings and validators of all course blocks.
+    """
+    drop_version('embed_version', course_key)
+
+
+def course_published_handler(sender, course_key, **kwargs):
+    invalidate_embed_cache(course_key)
+
+
+def get_block_embed_settings(usage_key):
+    """
+    Return the published block `share` and `protection_type` settings, loading the block on cache miss only.
+
+    :raise ItemNotFoundError: if the block doesn't exist
+    """
+    from xmodule.modulestore.django import modulestore
+
+    cache = get_django_cache()
+    key = make_cache_key('embed_settings', get_embed_version(usage_key.course_key), usage_key)
+    embed_settings = cache.get(key)
+    if embed_settings is None:
+        block = modulestore().get_item(usage_key)
+        embed_settings = {'share': block.share, 'protection_type': block.protection_type}
+        cache.set(key, embed_settings, get_embed_cache_ttl())
+    return embed_settings
+
+
+def get_embed_etag(usage_key):
+    """
+    Return ETag of the embedded player page: it changes when the block course is published.
+
+    Pages of protected players hold per-render tokens, they are not cached and have no ETag.
+    """
+    version = get_embed_version(usage_key.course_key)
+    return hashlib.md5(u'{}\n{}'.format(version, usage_key).encode('utf-8')).hexdigest()
+
+
+def get_embed_max_age():
+    return get_setting('EMBED_MAX_AGE', DEFAULT_EMBED_MAX_AGE)
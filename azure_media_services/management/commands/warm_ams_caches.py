@@ -0,0 +1,87 @@
+"""
+Warm up Azure lookups and transcripts caches of the Azure Media Services xBlocks.
+
+Usage:
+    ./manage.py lms warm_ams_caches --course-id course-v1:edX+DemoX+Demo_Course
+    ./manage.py lms warm_ams_caches --workers 8 --rate 20
+    ./manage.py lms warm_ams_caches --course-id course-v1:edX+DemoX+Demo_Course --search-index
+
+"""
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from xmodule.modulestore.django import modulestore
+
+from azure_media_services.search import BLOCK_CATEGORY, index_course
+from azure_media_services.warmup import DEFAULT_WARMUP_RATE, DEFAULT_WARMUP_WORKERS, warm_up
+
+
+class Command(BaseCommand):
+    """
+    Resolve video info and captions and fetch transcripts of every AMS xBlock in the course(s).
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course-id', dest='course_ids', action='append', default=[],
+            help='course to warm up (may be repeated); all courses by default'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=DEFAULT_WARMUP_WORKERS, help='number of parallel workers'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=DEFAULT_WARMUP_RATE, help='max Azure requests per second (0 - unlimited)'
+        )
+        parser.add_argument(
+            '--skip-transcripts', action='store_true', help='resolve video info only, do not fetch transcripts'
+        )
+        parser.add_argument(
+            '--search-index', action='store_true',
+            help='also build transcripts search indexes (they are updated on course publishing otherwise)'
+        )
+
+    def get_course_keys(self, course_ids):
+        if not course_ids:
+            return [course.id for course in modulestore().get_course_summaries()]
+        try:
+            return [CourseKey.from_string(course_id) for course_id in course_ids]
+        except InvalidKeyError as error:
+            raise CommandError('Invalid course id: {}'.format(error))
+
+    def get_blocks(self, course_keys):
+        store = modulestore()
+        for course_key in course_keys:
+            for block in store.get_items(course_key, qualifiers={'category': BLOCK_CATEGORY}):
+                yield block
+
+    def handle(self, *args, **options):
+        course_keys = self.get_course_keys(options['course_ids'])
+        blocks = list(self.get_blocks(course_keys))
+        total = len(blocks)
+        self.stdout.write('Warming up caches of {} blocks...'.format(total))
+        progress = {'done': 0}
+
+        def report(result):
+            progress['done'] += 1
+            if result.ok:
+                self.stdout.write('[{}/{}] {}: ok'.format(progress['done'], total, result.location))
+            else:
+                for error in result.errors:
+                    self.stderr.write(u'[{}/{}] {}: {}'.format(progress['done'], total, result.location, error))
+
+        results = warm_up(
+            blocks,
+            workers=options['workers'],
+            rate=options['rate'],
+            with_transcripts=not options['skip_transcripts'],
+            on_result=report
+        )
+        failed = len([result for result in results if not result.ok])
+        self.stdout.write('Done: {} blocks warmed up, {} failed.'.format(total - failed, failed))
+
+        if options['search_index']:
+            for course_key in course_keys:
+                index_course(course_key)
+                self.stdout.write('Transcripts search index of {} is updated.'.format(course_key))
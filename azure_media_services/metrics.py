@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Hot-path instrumentation: timings and counters of views, handlers and outbound Azure/HTTP calls.
+
+Metrics are sent to a pluggable sink configured with `METRICS_SINK` setting: 'logging', 'statsd',
+'memory' or a dotted path to a sink class; instrumentation is a no-op if it is not set.
+Timings are sampled with `METRICS_SAMPLE_RATE` so that they can stay enabled in production.
+
+    with metrics.timed('handler', handler='fetch_transcript', org=org):
+        ...
+        metrics.label(cache='hit')  # annotates the innermost active timer of the current thread
+"""
+from collections import defaultdict
+import logging
+import random
+import socket
+import threading
+from timeit import default_timer
+
+from .utils import get_setting
+
+log = logging.getLogger(__name__)
+
+DEFAULT_STATSD_HOST = 'localhost'
+DEFAULT_STATSD_PORT = 8125
+DEFAULT_METRICS_PREFIX = 'azure_media_services'
+
+_sink = None
+_sink_configured = False
+_sink_lock = threading.Lock()
+_active = threading.local()
+
+
+class LoggingSink(object):
+    """
+    Write metrics to the module logger (debugging and low traffic installations).
+    """
+
+    def timing(self, name, value, labels, sample_rate):
+        log.info("timing %s %.3fms %s", name, value, _format_labels(labels))
+
+    def increment(self, name, value, labels, sample_rate):
+        log.info("counter %s +%s %s", name, value, _format_labels(labels))
+
+
+class StatsdSink(object):
+    """
+    Send metrics to a statsd agent over UDP; labels are sent as DogStatsD tags (`|#key:value`).
+
+    Sending never blocks or raises: failed datagrams are dropped.
+    """
+
+    def __init__(self, host=None, port=None, prefix=None):
+        """
+        Configure the agent address from `METRICS_STATSD_HOST`/`METRICS_STATSD_PORT` settings by default.
+        """
+        self.address = (
+            host or get_setting('METRICS_STATSD_HOST', DEFAULT_STATSD_HOST),
+            port or get_setting('METRICS_STATSD_PORT', DEFAULT_STATSD_PORT),
+        )
+        self.prefix = prefix or get_setting('METRICS_PREFIX', DEFAULT_METRICS_PREFIX)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def format(self, name, value, metric_type, labels, sample_rate):
+        line = '{}.{}:{}|{}'.format(self.prefix, name, value, metric_type)
+        if sample_rate < 1:
+            line += '|@{}'.format(sample_rate)
+        if labels:
+            line += '|#' + ','.join('{}:{}'.format(key, labels[key]) for key in sorted(labels))
+        return line
+
+    def send(self, line):
+        try:
+            self.socket.sendto(line.encode('utf-8'), self.address)
+        except (socket.error, UnicodeError):
+            log.debug("Metric is dropped: %s", line)
+
+    def timing(self, name, value, labels, sample_rate):
+        self.send(self.format(name, '{:.3f}'.format(value), 'ms', labels, sample_rate))
+
+    def increment(self, name, value, labels, sample_rate):
+        self.send(self.format(name, value, 'c', labels, sample_rate))
+
+
+class MemorySink(object):
+    """
+    Keep metrics in memory as histograms of raw values (tests and benchmarks).
+    """
+
+    def __init__(self):
+        """
+        Start with empty histograms.
+        """
+        self.timings = defaultdict(list)
+        self.counters = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def timing(self, name, value, labels, sample_rate):
+        with self.lock:
+            self.timings[name].append((value, labels))
+
+    def increment(self, name, value, labels, sample_rate):
+        with self.lock:
+            self.counters[name].append((value, labels))
+
+    def histogram(self, name, **labels):
+        """
+        Return sorted recorded timings of the metric having all given labels.
+        """
+        return sorted(
+            value for value, recorded_labels in self.timings[name]
+            if all(recorded_labels.get(key) == label for key, label in labels.items())
+        )
+
+    def count(self, name, **labels):
+        return sum(
+            value for value, recorded_labels in self.counters[name]
+            if all(recorded_labels.get(key) == label for key, label in labels.items())
+        )
+
+    def clear(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+
+SINKS = {
+    'logging': LoggingSink,
+    'statsd': StatsdSink,
+    'memory': MemorySink,
+}
+
+
+def _format_labels(labels):
+    return ' '.join('{}={}'.format(key, labels[key]) for key in sorted(labels))
+
+
+def _create_sink():
+    sink_name = get_setting('METRICS_SINK', None)
+    if not sink_name:
+        return None
+    if sink_name in SINKS:
+        return SINKS[sink_name]()
+    from django.utils.module_loading import import_string
+
+    try:
+        return import_string(sink_name)()
+    except ImportError:
+        log.exception("Metrics sink %s can't be imported, metrics are disabled.", sink_name)
+        return None
+
+
+def get_sink():
+    """
+    Return the configured metrics sink or None if metrics are disabled.
+    """
+    global _sink, _sink_configured
+
+    if not _sink_configured:
+        with _sink_lock:
+            if not _sink_configured:
+                _sink = _create_sink()
+                _sink_configured = True
+    return _sink
+
+
+def set_sink(sink):
+    """
+    Replace the configured sink (None disables metrics); return the previous one.
+    """
+    global _sink, _sink_configured
+
+    previous = get_sink()
+    with _sink_lock:
+        _sink, _sink_configured = sink, True
+    return previous
+
+
+def get_sample_rate():
+    return get_setting('METRICS_SAMPLE_RATE', 1.0)
+
+
+def _active_timers():
+    try:
+        return _active.timers
+    except AttributeError:
+        _active.timers = []
+        return _active.timers
+
+
+class Timer(object):
+    """
+    Context manager measuring the wrapped block duration (milliseconds).
+
+    Unsampled blocks still accept labels but are not reported; raised exceptions are
+    reported with `status=error` label.
+    """
+
+    __slots__ = ('name', 'labels', 'sink', 'sample_rate', 'started')
+
+    def __init__(self, name, labels):
+        """
+        Decide whether the block is sampled.
+        """
+        self.name = name
+        self.labels = labels
+        self.sink = get_sink()
+        self.sample_rate = get_sample_rate() if self.sink is not None else 1
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sink = None
+        self.started = None
+
+    def __enter__(self):
+        _active_timers().append(self)
+        self.started = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = 1000 * (default_timer() - self.started)
+        _active_timers().pop()
+        if self.sink is not None:
+            if exc_type is not None:
+                self.labels.setdefault('status', 'error')
+            self.sink.timing(self.name, duration, self.labels, self.sample_rate)
+        return False
+
+    def label(self, **labels):
+        self.labels.update(labels)
+
+
+def timed(name, **labels):
+    """
+    Return context manager reporting the block duration as `name` timing with given labels.
+    """
+    return Timer(name, labels)
+
+
+def label(**labels):
+    """
+    Add labels to the innermost active timer of the current thread (no-op if there is none).
+    """
+    timers = _active_timers()
+    if timers:
+        timers[-1].label(**labels)
+
+
+def increment(name, value=1, **labels):
+    """
+    Report the counter change (e.g. a cache hit), sampled the same way as timings.
+    """
+    sink = get_sink()
+    if sink is None:
+        return
+    sample_rate = get_sample_rate()
+    if sample_rate < 1 and random.random() >= sample_rate:
+        return
+    sink.increment(name, value, labels, sample_rate)
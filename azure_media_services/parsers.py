@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+WebVTT/SRT transcripts parsing into compact cues.
+
+Compact cues are the parallel arrays of cue start times, end times (seconds) and texts:
+
+    {'start': [0.0, 2.5], 'end': [2.5, 4.0], 'text': ['Hello', 'world']}
+"""
+import re
+
+TIMING_SEPARATOR = '-->'
+
+_TIMESTAMP_RE = re.compile(r'^(?:(\d+):)?([0-5]?\d):([0-5]\d)[.,](\d{1,3})$')
+_TAG_RE = re.compile(r'<[^>]*>')
+_BLOCK_SEPARATOR_RE = re.compile(r'\n\s*\n')
+_ENTITIES = (
+    ('&lt;', '<'), ('&gt;', '>'), ('&nbsp;', u'\xa0'), ('&lrm;', u'\u200e'), ('&rlm;', u'\u200f'), ('&amp;', '&'),
+)
+# WebVTT blocks which do not hold cues:
+_SKIPPED_BLOCKS = ('WEBVTT', 'NOTE', 'STYLE', 'REGION')
+
+
+def parse_timestamp(value):
+    """
+    Convert `[hh:]mm:ss.ttt` (or SRT's `hh:mm:ss,ttt`) timestamp into seconds.
+
+    :raise ValueError: if timestamp is malformed
+    """
+    match = _TIMESTAMP_RE.match(value.strip())
+    if not match:
+        raise ValueError("Malformed transcript timestamp: {!r}".format(value))
+    hours, minutes, seconds, fraction = match.groups()
+    return round(
+        int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction.ljust(3, '0')) / 1000.0, 3
+    )
+
+
+def clean_cue_text(text):
+    """
+    Drop cue markup (voice, class, timestamp tags) and unescape WebVTT character references.
+    """
+    text = _TAG_RE.sub('', text)
+    for entity, char in _ENTITIES:
+        text = text.replace(entity, char)
+    return text.strip()
+
+
+def parse_transcript(content):
+    """
+    Parse WebVTT or SRT transcript content into compact cues.
+
+    Cues are returned in the order of their start time; empty transcripts have no cues.
+
+    :param content: transcript content (bytes are decoded as UTF-8)
+    :return: dict of `start`, `end` and `text` parallel lists
+    :raise ValueError: if a cue timing line is malformed
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    content = content.lstrip(u'\ufeff').replace('\r\n', '\n').replace('\r', '\n')
+
+    cues = []
+    for block in _BLOCK_SEPARATOR_RE.split(content.strip()):
+        lines = block.split('\n')
+        # Empty (or whitespace only) transcripts have a single blank block:
+        if not lines[0].strip() or lines[0].split(None, 1)[0] in _SKIPPED_BLOCKS:
+            continue
+        # The optional cue identifier (or SRT cue number) precedes the timing line:
+        for index, line in enumerate(lines[:2]):
+            if TIMING_SEPARATOR in line:
+                break
+        else:
+            continue
+        start, end = line.split(TIMING_SEPARATOR, 1)
+        # Cue settings (e.g. `align:start position:10%`) may follow the end timestamp:
+        end = (end.split(None, 1) or [''])[0]
+        cues.append((parse_timestamp(start), parse_timestamp(end), clean_cue_text('\n'.join(lines[index + 1:]))))
+
+    cues.sort(key=lambda cue: cue[0])
+    return {
+        'start': [cue[0] for cue in cues],
+        'end': [cue[1] for cue in cues],
+        'text': [cue[2] for cue in cues],
+    }
+
+
+def format_timestamp(seconds):
+    """
+    Convert seconds into WebVTT `hh:mm:ss.ttt` timestamp.
+    """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    return '{:02d}:{:02d}:{:02d}.{:03d}'.format(hours, minutes, milliseconds // 1000, milliseconds % 1000)
+
+
+def normalize_to_webvtt(content):
+    """
+    Return transcript content as UTF-8 encoded WebVTT.
+
+    WebVTT transcripts are kept as they are (only BOM and line endings are normalized, so cue markup
+    is preserved); SRT ones are converted.
+
+    :raise ValueError: if a cue timing line is malformed or the transcript is neither WebVTT nor SRT
+        (e.g. TTML or an empty file, which have no SRT cues)
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    content = content.lstrip(u'\ufeff').replace('\r\n', '\n').replace('\r', '\n')
+
+    if content.startswith('WEBVTT'):
+        return content.encode('utf-8')
+
+    cues = parse_transcript(content)
+    if not cues['start']:
+        raise ValueError("Transcript is neither WebVTT nor SRT")
+    blocks = [u'WEBVTT']
+    for start, end, text in zip(cues['start'], cues['end'], cues['text']):
+        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        blocks.append(u'{} {} {}\n{}'.format(format_timestamp(start), TIMING_SEPARATOR, format_timestamp(end), text))
+    return (u'\n\n'.join(blocks) + u'\n').encode('utf-8')
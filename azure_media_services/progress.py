@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Watched intervals of a video, kept as a sorted flat list of interval bounds: [start0, end0, start1, end1, ...].
+
+Intervals never overlap, so the flat list is sorted and an interval is merged into it with binary search.
+"""
+from bisect import bisect_left, bisect_right
+
+# Intervals closer than this number of seconds are merged (heartbeats positions are not exact):
+MERGE_GAP = 1.0
+# Bounds are stored with this number of decimal places:
+PRECISION = 1
+
+
+def add_interval(intervals, start, end, gap=MERGE_GAP):
+    """
+    Merge the watched interval into the intervals list (in place).
+
+    :param intervals: sorted flat list of non-overlapping interval bounds
+    :return: the updated intervals list
+    """
+    start, end = round(start, PRECISION), round(end, PRECISION)
+    if end <= start:
+        return intervals
+
+    # An odd position means the bound falls inside an interval, which is merged then:
+    lo = bisect_left(intervals, start - gap)
+    lo -= lo % 2
+    hi = bisect_right(intervals, end + gap)
+    hi += hi % 2
+    if lo < hi:
+        start, end = min(start, intervals[lo]), max(end, intervals[hi - 1])
+    intervals[lo:hi] = [start, end]
+    return intervals
+
+
+def watched_seconds(intervals):
+    return sum(intervals[i + 1] - intervals[i] for i in range(0, len(intervals), 2))
+
+
+def watched_fraction(intervals, duration):
+    """
+    Return the watched part of the video (0..1).
+    """
+    if not duration:
+        return 0.0
+    return min(watched_seconds(intervals) / float(duration), 1.0)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Call policy of Azure Media Services requests: per-call deadlines, bounded retries with jittered backoff
+for idempotent requests and a circuit breaker per organization.
+
+`azure_video_pipeline` client doesn't accept timeouts, so calls are run on a dedicated thread pool and
+the caller stops waiting when the deadline passes. While Azure fails for an organization, its calls are
+rejected immediately instead of blocking workers (the circuit is open), a single trial call is let through
+after `AZURE_CIRCUIT_RESET_TIMEOUT` seconds and closes the circuit if it succeeds.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import threading
+import time
+from timeit import default_timer
+
+from . import metrics
+from .utils import get_setting
+
+log = logging.getLogger(__name__)
+
+# Max duration (seconds) of a call including its retries:
+DEFAULT_AZURE_CALL_DEADLINE = 10
+# Number of retries of the failed idempotent calls:
+DEFAULT_AZURE_CALL_RETRIES = 2
+# Backoff before the Nth retry is a random delay up to min(BASE * 2 ** N, MAX) seconds:
+DEFAULT_AZURE_RETRY_BACKOFF = 0.2
+AZURE_RETRY_MAX_BACKOFF = 2
+DEFAULT_AZURE_CALL_WORKERS = 16
+# Consecutive failures which open the circuit of an organization:
+DEFAULT_AZURE_CIRCUIT_FAILURES = 5
+# Period (seconds) the open circuit rejects calls:
+DEFAULT_AZURE_CIRCUIT_RESET_TIMEOUT = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class AzureServiceError(IOError):
+    """
+    Azure Media Services call failed because the service is unavailable or degraded.
+    """
+
+
+class DeadlineExceeded(AzureServiceError):
+    """
+    Azure Media Services call didn't complete before its deadline.
+    """
+
+
+class CircuitOpenError(AzureServiceError):
+    """
+    Azure Media Services call was rejected: recent calls of the organization have failed.
+    """
+
+
+def is_transient(error):
+    """
+    Check if the error may go away on retry: I/O errors except HTTP client (4xx) errors.
+    """
+    if not isinstance(error, IOError):
+        return False
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code is None or status_code >= 500
+
+
+class CircuitBreaker(object):
+    """
+    Thread-safe circuit breaker: opens after `failure_threshold` consecutive failures for `reset_timeout` seconds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        """
+        Start closed.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check if a call may be made; once the reset timeout passes, only one trial call is allowed.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and default_timer() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    log.warning("Azure calls circuit is open after %s failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = default_timer()
+
+
+def get_circuit_breaker(org):
+    with _breakers_lock:
+        breaker = _breakers.get(org)
+        if breaker is None:
+            breaker = _breakers[org] = CircuitBreaker(
+                get_setting('AZURE_CIRCUIT_FAILURES', DEFAULT_AZURE_CIRCUIT_FAILURES),
+                get_setting('AZURE_CIRCUIT_RESET_TIMEOUT', DEFAULT_AZURE_CIRCUIT_RESET_TIMEOUT)
+            )
+    return breaker
+
+
+def reset_circuit_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_setting('AZURE_CALL_WORKERS', DEFAULT_AZURE_CALL_WORKERS)
+                )
+    return _executor
+
+
+def _release(lock):
+    try:
+        lock.release()
+    except threading.ThreadError:
+        # Already released by the call completion or the deadline timer:
+        pass
+
+
+def _call_with_timeout(func, args, timeout):
+    """
+    Run the call on the thread pool and wait for it no longer than `timeout` seconds.
+
+    Timed waits poll on Python 2 (adding up to 50 ms to a call), so the caller blocks on a lock which is
+    released either by the call completion or by the deadline timer.
+    """
+    done = threading.Lock()
+    done.acquire()
+    future = _get_executor().submit(func, *args)
+    future.add_done_callback(lambda _future: _release(done))
+    timer = threading.Timer(max(timeout, 0), _release, [done])
+    timer.daemon = True
+    timer.start()
+    done.acquire()
+    timer.cancel()
+
+    if not future.done():
+        # A started call can't be interrupted: it completes in the background and its result is dropped.
+        future.cancel()
+        raise DeadlineExceeded("Azure call hasn't completed in time")
+    return future.result()
+
+
+def call_azure(org, method, func, *args, **kwargs):
+    """
+    Call Azure Media Services function with the deadline, retries (if idempotent) and the org circuit breaker.
+
+    :param org: organization the call is made for (circuit breaker key)
+    :param method: call name for logs and metrics
+    :param idempotent: retry failed calls (False by default)
+    :raise CircuitOpenError: if Azure calls of the organization are failing
+    :raise DeadlineExceeded: if the call (with retries) hasn't completed before the deadline
+    :raise AzureServiceError: if the call has failed with a transient error (e.g. HTTP 5xx) on every attempt
+    """
+    idempotent = kwargs.pop('idempotent', False)
+    breaker = get_circuit_breaker(org)
+    deadline = default_timer() + get_setting('AZURE_CALL_DEADLINE', DEFAULT_AZURE_CALL_DEADLINE)
+    retries = get_setting('AZURE_CALL_RETRIES', DEFAULT_AZURE_CALL_RETRIES) if idempotent else 0
+    backoff = get_setting('AZURE_RETRY_BACKOFF', DEFAULT_AZURE_RETRY_BACKOFF)
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            metrics.increment('azure.rejected', method=method, org=org)
+            raise CircuitOpenError("Azure Media Services is unavailable for {}, try again later".format(org))
+        try:
+            result = _call_with_timeout(func, args, deadline - default_timer())
+        except Exception as error:
+            if not is_transient(error):
+                # The service has responded, so it isn't degraded:
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            delay = random.uniform(0, min(backoff * 2 ** attempt, AZURE_RETRY_MAX_BACKOFF))
+            if attempt >= retries or default_timer() + delay >= deadline:
+                if isinstance(error, AzureServiceError):
+                    raise
+                raise AzureServiceError("Azure call {} has failed: {}".format(method, error))
+            log.warning("Azure call %s failed (%s), retrying in %.2fs", method, error, delay)
+            metrics.increment('azure.retry', method=method, org=org)
+            attempt += 1
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Process-wide cache of the xBlock package resources (static files and compiled templates).
+
+Package resources never change while the process runs, so each of them is read (and each template
+is compiled) once per process instead of once per view render.
+"""
+import threading
+
+from django.conf import settings
+from django.template import Context, Engine, Template
+from xblockutils.resources import ResourceLoader
+
+from .utils import get_setting
+
+loader = ResourceLoader(__name__)
+
+STUDENT_VIEW_TEMPLATE = 'templates/player.html'
+STUDENT_VIEW_RESOURCES = (
+    'node_modules/videojs-vtt.js/lib/vttcue.js',
+    'static/js/plugins/transcriptsAmpPlugin.js',
+    'static/js/player.js',
+    'static/js/plugins/transcriptsAmpPlugin.css',
+    'public/css/player.css',
+)
+STUDIO_VIEW_TEMPLATE = 'templates/studio_edit.html'
+STUDIO_VIEW_RESOURCES = (
+    'public/css/studio.css',
+    'static/js/studio_edit.js',
+)
+
+_resources = {}
+_templates = {}
+_engine = None
+_lock = threading.Lock()
+
+
+def load_resource(path):
+    """
+    Return the package resource content as unicode, reading it from the package only once.
+    """
+    try:
+        return _resources[path]
+    except KeyError:
+        content = loader.load_unicode(path)
+        with _lock:
+            return _resources.setdefault(path, content)
+
+
+def _get_engine():
+    """
+    Return template engine with xblock-utils i18n template tags (see `ResourceLoader.render_django_template`).
+    """
+    global _engine
+
+    if _engine is None:
+        from django.template.backends.django import get_installed_libraries
+
+        libraries = get_installed_libraries()
+        libraries['i18n'] = 'xblockutils.templatetags.i18n'
+        _engine = Engine(libraries=libraries)
+    return _engine
+
+
+def get_template(path):
+    """
+    Return compiled Django template of the package resource, compiling it only once.
+    """
+    try:
+        return _templates[path]
+    except KeyError:
+        template = Template(load_resource(path), engine=_get_engine())
+        with _lock:
+            return _templates.setdefault(path, template)
+
+
+def render_template(path, context=None, i18n_service=None):
+    """
+    Render the package Django template; drop-in replacement for `ResourceLoader.render_django_template`.
+    """
+    context = dict(context or {}, _i18n_service=i18n_service)
+    return get_template(path).render(Context(context))
+
+
+def preload():
+    """
+    Read all view resources and compile view templates in advance.
+    """
+    for path in STUDENT_VIEW_RESOURCES + STUDIO_VIEW_RESOURCES:
+        load_resource(path)
+    for path in (STUDENT_VIEW_TEMPLATE, STUDIO_VIEW_TEMPLATE):
+        get_template(path)
+
+
+def clear():
+    """
+    Drop all cached resources and templates.
+    """
+    global _engine
+
+    with _lock:
+        _resources.clear()
+        _templates.clear()
+        _engine = None
+
+
+# Settings aren't configured when the bundles are built (see `bundle.py`):
+if settings.configured and get_setting('PRELOAD_RESOURCES', False):
+    preload()
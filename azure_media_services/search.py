@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Course-level transcripts search: an inverted index over transcripts cues of all published AMS xBlocks of a course.
+
+The index of a course is a set of per-block segments (term -> cue numbers posting lists plus cues start/end/text)
+stored in Django default storage, and a manifest of the segments. Segments are named by the block captions
+fingerprint, so on course publishing only blocks with changed captions are re-indexed. Loaded indexes are kept in
+memory until the course index version (Django cache) changes.
+"""
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import re
+import threading
+import zlib
+
+from .cache import drop_version, get_django_cache, get_local_cache, get_version, make_cache_key
+from .transcripts import get_transcript_cues
+from .utils import get_setting
+
+log = logging.getLogger(__name__)
+
+SEARCH_INDEX_DIR = 'azure_media_services/search'
+BLOCK_CATEGORY = 'azure_media_services'
+DEFAULT_SEARCH_RESULTS_LIMIT = 20
+MAX_SEARCH_RESULTS_LIMIT = 100
+DEFAULT_SEARCH_INDEX_CACHE_TTL = 60 * 60
+DEFAULT_SEARCH_INDEX_CACHE_MAX_ENTRIES = 8
+DEFAULT_SEARCH_INDEX_WORKERS = 1
+# Max duration (seconds) of a course indexing, a crashed indexer's lock expires after it:
+INDEXING_LOCK_TIMEOUT = 10 * 60
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+# Posting lists are kept in memory as arrays of unsigned ints (cue numbers):
+POSTINGS_TYPECODE = 'I'
+
+_indexing_executor = None
+_indexing_executor_lock = threading.Lock()
+
+
+def _get_storage():
+    from django.core.files.storage import default_storage
+
+    return default_storage
+
+
+def _get_indexes_cache():
+    return get_local_cache('search_indexes', 'SEARCH_INDEX_CACHE_MAX_ENTRIES', DEFAULT_SEARCH_INDEX_CACHE_MAX_ENTRIES)
+
+
+def get_search_index_cache_ttl():
+    return get_setting('SEARCH_INDEX_CACHE_TTL', DEFAULT_SEARCH_INDEX_CACHE_TTL)
+
+
+def tokenize(text):
+    """
+    Split text into lower-cased terms, each term is returned once, in order of appearance.
+    """
+    terms = []
+    for term in TERM_RE.findall(text.lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def build_segment(display_name, transcripts_cues):
+    """
+    Build index segment of a block.
+
+    :param display_name: block display name
+    :param transcripts_cues: language -> transcript cues (see `parsers.parse_transcript`)
+    :return: dict of `display_name` and `languages` (language -> cues `start`, `end`, `text` and `terms`,
+        term -> ascending cue numbers)
+    """
+    languages = {}
+    for language, cues in transcripts_cues.items():
+        terms = {}
+        for number, text in enumerate(cues['text']):
+            for term in tokenize(text):
+                terms.setdefault(term, []).append(number)
+        languages[language] = dict(cues, terms=terms)
+    return {'display_name': display_name, 'languages': languages}
+
+
+def _course_dir(course_key):
+    return '{}/{}'.format(SEARCH_INDEX_DIR, hashlib.sha1(u'{}'.format(course_key).encode('utf-8')).hexdigest())
+
+
+def _manifest_name(course_key):
+    return '{}/manifest.json'.format(_course_dir(course_key))
+
+
+def _segment_name(course_key, usage_id, fingerprint):
+    return '{}/{}-{}.json.z'.format(
+        _course_dir(course_key), hashlib.sha1(usage_id.encode('utf-8')).hexdigest(), fingerprint
+    )
+
+
+def _read(name, compressed):
+    """
+    Read stored index file.
+
+    :raise IOError: if the file can't be read
+    :raise ValueError: if the file is corrupted
+    """
+    stored_file = _get_storage().open(name)
+    try:
+        content = stored_file.read()
+    finally:
+        stored_file.close()
+    try:
+        return json.loads(zlib.decompress(content) if compressed else content)
+    except zlib.error as error:
+        raise ValueError("Corrupted search index file {}: {}".format(name, error))
+
+
+def _write(name, data, compressed):
+    from django.core.files.base import ContentFile
+
+    content = json.dumps(data, separators=(',', ':'))
+    storage = _get_storage()
+    # Storages don't overwrite files, a new file would get another name:
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(zlib.compress(content) if compressed else content))
+
+
+def read_manifest(course_key):
+    """
+    Return indexed blocks of the course: usage id -> storage name of the block segment.
+    """
+    name = _manifest_name(course_key)
+    if not _get_storage().exists(name):
+        return {}
+    return _read(name, compressed=False)
+
+
+def get_captions_fingerprint(block):
+    """
+    Return fingerprint of the indexed block data.
+
+    Stored transcripts copies are content-hashed, so the fingerprint also changes with their content.
+    """
+    captions = sorted((caption.get('srclang'), caption.get('src')) for caption in block.get_captions())
+    return hashlib.sha1(json.dumps([block.display_name, captions]).encode('utf-8')).hexdigest()[:16]
+
+
+def index_block(block):
+    """
+    Build the index segment of the block transcripts.
+
+    :return: segment (see `build_segment`) or None if no transcripts could be indexed
+    """
+    transcripts_cues = {}
+    for caption in block.get_captions():
+        if not caption.get('src') or not caption.get('srclang'):
+            continue
+        try:
+            content = block.read_transcript(caption['src'], caption['srclang'])
+            transcripts_cues[caption['srclang']] = get_transcript_cues(content)
+        except (IOError, ValueError):
+            log.exception("Transcript can't be indexed: %s, language [%s]", block.location, caption['srclang'])
+            # Not indexed block is retried on the next course publishing:
+            return None
+    if not transcripts_cues:
+        return None
+    return build_segment(block.display_name, transcripts_cues)
+
+
+def update_course_index(course_key, blocks):
+    """
+    Bring the course index in line with the blocks, re-indexing only blocks whose captions have changed.
+
+    :param blocks: all AMS xBlocks of the course
+    :return: number of (re-)indexed blocks
+    """
+    storage = _get_storage()
+    manifest = read_manifest(course_key)
+    segments = {}
+    indexed = 0
+    for block in blocks:
+        usage_id = u'{}'.format(block.location)
+        name = _segment_name(course_key, usage_id, get_captions_fingerprint(block))
+        if manifest.get(usage_id) != name:
+            segment = index_block(block)
+            if segment is None:
+                # The previous segment (if any) is kept until the block is indexed successfully:
+                if usage_id in manifest:
+                    segments[usage_id] = manifest[usage_id]
+                continue
+            _write(name, segment, compressed=True)
+            indexed += 1
+        segments[usage_id] = name
+
+    if segments != manifest:
+        _write(_manifest_name(course_key), segments, compressed=False)
+        for name in set(manifest.values()) - set(segments.values()):
+            storage.delete(name)
+        drop_version('search_index_version', course_key)
+    return indexed
+
+
+def index_course(course_key):
+    """
+    Update the index of the published course; concurrent calls for the course are coalesced into one more run.
+    """
+    from xmodule.modulestore import ModuleStoreEnum
+    from xmodule.modulestore.django import modulestore
+
+    cache = get_django_cache()
+    lock_key = make_cache_key('search_index_lock', course_key)
+    pending_key = make_cache_key('search_index_pending', course_key)
+    cache.set(pending_key, True, INDEXING_LOCK_TIMEOUT)
+    # The lock holder re-runs indexing if the course was published again while it was working:
+    while cache.get(pending_key) and cache.add(lock_key, True, INDEXING_LOCK_TIMEOUT):
+        try:
+            cache.delete(pending_key)
+            store = modulestore()
+            with store.branch_setting(ModuleStoreEnum.Branch.published_only, course_key):
+                blocks = store.get_items(course_key, qualifiers={'category': BLOCK_CATEGORY})
+                indexed = update_course_index(course_key, blocks)
+            log.info("Transcripts search index of %s is updated: %s blocks re-indexed", course_key, indexed)
+        finally:
+            cache.delete(lock_key)
+
+
+def _index_course_in_background(course_key):
+    from django.db import close_old_connections
+
+    try:
+        index_course(course_key)
+    except Exception:
+        log.exception("Transcripts search index of %s can't be updated", course_key)
+    finally:
+        # Pool threads outlive requests, so their database connections are closed as at a request end:
+        close_old_connections()
+
+
+def get_indexing_executor():
+    """
+    Return module-level thread pool indexing published courses.
+
+    Indexing reads every transcript of the course, so it must not occupy the Azure lookups pool used by page renders.
+    """
+    global _indexing_executor
+
+    if _indexing_executor is None:
+        with _indexing_executor_lock:
+            if _indexing_executor is None:
+                _indexing_executor = ThreadPoolExecutor(
+                    max_workers=get_setting('SEARCH_INDEX_WORKERS', DEFAULT_SEARCH_INDEX_WORKERS)
+                )
+    return _indexing_executor
+
+
+def course_published_handler(sender, course_key, **kwargs):
+    get_indexing_executor().submit(_index_course_in_background, course_key)
+
+
+def load_course_index(course_key):
+    """
+    Return the course index: usage id -> segment (with posting lists as arrays).
+    """
+    version = get_version('search_index_version', course_key, get_search_index_cache_ttl())
+    key = make_cache_key('search_index', course_key, version)
+    index = _get_indexes_cache().get(key)
+    if index is None:
+        index = {}
+        for usage_id, name in read_manifest(course_key).items():
+            segment = _read(name, compressed=True)
+            for cues in segment['languages'].values():
+                cues['terms'] = {
+                    term: array(POSTINGS_TYPECODE, postings) for term, postings in cues['terms'].items()
+                }
+            index[usage_id] = segment
+        _get_indexes_cache().set(key, index, ttl=get_search_index_cache_ttl())
+    return index
+
+
+def _intersect(postings):
+    """
+    Return cue numbers present in every posting list, in ascending order.
+    """
+    postings = sorted(postings, key=len)
+    matches = postings[0]
+    for other in postings[1:]:
+        other = set(other)
+        matches = [number for number in matches if number in other]
+        if not matches:
+            break
+    return matches
+
+
+def search(course_key, query, language=None, limit=DEFAULT_SEARCH_RESULTS_LIMIT, is_accessible=None):
+    """
+    Find transcripts cues of the course containing all the query terms.
+
+    :param language: search only in transcripts of the language (all transcripts by default)
+    :param is_accessible: check of the block access by the user (usage id -> bool); it is called only for blocks
+        with matching cues, cues of not accessible blocks are skipped (all blocks are searched by default)
+    :return: list of matching cues (dicts of `usage_id`, `display_name`, `language`, `start`, `end`, `text`),
+        ordered by block and cue start
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    matches = []
+    index = load_course_index(course_key)
+    for usage_id in sorted(index):
+        segment = index[usage_id]
+        accessible = None
+        for cues_language, cues in sorted(segment['languages'].items()):
+            if language and cues_language != language:
+                continue
+            postings = [cues['terms'].get(term) for term in terms]
+            if not all(postings):
+                continue
+            if accessible is None:
+                accessible = is_accessible is None or is_accessible(usage_id)
+            if not accessible:
+                break
+            for number in _intersect(postings):
+                matches.append({
+                    'usage_id': usage_id,
+                    'display_name': segment['display_name'],
+                    'language': cues_language,
+                    'start': cues['start'][number],
+                    'end': cues['end'][number],
+                    'text': cues['text'][number],
+                })
+                if len(matches) >= limit:
+                    return matches
+    return matches
+
+
+def clear_local_cache():
+    _get_indexes_cache().clear()
@@ -18,77 +18,341 @@ var events = {
 
 
 /**
- * Send events back to server-side xBlock
+ * Player events buffer which sends events back to server-side xBlock in batches.
+ * Events are flushed every `flushInterval` seconds (immediately if it is 0) and on page hide.
  * @param eventPostUrl
+ * @param userIsAuthenticated
+ * @param flushInterval
+ * @param maxBatchSize - max number of events in a request (the server drops events above it)
+ * @constructor
+ */
+function PlayerEventsBuffer(eventPostUrl, userIsAuthenticated, flushInterval, maxBatchSize) {
+    'use strict';
+    var self = this;
+    this.eventPostUrl = eventPostUrl;
+    this.userIsAuthenticated = userIsAuthenticated;
+    this.flushInterval = flushInterval;
+    this.maxBatchSize = maxBatchSize || 100;
+    this.queue = [];
+
+    if (userIsAuthenticated && flushInterval) {
+        setInterval(function() { self.flush(false); }, flushInterval * 1000);
+        // Page may be unloaded at any moment after it's hidden, beacon requests survive unloading:
+        window.addEventListener('pagehide', function() { self.flush(true); });
+        document.addEventListener('visibilitychange', function() {
+            if (document.visibilityState === 'hidden') {
+                self.flush(true);
+            }
+        });
+    }
+}
+
+/**
+ * Enqueue player event. Consecutive position changes (e.g. while scrubbing) are coalesced into the last one.
  * @param name
  * @param data
- * @param userIsAuthenticated
  */
-function sendPlayerEvent(eventPostUrl, name, data, userIsAuthenticated) {
+PlayerEventsBuffer.prototype.push = function(name, data) {
+    'use strict';
+    var last = this.queue[this.queue.length - 1];
+    if (!this.userIsAuthenticated) {
+        return;
+    }
+    data.event_type = name;  // eslint-disable-line no-param-reassign
+    data.timestamp = new Date().toISOString();  // eslint-disable-line no-param-reassign
+
+    if (name === events.POSITION_CHANGED && last && last.event_type === name) {
+        this.queue[this.queue.length - 1] = data;
+    } else {
+        this.queue.push(data);
+    }
+    if (!this.flushInterval) {
+        this.flush(false);
+    }
+};
+
+/**
+ * Send all buffered events, in requests of at most `maxBatchSize` events.
+ * @param useBeacon - use `navigator.sendBeacon` (if supported) so the requests outlive the page
+ */
+PlayerEventsBuffer.prototype.flush = function(useBeacon) {
+    'use strict';
+    var payload;
+    while (this.queue.length) {
+        payload = JSON.stringify(this.queue.splice(0, this.maxBatchSize));
+        if (!(useBeacon && navigator.sendBeacon && navigator.sendBeacon(this.eventPostUrl, payload))) {
+            $.ajax({
+                type: 'POST',
+                url: this.eventPostUrl,
+                data: payload
+            });
+        }
+    }
+};
+
+
+/**
+ * Watched segments tracker: playback positions are collected into [start, end] segments which are reported
+ * to the server-side xBlock every `heartbeatInterval` seconds and on page hide.
+ * @param reportUrl
+ * @param heartbeatInterval - seconds between reports (0 - tracking is disabled)
+ * @constructor
+ */
+function ProgressTracker(reportUrl, heartbeatInterval) {
+    'use strict';
+    var self = this;
+    this.reportUrl = reportUrl;
+    this.enabled = Boolean(heartbeatInterval);
+    this.segments = [];
+    this.start = null;
+    this.position = null;
+    this.duration = 0;
+
+    if (this.enabled) {
+        setInterval(function() { self.flush(false); }, heartbeatInterval * 1000);
+        window.addEventListener('pagehide', function() { self.flush(true); });
+    }
+}
+
+// Position changes longer than this number of seconds between time updates are treated as seeks:
+ProgressTracker.prototype.MAX_STEP = 2;
+
+/**
+ * Record the current playback position (called on player time updates).
+ * @param position
+ * @param playing
+ * @param duration
+ */
+ProgressTracker.prototype.update = function(position, playing, duration) {
+    'use strict';
+    var jumped = this.position !== null &&
+        (position < this.position || position - this.position > this.MAX_STEP);
+    if (jumped) {
+        this.stop();
+    }
+    if (playing && this.start === null) {
+        this.start = position;
+    }
+    this.position = position;
+    this.duration = duration || this.duration;
+};
+
+/**
+ * Close the current segment (on pause, seek or end of the video).
+ */
+ProgressTracker.prototype.stop = function() {
+    'use strict';
+    if (this.start !== null && this.position > this.start) {
+        this.segments.push([this.start, this.position]);
+    }
+    this.start = null;
+};
+
+/**
+ * Report watched segments, the current segment is reported up to the current position.
+ * @param useBeacon - use `navigator.sendBeacon` (if supported) so the request outlives the page
+ */
+ProgressTracker.prototype.flush = function(useBeacon) {
+    'use strict';
+    var payload;
+    var playing = this.start !== null;
+    this.stop();
+    if (playing) {
+        this.start = this.position;
+    }
+    if (!this.enabled || !this.segments.length || !this.duration) {
+        return;
+    }
+    payload = JSON.stringify({segments: this.segments, duration: this.duration});
+    this.segments = [];
+
+    if (useBeacon && navigator.sendBeacon && navigator.sendBeacon(this.reportUrl, payload)) {
+        return;
+    }
+    $.ajax({
+        type: 'POST',
+        url: this.reportUrl,
+        data: payload
+    });
+};
+
+
+var HLS_SOURCE_TYPE = 'application/vnd.apple.mpegurl';
+
+
+/**
+ * Order streaming sources by client capability: clients without Media Source Extensions (iOS) play
+ * only HLS natively, so it is moved first; others keep the server-side order (DASH first).
+ * @param sources - array of sources (or `<source>` elements) with `type`
+ * @returns ordered copy of the sources
+ */
+function orderSourcesByCapability(sources) {
+    'use strict';
+    var hasMediaSource = Boolean(window.MediaSource || window.WebKitMediaSource);
+    var playsHls = Boolean(document.createElement('video').canPlayType(HLS_SOURCE_TYPE));
+    var ordered = Array.prototype.slice.call(sources);
+    if (hasMediaSource || !playsHls) {
+        return ordered;
+    }
+    return ordered.filter(function(source) { return source.type === HLS_SOURCE_TYPE; })
+        .concat(ordered.filter(function(source) { return source.type !== HLS_SOURCE_TYPE; }));
+}
+
+
+/**
+ * Replace protection token of the player source shortly before it expires.
+ * The new token is applied only while playback has not started: started playback has already got its content key.
+ * @param player
+ * @param refreshUrl
+ * @param jsonArgs
+ * @param refreshIn - seconds till the current token should be replaced
+ */
+function scheduleProtectionTokenRefresh(player, refreshUrl, jsonArgs, refreshIn) {
     'use strict';
-    if (userIsAuthenticated) {
-        data.event_type = name;  // eslint-disable-line no-param-reassign
+    setTimeout(function() {
         $.ajax({
             type: 'POST',
-            url: eventPostUrl,
-            data: JSON.stringify(data)
+            url: refreshUrl,
+            data: '{}',
+            dataType: 'json'
+        }).done(function(response) {
+            if (response.result !== 'success') {
+                return;
+            }
+            if (player.paused() && !player.currentTime()) {
+                player.src(orderSourcesByCapability(jsonArgs.video_sources).map(function(source) {
+                    return {
+                        src: source.src,
+                        type: source.type,
+                        protectionInfo: [{
+                            type: jsonArgs.protection_type,
+                            authenticationToken: 'Bearer=' + response.token
+                        }]
+                    };
+                }));
+            }
+            scheduleProtectionTokenRefresh(player, refreshUrl, jsonArgs, response.refresh_in);
         });
+    }, Math.max(refreshIn, 1) * 1000);
+}
+
+
+/**
+ * Load Azure Media Player script and stylesheet once per page, then register the player plugins waiting for it.
+ * Players of all blocks on the page share the same loading.
+ * @param scriptUrl
+ * @param cssUrl
+ * @returns promise resolved when `amp` is available
+ */
+function loadAzureMediaPlayer(scriptUrl, cssUrl) {
+    'use strict';
+    // The loading is kept on window: the script may be included by every block of the page.
+    if (!window.azureMediaPlayerLoading) {
+        if (window.amp) {
+            window.azureMediaPlayerLoading = $.Deferred().resolve().promise();
+        } else {
+            $('<link rel="stylesheet">').attr('href', cssUrl).appendTo('head');
+            window.azureMediaPlayerLoading = $.ajax({url: scriptUrl, dataType: 'script', cache: true})
+                .fail(function() {
+                    // The next player start retries the loading:
+                    window.azureMediaPlayerLoading = null;
+                });
+        }
     }
+    return window.azureMediaPlayerLoading.then(function() {
+        var initializers = window.ampPluginInitializers || [];
+        window.ampPluginInitializers = [];
+        initializers.forEach(function(initialize) { initialize(); });
+    });
 }
 
 
 /**
- * Main xBlock initializer which interface is defined by xBlock API.
+ * Create Azure Media Player of the block.
  * @param runtime
  * @param container
  * @param jsonArgs
- * @constructor
+ * @param autoplay - start playback once the player is ready
  */
-function AzureMediaServicesBlock(runtime, container, jsonArgs) {
+function createPlayer(runtime, container, jsonArgs, autoplay) {
     'use strict';
     // IMPORTANT: We pass the <video> DOM element instead of its class or id. This mitigates
     //  a bug when switching units. Changing units triggers a "partial navigation" which
     //  entirely removes the xblock markup from the DOM.
     var downloadMediaList = [];
     var langSource;
-    var $sharePopup = $(container).find('.js-share-popup');
-    var $ddlSizeEmbed = $(container).find('#ddlSizeEmbed');
-    var $txtContentEmbed = $(container).find('#txtContentEmbed');
+    var $video = $(container).find('.xblock-video-amp');
+    var player;
+
+    // Sources are read by the player on initialization, so they are reordered before it:
+    $video.prepend(orderSourcesByCapability($video.find('source')));
 
-    var player = amp($(container).find('.xblock-video-amp')[0], null, function() { // eslint-disable-line no-unused-vars
+    player = amp($video[0], null, function() { // eslint-disable-line no-unused-vars
         var subtitleEls;
         var languageName;
-        var eventPostUrl = runtime.handlerUrl(container, 'publish_event');
-        var userIsAuthenticated = jsonArgs.user_is_authenticated;
+        var self = this;
+        var eventsBuffer = new PlayerEventsBuffer(
+            runtime.handlerUrl(container, 'publish_event'),
+            jsonArgs.user_is_authenticated,
+            jsonArgs.events_flush_interval,
+            jsonArgs.events_max_batch_size
+        );
+        var progressTracker = new ProgressTracker(
+            runtime.handlerUrl(container, 'report_progress'),
+            jsonArgs.user_is_authenticated && jsonArgs.progress_heartbeat_interval
+        );
+
+        if (autoplay) {
+            this.play();
+        }
+
+        // Watched segments tracking:
+        this.addEventListener(amp.eventName.timeupdate,
+            function() {
+                progressTracker.update(self.currentTime(), !self.paused(), self.duration());
+            }
+        );
+
+        this.addEventListener(amp.eventName.pause,
+            function() {
+                progressTracker.stop();
+            }
+        );
+
+        this.addEventListener(amp.eventName.ended,
+            function() {
+                progressTracker.flush(false);
+            }
+        );
 
         // Add event handlers:
         this.addEventListener(amp.eventName.pause,
             function() {
-                sendPlayerEvent(eventPostUrl, events.PAUSED, {}, userIsAuthenticated);
+                eventsBuffer.push(events.PAUSED, {});
             }
         );
 
         this.addEventListener(amp.eventName.play,
             function() {
-                sendPlayerEvent(eventPostUrl, events.PLAYED, {}, userIsAuthenticated);
+                eventsBuffer.push(events.PLAYED, {});
             }
         );
 
         this.addEventListener(amp.eventName.loadeddata,
             function() {
-                sendPlayerEvent(eventPostUrl, events.VIDEO_LOADED, {}, userIsAuthenticated);
+                eventsBuffer.push(events.VIDEO_LOADED, {});
             }
         );
 
         this.addEventListener(amp.eventName.seeked,
             function() {
-                sendPlayerEvent(eventPostUrl, events.POSITION_CHANGED, {}, userIsAuthenticated);
+                eventsBuffer.push(events.POSITION_CHANGED, {});
             }
         );
 
         this.addEventListener(amp.eventName.ended,
             function() {
-                sendPlayerEvent(eventPostUrl, events.STOPPED, {}, userIsAuthenticated);
+                eventsBuffer.push(events.STOPPED, {});
             }
         );
 
@@ -106,11 +370,98 @@ function AzureMediaServicesBlock(runtime, container, jsonArgs) {
                 languageName = '';
             }
 
-            sendPlayerEvent(eventPostUrl, reportEvent, {language_name: languageName}, userIsAuthenticated);
+            eventsBuffer.push(reportEvent, {language_name: languageName});
+        });
+    });
+
+    if (jsonArgs.protection_type && jsonArgs.protection_token_refresh_in !== null) {
+        scheduleProtectionTokenRefresh(
+            player,
+            runtime.handlerUrl(container, 'refresh_protection_token'),
+            jsonArgs,
+            jsonArgs.protection_token_refresh_in
+        );
+    }
+
+    player.transcriptsAmpPlugin({
+        hidden: !jsonArgs.transcripts_enabled,
+        fetchUrl: runtime.handlerUrl(container, 'fetch_transcript'),
+        transcripts: jsonArgs.transcripts
+    });
+
+    // Do not perform further media download processing if disabled:
+    if (!jsonArgs.assets_download) return;
+
+    // xBlock's Studio editor has switch control for transcripts download button:
+    if (jsonArgs.transcripts_enabled) {
+        for (var i = 0; i < jsonArgs.transcripts.length; i++) { // eslint-disable-line vars-on-top
+            downloadMediaList.push({
+                lang: jsonArgs.transcripts[i].srclang,
+                type: amp.downloadableMediaType.transcript,
+                uri: jsonArgs.transcripts[i].src
+            });
+        }
+    }
+
+    langSource = downloadMediaList.length
+        ? downloadMediaList.slice()
+        : [{lang: player.language()}];
+
+    // Here we take care video download is available for all presented locales:
+    langSource.forEach(function(media) {
+        downloadMediaList.push({
+            lang: media.lang,
+            type: amp.downloadableMediaType.video,
+            uri: jsonArgs.video_download_uri
         });
     });
 
-    player.transcriptsAmpPlugin({hidden: !jsonArgs.transcripts_enabled});
+    player.downloadableMedia(downloadMediaList);
+}
+
+
+/**
+ * Main xBlock initializer which interface is defined by xBlock API.
+ *
+ * With the player facade (poster with a play button) the player is created when the facade is clicked or
+ * scrolled into view, so blocks below the fold don't load Azure Media Player on the page load.
+ * @param runtime
+ * @param container
+ * @param jsonArgs
+ * @constructor
+ */
+function AzureMediaServicesBlock(runtime, container, jsonArgs) {
+    'use strict';
+    var $sharePopup = $(container).find('.js-share-popup');
+    var $ddlSizeEmbed = $(container).find('#ddlSizeEmbed');
+    var $txtContentEmbed = $(container).find('#txtContentEmbed');
+    var $facade = $(container).find('.js-player-facade');
+    var started = false;
+    // Playback is started if the facade is clicked, also while the player is loading after scrolling:
+    var autoplay = false;
+    var observer;
+
+    /**
+     * Replace the facade with the player.
+     */
+    function start() {
+        if (started) {
+            return;
+        }
+        started = true;
+        if (observer) {
+            observer.disconnect();
+        }
+        $facade.addClass('is-loading');
+        loadAzureMediaPlayer(jsonArgs.amp_script_url, jsonArgs.amp_css_url).done(function() {
+            $facade.remove();
+            $(container).find('.xblock-video-amp').removeClass('is-hidden');
+            createPlayer(runtime, container, jsonArgs, autoplay);
+        }).fail(function() {
+            started = false;
+            $facade.removeClass('is-loading');
+        });
+    }
 
      /**
      * Create a value for the txtContentEmbed field
@@ -143,32 +494,26 @@ function AzureMediaServicesBlock(runtime, container, jsonArgs) {
         $txtContentEmbed.val(getContentEmbed());
     });
 
-    // Do not perform further media download processing if disabled:
-    if (!jsonArgs.assets_download) return;
-
-    // xBlock's Studio editor has switch control for transcripts download button:
-    if (jsonArgs.transcripts_enabled) {
-        for (var i = 0; i < jsonArgs.transcripts.length; i++) { // eslint-disable-line vars-on-top
-            downloadMediaList.push({
-                lang: jsonArgs.transcripts[i].srclang,
-                type: amp.downloadableMediaType.transcript,
-                uri: jsonArgs.transcripts[i].src
-            });
-        }
+    // Protection token of the video couldn't be issued (see `player.html`):
+    if (!$(container).find('.xblock-video-amp').length) {
+        return;
     }
-
-    langSource = downloadMediaList.length
-        ? downloadMediaList.slice()
-        : [{lang: player.language()}];
-
-    // Here we take care video download is available for all presented locales:
-    langSource.forEach(function(media) {
-        downloadMediaList.push({
-            lang: media.lang,
-            type: amp.downloadableMediaType.video,
-            uri: jsonArgs.video_download_uri
-        });
+    if (!$facade.length) {
+        start();
+        return;
+    }
+    $facade.on('click', function(event) {
+        event.preventDefault();
+        autoplay = true;
+        start();
     });
-
-    player.downloadableMedia(downloadMediaList);
+    // Without IntersectionObserver support the player is created on click only:
+    if ('IntersectionObserver' in window) {
+        observer = new IntersectionObserver(function(entries) {
+            if (entries.some(function(entry) { return entry.isIntersecting; })) {
+                start();
+            }
+        }, {rootMargin: jsonArgs.player_facade_margin + 'px'});
+        observer.observe($facade[0]);
+    }
 }
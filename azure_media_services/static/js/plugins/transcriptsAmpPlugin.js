@@ -3,10 +3,14 @@
 
 /* global _ amp gettext */
 
-(function() {
+// Azure Media Player script is loaded on demand, so the plugin is registered once it is loaded
+// (see `loadAzureMediaPlayer` in player.js):
+window.ampPluginInitializers = window.ampPluginInitializers || [];
+window.ampPluginInitializers.push(function() {
     'use strict';
 
-    var transcriptCues = null;
+    // Pending/finished compact cues requests by transcript URL, shared by players of the same transcript:
+    var cuesRequests = {};
 
     var Component = amp.getComponent('Component');
     var MenuItem = amp.getComponent('MenuItem');
@@ -23,8 +27,7 @@
         },
         handleClick: function(evt) {  // eslint-disable-line no-unused-vars
             var player = this.player();
-            var $wrapper = $('div.tc-wrapper');
-            var $transcriptContainer = $('div.tc-container');
+            var view = this.options_.parent.options_.view;  // eslint-disable-line no-underscore-dangle
 
             this.options_.parent.items.forEach(function(item) {  // eslint-disable-line no-underscore-dangle
                 item.selected(false);
@@ -32,12 +35,18 @@
             this.selected(true);
 
             if (this.options_.identity === 'off') {  // eslint-disable-line no-underscore-dangle
-                $wrapper.addClass('closed');
+                view.$wrapper.addClass('closed');
+                view.transcript = null;
             } else {
-                transcriptCues = initTranscript(  // eslint-disable-line no-use-before-define
-                    player, $transcriptContainer, this.track
-                );
-                $wrapper.removeClass('closed');
+                // The container must be visible before the transcript is rendered (cues are measured):
+                view.$wrapper.removeClass('closed');
+                loadCues(  // eslint-disable-line no-use-before-define
+                    this.options_.parent.options_, this.track  // eslint-disable-line no-underscore-dangle
+                ).done(function(cues) {
+                    view.transcript = initTranscript(  // eslint-disable-line no-use-before-define
+                        player, view.$container, cues
+                    );
+                });
             }
         }
     });
@@ -94,40 +103,24 @@
         }
     });
 
-    var CueItem = amp.extend(MenuItem, {
-        constructor: function() {
-            var player = arguments[0];  // eslint-disable-line no-unused-vars
-            var options = arguments[1];
-            this.text = options.text;
-            this.startTime = options.startTime;
-            this.endTime = options.endTime;
-            MenuItem.apply(this, arguments);
-        },
-        createEl: function() {
-            return Component.prototype.createEl(
-                'li',
-                {
-                    tabIndex: -1,
-                    role: 'link',
-                    className: 'transcript-cue',
-                    innerHTML: $('<span>').text(this.options_.text).html()  // eslint-disable-line no-underscore-dangle
-                },
-                {
-                    'data-cue-start': this.options_.startTime  // eslint-disable-line no-underscore-dangle
-                }
-            );
-        }
-    });
-
     amp.registerComponent('TranscriptsMenuButton', TranscriptsMenuButton);
     amp.plugin('transcriptsAmpPlugin', function(options) {
         var player = this;
-        var timeHandler = null;
         var $vidParent = $(player.el()).parent().parent();
-        var tcButton = new TranscriptsMenuButton(player, {title: 'TRANSCRIPTS'});
         var mainContainer = new MainContainer(player, {});
         var transcriptContainer = new TranscriptContainer(player, {});
-        var $transcriptContainerEl = $(transcriptContainer.el());
+        // Transcript elements of this player and its shown transcript (pages may have several players):
+        var view = {
+            $wrapper: $(mainContainer.el()),
+            $container: $(transcriptContainer.el()),
+            transcript: null
+        };
+        var tcButton = new TranscriptsMenuButton(player, {
+            title: 'TRANSCRIPTS',
+            fetchUrl: options.fetchUrl,
+            transcripts: options.transcripts || [],
+            view: view
+        });
 
         this.addEventListener('loadeddata', function() {
             $vidParent.wrap(mainContainer.el());
@@ -140,104 +133,155 @@
                     .addChild(tcButton);
             }
         });
-        this.addEventListener(amp.eventName.play, function(evt) {  // eslint-disable-line no-unused-vars
-            timeHandler = setInterval(function() {
-                syncTimer(player, transcriptCues, $transcriptContainerEl);  // eslint-disable-line no-use-before-define
-            },
-            100
-            );
-        });
-        this.addEventListener(amp.eventName.pause, function(evt) {  // eslint-disable-line no-unused-vars
-            if (timeHandler !== null) {
-                clearInterval(timeHandler);
-            }
-        });
-        this.addEventListener(amp.eventName.ended, function(evt) {  // eslint-disable-line no-unused-vars
-            if (timeHandler !== null) {
-                clearInterval(timeHandler);
-            }
+        // `timeupdate` follows the actual playback (including seeking while paused):
+        this.addEventListener(amp.eventName.timeupdate, function() {
+            syncTranscript(player, view.transcript);  // eslint-disable-line no-use-before-define
         });
     });
 
-     /**
-     * This is called regularly while the video plays
-     * so that we can correctly highlight the transcript elements
-     * based on the current position of the video playback
+    /**
+     * Find the index of the cue active at the given time, -1 if there is no such cue.
+     * Cues are sorted by start time, so binary search is used. Playback mostly moves forward,
+     * so the previously active cue and the next one are checked first.
+     * @param cues - compact cues
+     * @param time
+     * @param hint - previously active cue index
+     * @returns {number}
+     */
+    function findCueIndex(cues, time, hint) {
+        var middle;
+        var low = 0;
+        var high = cues.start.length - 1;
+
+        if (hint >= 0 && cues.start[hint] <= time && (hint + 2 > high || time < cues.start[hint + 2])) {
+            low = hint;
+            high = Math.min(hint + 1, high);
+        }
+        // Find the last cue which starts before (or at) the given time:
+        while (low <= high) {
+            middle = Math.floor((low + high) / 2);
+            if (cues.start[middle] <= time) {
+                low = middle + 1;
+            } else {
+                high = middle - 1;
+            }
+        }
+        return high >= 0 && time < cues.end[high] ? high : -1;
+    }
+
+    /**
+     * Highlight the transcript cue matching the current playback position.
+     * DOM is touched only when the active cue changes.
      * @param player
-     * @param trackCues
-     * @param $transcriptElement
+     * @param transcriptList - shown transcript (see `initTranscript`)
      * @private
      */
-    function syncTimer(player, trackCues, $transcriptElement) {
-        // Gather each transcript phrase (each pseudo-hyperlink in transcript).
-        var cue;
-        var isActive;
-        var $targetElement;
-        var scrollUpSize;
-        var $transcriptItems = $transcriptElement.find('.transcript-cue');
-        var currentTime = player.currentTime();
-
-        if (trackCues === null || !$transcriptElement.length) {
+    function syncTranscript(player, transcriptList) {
+        var index;
+
+        if (transcriptList === null) {
+            return;
+        }
+        index = findCueIndex(transcriptList.cues, player.currentTime(), transcriptList.activeIndex);
+        if (index === -1 || index === transcriptList.activeIndex) {
             return;
         }
+        transcriptList.setActive(index);
+        // Autoscroll.
+        transcriptList.scrollToCue(index);
+    }
 
-        // Simple linear search.
-        for (var i = 0; i < trackCues.length; i++) {  // eslint-disable-line vars-on-top
-            cue = trackCues[i];
+    /**
+     * Virtualized (windowed) transcript cues list.
+     * Only the cues visible in the container plus `TranscriptList.BUFFER` cues around them are rendered.
+     * Cue heights are estimated from the text length and corrected as soon as cues are rendered;
+     * `offsets` (cue top offsets) map the scroll position to cues and back in O(log n).
+     * @param player
+     * @param $container - scrollable container
+     * @param cues - compact cues: {start: [...], end: [...], text: [...]}
+     * @constructor
+     */
+    function TranscriptList(player, $container, cues) {
+        this.player = player;
+        this.cues = cues;
+        this.$container = $container;
+        this.$list = $('<ul class="subtitles-menu"></ul>');
+        this.activeIndex = -1;
+        this.first = -1;
+        this.last = -1;
+        this.renderPending = false;
 
-            if (currentTime >= cue.startTime && currentTime < cue.endTime) {
-                $targetElement = $transcriptItems.eq(i);
+        $container.html(this.$list);
+        this.estimateHeights();
+        this.bindEvents();
+        this.render();
+    }
 
-                isActive = $targetElement.hasClass('current');
-                if (!isActive) {
-                    // Highlight the correct one
-                    $transcriptItems.removeClass('current');
-                    $targetElement.addClass('current');
+    TranscriptList.BUFFER = 20;
 
-                    // Autoscroll.
-                    scrollUpSize = Math.abs(
-                        $transcriptElement.offset().top - $transcriptItems.first().offset().top
-                    ) + (
-                        $targetElement.offset().top - $transcriptElement.offset().top
-                    );
-                    $transcriptElement.scrollTo(scrollUpSize, 1000);
-                }
-                return;
-            }
+    /**
+     * Estimate cue heights by the number of text lines, using a single-line probe cue for measurements.
+     */
+    TranscriptList.prototype.estimateHeights = function() {
+        var $probe = $('<li class="transcript-cue">&nbsp;</li>').appendTo(this.$list);
+        var rowHeight = $probe.outerHeight(true);
+        var lineHeight = $probe.height();
+        var charsPerLine = Math.max(10, Math.floor($probe.width() / (parseFloat($probe.css('font-size')) * 0.5)));
+
+        this.heights = this.cues.text.map(function(text) {
+            return rowHeight + (Math.max(1, Math.ceil(text.length / charsPerLine)) - 1) * lineHeight;
+        });
+        $probe.remove();
+        this.computeOffsets();
+    };
+
+    TranscriptList.prototype.computeOffsets = function() {
+        this.offsets = [0];
+        for (var i = 0; i < this.heights.length; i++) { // eslint-disable-line vars-on-top
+            this.offsets.push(this.offsets[i] + this.heights[i]);
         }
-    }
+    };
 
     /**
-     * Transcripts creating.
-     * @param player
-     * @param $transcriptElement
-     * @param track
-     * @returns {Array}
+     * Index of the cue at the given vertical offset (binary search over the cue offsets).
+     * @param offset
+     * @returns {number}
      */
-    function initTranscript(player, $transcriptElement, track) {
-        var cue;
-        var cueComponent;
-        var startTime;
-        var $transcriptItems;
-        var cues = track.cues;
-        var $html = $('<ul class="subtitles-menu"></ul>');
-
-        for (var i = 0; i < cues.length; i++) { // eslint-disable-line vars-on-top
-            cue = cues[i];
-            cueComponent = new CueItem(player, {
-                text: cue.text,
-                startTime: cue.startTime,
-                endTime: cue.endTime
-            });
-            $html.append(cueComponent.el());
+    TranscriptList.prototype.indexAt = function(offset) {
+        var middle;
+        var low = 0;
+        var high = this.heights.length - 1;
+
+        while (low < high) {
+            middle = Math.ceil((low + high) / 2);
+            if (this.offsets[middle] <= offset) {
+                low = middle;
+            } else {
+                high = middle - 1;
+            }
         }
-        $transcriptElement.html($html);
+        return low;
+    };
 
-        // Gather each transcript phrase (each pseudo-hyperlink in transcript).
-        $transcriptItems = $transcriptElement.find('.transcript-cue');
+    /**
+     * Single delegated handler serves all cues (rendered now or later).
+     */
+    TranscriptList.prototype.bindEvents = function() {
+        var list = this;
 
+        this.$container.off('.transcripts');
+        this.$container.on('scroll.transcripts', function() {
+            if (!list.renderPending) {
+                list.renderPending = true;
+                (window.requestAnimationFrame || setTimeout)(function() {
+                    list.renderPending = false;
+                    list.render();
+                });
+            }
+        });
         // Handle events when user clicks on transcripts
-        $transcriptItems.on('click keypress', function(evt) {
+        this.$container.on('click.transcripts keypress.transcripts', '.transcript-cue', function(evt) {
+            var index;
             var KeyCode = (evt.type === 'keydown' && evt.keyCode ? evt.keyCode : evt.which);
             if (evt.type !== 'click' && (KeyCode !== 32 && KeyCode !== 13)) {
                 return;
@@ -246,17 +290,138 @@
                 evt.preventDefault();
             }
 
-            // Clear all active
-            $transcriptItems.removeClass('current');
+            // Highlight the one the user clicked and set the player to match the transcript time.
+            index = parseInt($(evt.currentTarget).data('cue-index'), 10);
+            list.setActive(index);
+            list.player.currentTime(list.cues.start[index]);
+        });
+    };
+
+    /**
+     * Render the cues window matching the current scroll position.
+     */
+    TranscriptList.prototype.render = function() {
+        var scrollTop = this.$container.scrollTop();
+        var count = this.heights.length;
+        var first = Math.max(0, this.indexAt(scrollTop) - TranscriptList.BUFFER);
+        var last = Math.min(count - 1, this.indexAt(scrollTop + this.$container.innerHeight()) + TranscriptList.BUFFER);
+        var html = [];
+
+        if (!count || (first === this.first && last === this.last)) {
+            return;
+        }
+        this.first = first;
+        this.last = last;
 
-            // Highlight the one the user clicked.
-            $(evt.target).addClass('current');
+        for (var i = first; i <= last; i++) { // eslint-disable-line vars-on-top
+            html.push(
+                '<li class="transcript-cue' + (i === this.activeIndex ? ' current' : '') + '" tabindex="-1" ' +
+                'role="link" data-cue-index="' + i + '">' + _.escape(this.cues.text[i]) + '</li>'
+            );
+        }
+        this.$list.html(
+            '<li class="transcript-spacer"></li>' + html.join('') + '<li class="transcript-spacer"></li>'
+        );
+        this.measure();
+    };
 
-            // Set the player to match the transcript time
-            startTime = parseFloat($(evt.target).data('cue-start'));
-            player.currentTime(startTime);
+    /**
+     * Replace estimated heights of the rendered cues by the actual ones and resize the spacers.
+     */
+    TranscriptList.prototype.measure = function() {
+        var list = this;
+        var changed = false;
+        var $spacers = this.$list.children('.transcript-spacer');
+
+        this.$list.children('.transcript-cue').each(function(offset) {
+            var height = $(this).outerHeight(true);
+            if (height && height !== list.heights[list.first + offset]) {
+                list.heights[list.first + offset] = height;
+                changed = true;
+            }
         });
+        if (changed) {
+            this.computeOffsets();
+        }
+        $spacers.first().height(this.offsets[this.first]);
+        $spacers.last().height(this.offsets[this.heights.length] - this.offsets[this.last + 1]);
+    };
+
+    /**
+     * Mark the cue as the active one (only rendered cues are touched).
+     * @param index
+     */
+    TranscriptList.prototype.setActive = function(index) {
+        this.$list.children('.transcript-cue.current').removeClass('current');
+        this.$list.children('[data-cue-index="' + index + '"]').addClass('current');
+        this.activeIndex = index;
+    };
 
+    /**
+     * Scroll the cue to the top of the container.
+     * @param index
+     */
+    TranscriptList.prototype.scrollToCue = function(index) {
+        this.$container.scrollTo(this.offsets[index], 1000);
+    };
+
+    /**
+     * Convert text track cues parsed by the browser into compact cues.
+     * @param track
+     * @returns {{start: Array, end: Array, text: Array}}
+     */
+    function cuesFromTrack(track) {
+        var cues = {start: [], end: [], text: []};
+        var trackCues = track.cues || [];
+
+        for (var i = 0; i < trackCues.length; i++) { // eslint-disable-line vars-on-top
+            cues.start.push(trackCues[i].startTime);
+            cues.end.push(trackCues[i].endTime);
+            cues.text.push(trackCues[i].text);
+        }
         return cues;
     }
-}).call(this);
+
+    /**
+     * Get compact cues ({start: [...], end: [...], text: [...]}) for the track.
+     * Cues are parsed server-side by `fetch_transcript` handler, the browser parsed track is a fallback.
+     * @param options - menu button options (`fetchUrl` and `transcripts` list)
+     * @param track
+     * @returns {Promise}
+     */
+    function loadCues(options, track) {
+        var transcript = _.findWhere(options.transcripts, {srclang: track.language});
+
+        if (!options.fetchUrl || !transcript) {
+            return $.Deferred().resolve(cuesFromTrack(track)).promise();
+        }
+        if (!cuesRequests[transcript.src]) {
+            cuesRequests[transcript.src] = $.ajax({
+                type: 'POST',
+                url: options.fetchUrl,
+                data: JSON.stringify({srcUrl: transcript.src, srcLang: transcript.srclang, format: 'cues'}),
+                dataType: 'json'
+            }).then(
+                function(data) {
+                    return data.result === 'success' ? data.cues : cuesFromTrack(track);
+                },
+                function() {
+                    delete cuesRequests[transcript.src];
+                    return $.Deferred().resolve(cuesFromTrack(track)).promise();
+                }
+            );
+        }
+        return cuesRequests[transcript.src];
+    }
+
+    /**
+     * Transcripts creating.
+     * @param player
+     * @param $transcriptElement
+     * @param cues - compact cues: {start: [...], end: [...], text: [...]}
+     * @returns {TranscriptList}
+     */
+    function initTranscript(player, $transcriptElement, cues) {
+        return new TranscriptList(player, $transcriptElement, cues);
+    }
+});
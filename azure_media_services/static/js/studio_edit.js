@@ -15,6 +15,12 @@ function StudioEditableXBlockMixin(runtime, element) {
     var tinyMceAvailable = (typeof $.fn.tinymce !== 'undefined');
     var datepickerAvailable = (typeof $.fn.datepicker !== 'undefined'); // Studio includes datepicker jQuery plugin
     var handlerUrlGetCaptionsAndVideoInfo = runtime.handlerUrl(element, 'get_captions_and_video_info');
+    var handlerUrlGetStreamVideos = runtime.handlerUrl(element, 'get_stream_videos');
+    var $containerStreamVideos = $(element).find('.js-container-stream-videos');
+    var $searchStreamVideos = $(element).find('.js-stream-videos-search');
+    var $statusStreamVideos = $(element).find('.js-stream-videos-status');
+    var $moreStreamVideos = $(element).find('.js-stream-videos-more');
+    var streamVideosState = {loaded: false, nextCursor: null, request: null, searchTimeout: null};
     var $containerCaptions = $(element).find('.js-container-captions');
     var $inputEdxVideoId = $(element).find('[data-field-name = "edx_video_id"] input');
     var $inputVideoUrl = $(element).find('[data-field-name = "video_url"] input');
@@ -337,6 +343,88 @@ function StudioEditableXBlockMixin(runtime, element) {
         }).fail(showErrorFail);
     }
 
+    /**
+     * loadStreamVideos - load the next page of available stream videos
+     * @param reset - start from the first page (e.g. when filters were changed)
+     */
+    function loadStreamVideos(reset) {
+        var template = _.template(
+            '<li><input id="radio-stream-video-<%= id %>" type="radio" name="stream_video" ' +
+            'value="<%- edxVideoId %>" <% if (checked) { %> checked <% } %>/>' +
+            '<label for="radio-stream-video-<%= id %>"><span class="media-file-name"><%- clientVideoId %></span>' +
+            '<div class="media-source">(<%- edxVideoId %>)</div></label></li><hr/>'
+        );
+        if (streamVideosState.request) {
+            streamVideosState.request.abort();
+        }
+        if (reset) {
+            streamVideosState.nextCursor = null;
+            $containerStreamVideos.empty();
+        }
+        streamVideosState.loaded = true;
+        $moreStreamVideos.addClass('is-hidden');
+        streamVideosState.request = $.ajax({
+            type: 'POST',
+            url: handlerUrlGetStreamVideos,
+            data: JSON.stringify({
+                search: $searchStreamVideos.val(),
+                status: $statusStreamVideos.val(),
+                cursor: streamVideosState.nextCursor
+            }),
+            dataType: 'json',
+            success: function(data) {
+                var i,
+                    offset = $containerStreamVideos.find('li').length;
+                if (data.result !== 'success') {
+                    $containerStreamVideos.html(
+                        _.template('<span class="ams-info"><%- message %></span>')({message: data.message})
+                    );
+                    return;
+                }
+                for (i = 0; i < data.videos.length; i++) {
+                    $containerStreamVideos.append(template({
+                        id: offset + i + 1,
+                        edxVideoId: data.videos[i].edx_video_id,
+                        clientVideoId: data.videos[i].client_video_id,
+                        checked: data.videos[i].edx_video_id === $inputEdxVideoId.val()
+                    }));
+                }
+                if (!offset && !data.videos.length) {
+                    $containerStreamVideos.html(
+                        _.template('<span class="ams-info"><%- message %></span>')({
+                            message: gettext('No media available.')
+                        })
+                    );
+                }
+                streamVideosState.nextCursor = data.next_cursor;
+                $moreStreamVideos.toggleClass('is-hidden', !data.next_cursor);
+            }
+        }).fail(function(jqXHR, textStatus) {
+            if (textStatus !== 'abort') {
+                showErrorFail(jqXHR);
+            }
+        }).always(function() {
+            streamVideosState.request = null;
+        });
+    }
+
+    $moreStreamVideos.on('click', function(e) {
+        e.preventDefault();
+        loadStreamVideos(false);
+    });
+
+    $statusStreamVideos.on('change', function() {
+        loadStreamVideos(true);
+    });
+
+    $searchStreamVideos.on('input', function() {
+        // Wait until the author stops typing:
+        clearTimeout(streamVideosState.searchTimeout);
+        streamVideosState.searchTimeout = setTimeout(function() {
+            loadStreamVideos(true);
+        }, 300);
+    });
+
     $(element).find('.js-header-tab').on('click', function(e) {
         var $currentTarget = $(e.currentTarget);
         var dataTab = $currentTarget.data('tab');
@@ -346,12 +434,16 @@ function StudioEditableXBlockMixin(runtime, element) {
         $(element).find('.component-tab').addClass('is-inactive');
         $(element).find('.' + dataTab).removeClass('is-inactive');
 
+        if ($containerStreamVideos.length && !streamVideosState.loaded) {
+            loadStreamVideos(true);
+        }
+
         if ($inputEdxVideoId.val() && !$containerCaptions.hasClass('render_captions')) {
             getCaptionsAndVideoInfo($inputEdxVideoId.val(), false);
         }
     });
 
-    $(element).find('[name = "stream_video"]').on('change', function(e) {
+    $containerStreamVideos.on('change', '[name = "stream_video"]', function(e) {
         var $currentTarget = $(e.currentTarget);
         var edxVideoID = $currentTarget.val();
         resetCaptionsField();
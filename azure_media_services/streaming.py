@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Streaming sources of the Azure Media Services videos.
+
+Azure dynamic packaging serves the same streaming locator as Smooth Streaming, MPEG-DASH and HLS,
+selected with the `format` manifest parameter, so the player gets the manifest each client plays natively
+instead of falling back through playback technologies.
+"""
+import re
+
+SMOOTH = 'smooth'
+DASH = 'dash'
+HLS = 'hls'
+
+# Protocol -> (manifest format parameter, MIME type):
+PROTOCOLS = {
+    SMOOTH: (None, 'application/vnd.ms-sstr+xml'),
+    DASH: ('mpd-time-csf', 'application/dash+xml'),
+    HLS: ('m3u8-aapl', 'application/vnd.apple.mpegurl'),
+}
+# Default order of the sources; the player moves HLS first on clients without Media Source Extensions (iOS):
+DEFAULT_PROTOCOLS_ORDER = (DASH, SMOOTH, HLS)
+
+MANIFEST_URL_RE = re.compile(r'^(?P<base>.+/manifest)(?:\(format=[^)]*\))?(?P<query>\?.*)?$', re.IGNORECASE)
+
+
+def get_streaming_sources(video_url, protocols=DEFAULT_PROTOCOLS_ORDER):
+    """
+    Return ordered streaming sources of the video.
+
+    Only Smooth Streaming source is returned for URLs that are not Azure streaming manifests.
+
+    :param video_url: streaming manifest URL of any format
+    :return: list of dicts of `protocol`, `src` and `type`
+    """
+    if not video_url:
+        return []
+
+    match = MANIFEST_URL_RE.match(video_url)
+    if match is None:
+        return [{'protocol': SMOOTH, 'src': video_url, 'type': PROTOCOLS[SMOOTH][1]}]
+
+    sources = []
+    for protocol in protocols:
+        manifest_format, mime_type = PROTOCOLS[protocol]
+        src = match.group('base')
+        if manifest_format:
+            src += '(format={})'.format(manifest_format)
+        sources.append({'protocol': protocol, 'src': src + (match.group('query') or ''), 'type': mime_type})
+    return sources
@@ -0,0 +1,55 @@
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+# Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+"""
+Test settings: stubs of edx-platform and `azure_video_pipeline` modules and Django configuration.
+
+They are applied only if the tests don't run inside a configured Django project.
+"""
+import sys
+
+import django
+from django.conf import settings
+import mock
+
+STUBBED_MODULES = (
+    'azure_video_pipeline',
+    'azure_video_pipeline.media_service',
+    'azure_video_pipeline.utils',
+    'edxval',
+    'edxval.models',
+    'lms',
+    'lms.djangoapps',
+    'lms.djangoapps.courseware',
+    'lms.djangoapps.courseware.access',
+    'lms.djangoapps.courseware.views',
+    'lms.djangoapps.courseware.views.views',
+    'opaque_keys',
+    'opaque_keys.edx',
+    'opaque_keys.edx.keys',
+    'util',
+    'util.views',
+    'xmodule',
+    'xmodule.modulestore',
+    'xmodule.modulestore.django',
+    'xmodule.modulestore.exceptions',
+)
+
+
+def stub_modules(names):
+    """
+    Replace modules with mocks; submodule stubs are also set as attributes of their package stubs.
+    """
+    for name in names:
+        module = sys.modules[name] = mock.MagicMock()
+        package, _, attribute = name.rpartition('.')
+        if package:
+            setattr(sys.modules[package], attribute, module)
+
+
+if not settings.configured:
+    stub_modules(STUBBED_MODULES)
+    settings.configure(
+        LMS_ROOT_URL='http://lms.com'
+    )
+    django.setup()
@@ -0,0 +1,149 @@
+"""
+Local fake Azure Media Services REST API and blob storage with injectable latency and failures.
+
+Asset, locator and asset files lookups are answered in the REST API format, any `/blobs/...` path is
+a transcript blob download (with `ETag` revalidation, as Azure storage does).
+
+`FakeMediaServiceClient` has the lookup methods of `azure_video_pipeline` media service client and calls
+the fake server over HTTP (without timeouts, as the real client does).
+"""
+import hashlib
+import json
+import random
+import threading
+
+import requests
+from six.moves import BaseHTTPServer, socketserver
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Response is written with a single send to avoid delayed ACK stalls:
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            status = server.failures.pop(0) if server.failures else 200
+        if status == 200 and server.error_rate and random.random() < server.error_rate:
+            status = 503
+        if server.latency:
+            server.stopped.wait(server.latency)
+
+        path, _, query = self.path.partition('?')
+        if status == 200 and path.startswith('/blobs/'):
+            self.send_blob(server.transcript)
+            return
+        if status != 200:
+            body = json.dumps({'error': {'code': status, 'message': 'Injected failure'}})
+        elif path == '/Assets':
+            body = json.dumps({'value': [{'Id': 'asset-{}'.format(query.rsplit('=', 1)[-1]), 'State': 'ENCODED'}]})
+        elif path.endswith('/Locators'):
+            body = json.dumps({'value': [{'Path': '//ams.streaming/{}/'.format(query.rsplit('=', 1)[-1])}]})
+        elif path.endswith('/Files'):
+            body = json.dumps({'value': [{'Name': 'video.mp4', 'ContentFileSize': '1024'}]})
+        else:
+            status, body = 404, json.dumps({'error': {'code': 404, 'message': 'Not found'}})
+
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_blob(self, content):
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/vtt')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class FakeAMSServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded fake AMS server on a random local port, run with `start`/`stop`.
+
+    `latency` (seconds) delays every response; `failures` is a list of HTTP statuses returned by the next requests,
+    `error_rate` is a fraction of the other requests failed with 503; blobs have `transcript` content.
+    """
+
+    daemon_threads = True
+    # Load tests open many concurrent connections:
+    request_queue_size = 128
+
+    def __init__(self, latency=0, error_rate=0, transcript=b'WEBVTT\n'):
+        """
+        Bind to a free local port.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.transcript = transcript
+        self.failures = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        # Delayed responses are sent at once when the server is stopped:
+        self.stopped = threading.Event()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients which have stopped waiting (on deadline) close connections before delayed responses are sent.
+        pass
+
+
+class FakeMediaServiceClient(object):
+    """
+    Media service client of the fake server.
+    """
+
+    def __init__(self, url):
+        """
+        Use the fake server by its base URL.
+        """
+        self.url = url
+        self.session = requests.Session()
+
+    def _get(self, path, **params):
+        response = self.session.get(self.url + path, params=params)
+        response.raise_for_status()
+        return response.json()['value']
+
+    def get_input_asset_by_video_id(self, edx_video_id, asset_type):
+        assets = self._get('/Assets', video_id=edx_video_id)
+        return assets[0] if assets else None
+
+    def get_asset_locators(self, asset_id, locator_type):
+        locators = self._get("/Assets('{}')/Locators".format(asset_id), type=locator_type)
+        return locators[0] if locators else None
+
+    def get_asset_files(self, asset_id):
+        return self._get("/Assets('{}')/Files".format(asset_id))
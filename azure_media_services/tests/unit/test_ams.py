@@ -1,16 +1,26 @@
+from datetime import datetime
 import json
 import unittest
+import zlib
 
+from django.core.cache import cache
 from django.core.urlresolvers import NoReverseMatch
+from django.test.utils import override_settings
+from django.utils.timezone import utc
 import mock
 import requests
+from webob import Request
 from xblock.field_data import DictFieldData
 
-from azure_media_services import AMSXBlock
+from azure_media_services.ams import AMP_SCRIPT_URL, AMSXBlock, RENDER_CONTEXT_VERSION
+from azure_media_services.utils import decode_cursor
 
 
 class AMSXBlockTests(unittest.TestCase):
 
+    def setUp(self):
+        cache.clear()
+
     def make_one(self, **kw):
         """
         Create a XBlock AMS for testing purpose.
@@ -34,12 +44,11 @@ class AMSXBlockTests(unittest.TestCase):
         self.assertEqual(block.download_url, None)
 
     @mock.patch('azure_media_services.ams.AMSXBlock.get_embed_url', return_value=None)
-    @mock.patch('azure_media_services.ams.get_azure_config', return_value={})
-    @mock.patch('azure_media_services.ams.loader.load_unicode', side_effect=('public/css/studio.css',
-                                                                             'static/js/studio_edit.js'))
-    @mock.patch('azure_media_services.ams.loader.render_django_template')
+    @mock.patch('azure_video_pipeline.utils.get_azure_config', return_value={})
+    @mock.patch('azure_media_services.ams.load_resource', side_effect=lambda path: path)
+    @mock.patch('azure_media_services.ams.render_template')
     @mock.patch('azure_media_services.ams.Fragment')
-    def test_studio_view(self, fragment, render_django_template, load_unicode, get_azure_config, get_embed_url):
+    def test_studio_view(self, fragment, render_django_template, load_resource, get_azure_config, get_embed_url):
         """
         Test studio view is displayed correctly.
         """
@@ -55,14 +64,82 @@ class AMSXBlockTests(unittest.TestCase):
 
         context = render_django_template.call_args[0][1]
         self.assertEqual(context['has_azure_config'], False)
-        self.assertEqual(context['list_stream_videos'], [])
+        self.assertNotIn('list_stream_videos', context)
+        self.assertEqual(context['stream_video_statuses'], ['file_complete', 'file_encrypted'])
         self.assertEqual(len(context['fields']), 13)
 
         frag.add_javascript.assert_called_once_with('static/js/studio_edit.js')
         frag.add_css.assert_called_once_with("public/css/studio.css")
         frag.initialize_js.assert_called_once_with("StudioEditableXBlockMixin")
 
-    @mock.patch('azure_media_services.ams.Video.objects.filter', return_value=mock.Mock(order_by=mock.Mock(
+    @mock.patch('azure_media_services.ams.get_bundle_paths', return_value={
+        'vttcue.js': 'public/bundle/vttcue.1.js',
+        'player.js': 'public/bundle/player.2.js',
+        'player.css': 'public/bundle/player.3.css',
+    })
+    def test_student_view_static_bundle(self, get_bundle_paths):
+        block = self.make_one()
+        block.runtime.local_resource_url.side_effect = lambda block, path: '/resource/' + path
+
+        frag = block.student_view({'embedded': True})
+
+        self.assertEqual([resource.data for resource in frag.resources], [
+            '/resource/public/bundle/vttcue.1.js',
+            '/resource/public/bundle/player.2.js',
+            '/resource/public/bundle/player.3.css',
+        ])
+        self.assertTrue(all(resource.kind == 'url' for resource in frag.resources))
+
+    @mock.patch('azure_media_services.ams.get_bundle_paths', return_value={})
+    def test_student_view_player_facade(self, get_bundle_paths):
+        block = self.make_one(poster_url='//azure/poster.jpg')
+
+        frag = block.student_view({'embedded': True})
+        with override_settings(AZURE_MEDIA_SERVICES={'PLAYER_FACADE': False}):
+            frag_without_facade = block.student_view({'embedded': True})
+
+        # Azure Media Player is loaded by the page script when the first player is created:
+        self.assertIn('js-player-facade', frag.content)
+        self.assertIn('poster="//azure/poster.jpg"', frag.content)
+        self.assertNotIn(AMP_SCRIPT_URL, [resource.data for resource in frag.resources])
+        self.assertEqual(frag.json_init_args['amp_script_url'], AMP_SCRIPT_URL)
+        self.assertNotIn('js-player-facade', frag_without_facade.content)
+        self.assertIn(AMP_SCRIPT_URL, [resource.data for resource in frag_without_facade.resources])
+
+    @mock.patch('azure_media_services.ams.get_bundle_paths', return_value={})
+    @mock.patch('azure_media_services.ams.get_protection_token', return_value=None)
+    def test_student_view_protected_video_without_token(self, get_protection_token, get_bundle_paths):
+        block = self.make_one(protection_type='AES', video_url='//azure/video.ism/manifest')
+
+        frag = block.student_view({'embedded': True})
+
+        self.assertNotIn('Bearer=', frag.content)
+        self.assertNotIn('xblock-video-amp', frag.content)
+        self.assertIn('player-unavailable', frag.content)
+
+        get_protection_token.return_value = {'token': 'jwt', 'expires_at': 1500003600, 'refresh_in': 3300}
+        frag = block.student_view({'embedded': True})
+
+        self.assertIn('"authenticationToken": "Bearer=jwt"', frag.content)
+        self.assertNotIn('player-unavailable', frag.content)
+
+    @mock.patch('azure_media_services.ams.get_bundle_paths', return_value={})
+    @mock.patch('azure_media_services.ams.load_resource', side_effect=lambda path: path)
+    def test_student_view_inline_fallback(self, load_resource, get_bundle_paths):
+        block = self.make_one()
+
+        frag = block.student_view({'embedded': True})
+
+        self.assertEqual([resource.data for resource in frag.resources if resource.kind == 'text'], [
+            'node_modules/videojs-vtt.js/lib/vttcue.js',
+            'static/js/plugins/transcriptsAmpPlugin.js',
+            'static/js/player.js',
+            'static/js/plugins/transcriptsAmpPlugin.css',
+            'public/css/player.css',
+        ])
+        block.runtime.local_resource_url.assert_not_called()
+
+    @mock.patch('edxval.models.Video.objects.filter', return_value=mock.Mock(order_by=mock.Mock(
         return_value=['video1', 'video2'])))
     def test_get_list_stream_videos(self, video_filter):
 
@@ -76,6 +153,70 @@ class AMSXBlockTests(unittest.TestCase):
         video_filter().order_by.assert_called_once_with('-created', 'edx_video_id')
         self.assertEqual(list_stream_videos, ['video1', 'video2'])
 
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_list_stream_videos')
+    def test_get_stream_videos(self, get_list_stream_videos):
+        videos = get_list_stream_videos.return_value
+        videos.filter.return_value = videos
+        videos.values.return_value = [
+            {'edx_video_id': 'id_{}'.format(i), 'client_video_id': 'video_{}.mp4'.format(i),
+             'status': 'file_complete', 'created': datetime(2018, 8, 1, 10, i, tzinfo=utc)}
+            for i in range(3)
+        ]
+        block = self.make_one()
+
+        handler_response = block.get_stream_videos(
+            mock.Mock(method="POST", body=json.dumps({'page_size': 2, 'search': ' video ', 'status': 'unknown'}))
+        )
+
+        self.assertEqual(videos.filter.call_count, 1)
+        videos.values.assert_called_once_with('edx_video_id', 'client_video_id', 'status', 'created')
+        self.assertEqual(handler_response.json['videos'], [
+            {'edx_video_id': 'id_0', 'client_video_id': 'video_0.mp4', 'status': 'file_complete'},
+            {'edx_video_id': 'id_1', 'client_video_id': 'video_1.mp4', 'status': 'file_complete'},
+        ])
+        self.assertEqual(
+            decode_cursor(handler_response.json['next_cursor']), ['2018-08-01T10:01:00+00:00', 'id_1']
+        )
+
+        videos.filter.reset_mock()
+        videos.values.return_value = videos.values.return_value[2:]
+        handler_response = block.get_stream_videos(mock.Mock(method="POST", body=json.dumps({
+            'page_size': 2, 'status': 'file_complete', 'cursor': handler_response.json['next_cursor']
+        })))
+
+        self.assertEqual(videos.filter.call_count, 2)
+        videos.filter.assert_any_call(status='file_complete')
+        self.assertEqual(len(handler_response.json['videos']), 1)
+        self.assertIsNone(handler_response.json['next_cursor'])
+
+    def test_get_stream_videos_invalid_cursor(self):
+        block = self.make_one()
+
+        handler_response = block.get_stream_videos(
+            mock.Mock(method="POST", body=json.dumps({'cursor': 'not-a-cursor'}))
+        )
+
+        self.assertEqual(handler_response.json, {'result': 'error', 'message': 'Invalid pagination parameters'})
+
+    @mock.patch('azure_media_services.ams.AMSXBlock.get_list_stream_videos')
+    def test_get_stream_videos_page_size(self, get_list_stream_videos):
+        block = self.make_one()
+        values = get_list_stream_videos.return_value.values
+
+        for page_size, expected_limit in ((0, 51), (-5, 2), (10000, 201), ('7', 8)):
+            handler_response = block.get_stream_videos(
+                mock.Mock(method="POST", body=json.dumps({'page_size': page_size}))
+            )
+            self.assertEqual(handler_response.status_code, 200)
+            values.return_value.__getitem__.assert_called_with(slice(None, expected_limit))
+
+        for page_size in ('ten', [10]):
+            handler_response = block.get_stream_videos(
+                mock.Mock(method="POST", body=json.dumps({'page_size': page_size}))
+            )
+            self.assertEqual(handler_response.status_code, 400)
+            self.assertEqual(handler_response.json, {'error': 'Invalid page size'})
+
     def test_drop_http_or_https(self):
         block = self.make_one()
 
@@ -85,12 +226,12 @@ class AMSXBlockTests(unittest.TestCase):
         url = block.drop_http_or_https('https://ma.streaming.mediaservices.windows.net/locator_id/')
         self.assertEqual(url, '//ma.streaming.mediaservices.windows.net/locator_id/')
 
-    @mock.patch('azure_media_services.ams.LocatorTypes')
-    @mock.patch('azure_media_services.ams.get_video_info', return_value={
+    @mock.patch('azure_video_pipeline.media_service.LocatorTypes')
+    @mock.patch('azure_video_pipeline.utils.get_video_info', return_value={
         'smooth_streaming_url': 'smooth_streaming_url',
         'download_video_url': 'download_video_url'
     })
-    @mock.patch('azure_media_services.ams.get_captions_info', return_value=[
+    @mock.patch('azure_video_pipeline.utils.get_captions_info', return_value=[
         {
             'download_url': 'download_url',
             'file_name': 'file_name_en.mp4',
@@ -98,12 +239,14 @@ class AMSXBlockTests(unittest.TestCase):
             'language_title': 'English'
         }
     ])
-    @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
+    @mock.patch('azure_video_pipeline.utils.get_media_service_client', return_value=mock.Mock(
         get_input_asset_by_video_id=mock.Mock(return_value={'Id': 'asset_id'}),
-        get_asset_locators=mock.Mock(side_effect=({'Path': 'path_locator_on_demand'}, {'Path': 'path_locator_sas'})),
+        get_asset_locators=mock.Mock(side_effect=lambda asset_id, locator_type: {
+            'OnDemandOrigin': {'Path': 'path_locator_on_demand'}, 'SAS': {'Path': 'path_locator_sas'}
+        }[locator_type]),
         get_asset_files=mock.Mock(return_value=['asset_file_1', 'asset_file_2'])
     ))
-    @mock.patch('azure_media_services.ams.Video.objects.get', return_value='video_object')
+    @mock.patch('edxval.models.Video.objects.get', return_value='video_object')
     def test_get_captions_and_video_info(self, video_get, get_media_service_client, get_captions_info,
                                          get_video_info, locator_types):
         locator_types.OnDemandOrigin = 'OnDemandOrigin'
@@ -119,7 +262,7 @@ class AMSXBlockTests(unittest.TestCase):
 
         media_service_client = get_media_service_client()
         media_service_client.get_input_asset_by_video_id.assert_called_once_with('edx_video_id', 'ENCODED')
-        self.assertEqual(
+        self.assertItemsEqual(
             media_service_client.get_asset_locators.call_args_list,
             [mock.call('asset_id', 'OnDemandOrigin'), mock.call('asset_id', 'SAS')]
         )
@@ -150,10 +293,10 @@ class AMSXBlockTests(unittest.TestCase):
 
         self.assertEqual(captions_and_video_info.json, expected_data)
 
-    @mock.patch('azure_media_services.ams.get_media_service_client', return_value=mock.Mock(
+    @mock.patch('azure_video_pipeline.utils.get_media_service_client', return_value=mock.Mock(
         get_input_asset_by_video_id=mock.Mock(return_value=[]),
     ))
-    @mock.patch('azure_media_services.ams.Video.objects.get', return_value='video_object')
+    @mock.patch('edxval.models.Video.objects.get', return_value='video_object')
     def test_get_captions_and_video_info_if_is_no_asset(self, video_get, get_media_service_client):
         block = self.make_one()
 
@@ -175,25 +318,137 @@ class AMSXBlockTests(unittest.TestCase):
 
         self.assertEqual(captions_and_video_info.json, expected_data)
 
-    @mock.patch('azure_media_services.ams.requests.get', return_value=mock.Mock(
-        status_code=200, content='test_transcript_content'
+    @mock.patch('azure_media_services.ams.log.exception')
+    @mock.patch('azure_video_pipeline.media_service.LocatorTypes', OnDemandOrigin='OnDemandOrigin', SAS='SAS')
+    @mock.patch('azure_video_pipeline.utils.get_captions_info', return_value=[])
+    @mock.patch('azure_video_pipeline.utils.get_video_info')
+    @mock.patch('azure_video_pipeline.utils.get_media_service_client', return_value=mock.Mock(
+        get_input_asset_by_video_id=mock.Mock(
+            side_effect=lambda edx_video_id, asset_type: {'Id': edx_video_id} if edx_video_id != 'video_2' else None
+        ),
+        get_asset_locators=mock.Mock(return_value={'Path': 'path_locator'}),
+        get_asset_files=mock.Mock(return_value=[])
     ))
-    def test_fetch_transcript_success(self, request_get_mock):
+    @mock.patch('edxval.models.Video.objects.filter', return_value=[
+        mock.Mock(edx_video_id='video_1'), mock.Mock(edx_video_id='video_2'), mock.Mock(edx_video_id='video_3')
+    ])
+    def test_get_captions_and_video_info_batch(self, video_filter, _client, get_video_info, _captions_info,
+                                               _locator_types, _logger):
+        def video_info(video, *args):
+            if video.edx_video_id == 'video_3':
+                raise ValueError()
+            return {'smooth_streaming_url': video.edx_video_id}
+        get_video_info.side_effect = video_info
+        block = self.make_one()
+
+        handler_response = block.get_captions_and_video_info_batch(mock.Mock(method="POST", body=json.dumps({
+            'edx_video_ids': ['video_1', 'video_2', 'video_1', 'video_3', 'video_4']
+        })))
+
+        video_filter.assert_called_once_with(edx_video_id__in=['video_1', 'video_2', 'video_3', 'video_4'])
+        self.assertEqual(handler_response.json['result'], 'success')
+        self.assertEqual([
+            (video['edx_video_id'], video['error_message'], video['video_info'])
+            for video in handler_response.json['videos']
+        ], [
+            ('video_1', '', {'smooth_streaming_url': 'video_1'}),
+            ('video_2', 'Target Video is no longer available on Azure or is corrupted in some way.', {}),
+            ('video_3', "Video info can't be resolved.", {}),
+            ('video_4', 'Target Video is no longer available on Azure or is corrupted in some way.', {}),
+        ])
+
+    @mock.patch('azure_media_services.ams.VIDEO_INFO_MAX_BATCH_SIZE', 2)
+    def test_get_captions_and_video_info_batch_invalid(self):
+        block = self.make_one()
+
+        for edx_video_ids in (None, 'video_1', ['video_1', 1], ['video_1', 'video_2', 'video_3']):
+            handler_response = block.get_captions_and_video_info_batch(
+                mock.Mock(method="POST", body=json.dumps({'edx_video_ids': edx_video_ids}))
+            )
+            self.assertEqual(handler_response.json['result'], 'error')
+
+    def test_publish_event(self):
+        block = self.make_one(video_url='video_url')
+        block.scope_ids.user_id = 'user_id'
+
+        handler_response = block.publish_event(
+            mock.Mock(method="POST", body=json.dumps({'event_type': 'edx.video.played'}))
+        )
+
+        block.runtime.publish.assert_called_once_with(
+            block, 'edx.video.played', {'video_url': 'video_url', 'user_id': 'user_id'}
+        )
+        self.assertEqual(handler_response.json, {'result': 'success'})
+
+    def test_publish_event_missing_event_type(self):
+        block = self.make_one()
+
+        handler_response = block.publish_event(mock.Mock(method="POST", body=json.dumps({})))
+
+        block.runtime.publish.assert_not_called()
+        self.assertEqual(handler_response.json, {'result': 'error', 'message': 'Missing event_type in JSON data'})
+
+    def test_publish_event_batch(self):
+        block = self.make_one(video_url='video_url')
+        block.scope_ids.user_id = 'user_id'
+        events = [
+            {'event_type': 'edx.video.played', 'timestamp': '2018-08-01T10:00:00.000Z'},
+            {'timestamp': '2018-08-01T10:00:01.000Z'},
+            ['edx.video.played'],
+            'edx.video.played',
+            {'event_type': 'edx.video.paused', 'timestamp': '2018-08-01T10:00:02.000Z'},
+        ]
+
+        handler_response = block.publish_event(mock.Mock(method="POST", body=json.dumps(events)))
+
+        self.assertEqual(block.runtime.publish.call_args_list, [
+            mock.call(block, 'edx.video.played', {
+                'timestamp': '2018-08-01T10:00:00.000Z', 'video_url': 'video_url', 'user_id': 'user_id'
+            }),
+            mock.call(block, 'edx.video.paused', {
+                'timestamp': '2018-08-01T10:00:02.000Z', 'video_url': 'video_url', 'user_id': 'user_id'
+            }),
+        ])
+        self.assertEqual(handler_response.json, {'result': 'success', 'published': 2})
+
+    @mock.patch('azure_media_services.ams.fetch_transcript_content', return_value='test_transcript_content')
+    def test_fetch_transcript_success(self, fetch_transcript_content_mock):
         block = self.make_one()
         test_data = {'srcUrl': 'test_transcript_url', 'srcLang': 'testTranscriptLangCode'}
         handler_request_mock = mock.Mock(method="POST", body=json.dumps(test_data))
 
         handler_response = block.fetch_transcript(handler_request_mock)
 
-        request_get_mock.assert_called_once_with(test_data['srcUrl'])
+        fetch_transcript_content_mock.assert_called_once_with(test_data['srcUrl'], test_data['srcLang'])
         self.assertEqual(handler_response.json, {'result': 'success', 'content': 'test_transcript_content'})
 
+    @mock.patch('azure_media_services.ams.fetch_transcript_cues', return_value={
+        'start': [0.0], 'end': [1.5], 'text': ['test_cue']
+    })
+    def test_fetch_transcript_cues(self, fetch_transcript_cues_mock):
+        block = self.make_one()
+        test_data = {'srcUrl': 'test_transcript_url', 'srcLang': 'testTranscriptLangCode', 'format': 'cues'}
+        handler_request_mock = mock.Mock(method="POST", body=json.dumps(test_data))
+
+        handler_response = block.fetch_transcript(handler_request_mock)
+
+        fetch_transcript_cues_mock.assert_called_once_with(test_data['srcUrl'], test_data['srcLang'])
+        self.assertEqual(handler_response.json, {
+            'result': 'success', 'cues': {'start': [0.0], 'end': [1.5], 'text': ['test_cue']}
+        })
+
+    @mock.patch('azure_media_services.transcripts.fetch_transcript_content', return_value=b' \n\n ')
+    def test_fetch_empty_transcript_cues(self, _fetch_transcript_content):
+        block = self.make_one()
+        test_data = {'srcUrl': 'test_transcript_url', 'srcLang': 'en', 'format': 'cues'}
+
+        handler_response = block.fetch_transcript(mock.Mock(method="POST", body=json.dumps(test_data)))
+
+        self.assertEqual(handler_response.json, {'result': 'success', 'cues': {'start': [], 'end': [], 'text': []}})
+
     @mock.patch('azure_media_services.ams.log.exception')
-    @mock.patch(
-        'azure_media_services.ams.requests.get', return_value=mock.Mock(status_code=400),
-        side_effect=requests.RequestException()
-    )
-    def test_fetch_transcript_ioerror(self, request_get_mock, logger_mock):
+    @mock.patch('azure_media_services.ams.fetch_transcript_content', side_effect=requests.RequestException())
+    def test_fetch_transcript_ioerror(self, fetch_transcript_content_mock, logger_mock):
         block = self.make_one()
         test_data = {'srcUrl': 'test_transcript_url', 'srcLang': 'testTranscriptLangCode'}
         handler_request_mock = mock.Mock(method="POST", body=json.dumps(test_data))
@@ -201,15 +456,13 @@ class AMSXBlockTests(unittest.TestCase):
 
         handler_response = block.fetch_transcript(handler_request_mock)
 
-        request_get_mock.assert_called_once_with(test_data['srcUrl'])
+        fetch_transcript_content_mock.assert_called_once_with(test_data['srcUrl'], test_data['srcLang'])
         logger_mock.assert_called_once_with(test_failure_message)
         self.assertEqual(handler_response.json, {'result': 'error', 'message': test_failure_message})
 
     @mock.patch('azure_media_services.ams.log.exception')
-    @mock.patch(
-        'azure_media_services.ams.requests.get', return_value=mock.Mock(status_code=200), side_effect=ValueError()
-    )
-    def test_fetch_transcript_other_parse_error(self, request_get_mock, logger_mock):
+    @mock.patch('azure_media_services.ams.fetch_transcript_content', side_effect=ValueError())
+    def test_fetch_transcript_other_parse_error(self, fetch_transcript_content_mock, logger_mock):
         block = self.make_one()
         test_data = {'srcUrl': 'test_transcript_url', 'srcLang': 'testTranscriptLangCode'}
         handler_request_mock = mock.Mock(method="POST", body=json.dumps(test_data))
@@ -220,10 +473,301 @@ class AMSXBlockTests(unittest.TestCase):
 
         handler_response = block.fetch_transcript(handler_request_mock)
 
-        request_get_mock.assert_called_once_with(test_data['srcUrl'])
+        fetch_transcript_content_mock.assert_called_once_with(test_data['srcUrl'], test_data['srcLang'])
         logger_mock.assert_called_once_with(test_log_message)
         self.assertEqual(handler_response.json, {'result': 'error', 'message': test_failure_message})
 
+    @mock.patch('azure_media_services.ams.stored_transcript_exists', return_value=True)
+    @mock.patch('azure_media_services.ams.read_stored_transcript', return_value='stored_content')
+    @mock.patch('azure_media_services.ams.fetch_transcript_content')
+    def test_fetch_stored_transcript(self, fetch_transcript_content_mock, read_stored_transcript_mock, _exists):
+        block = self.make_one(
+            captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}, {'src': '//azure/uk.vtt', 'srclang': 'uk'}],
+            stored_transcripts={'//azure/en.vtt': 'en.vtt'}
+        )
+        # Signed storage URL the page was rendered with differs from the current one:
+        test_data = {'srcUrl': 'https://storage/en.vtt?se=2017-07-14&sig=expired', 'srcLang': 'en'}
+
+        handler_response = block.fetch_transcript(mock.Mock(method="POST", body=json.dumps(test_data)))
+        fetch_transcript_content_mock.return_value = 'source_content'
+        not_stored_response = block.fetch_transcript(mock.Mock(method="POST", body=json.dumps({
+            'srcUrl': '//azure/uk.vtt', 'srcLang': 'uk'
+        })))
+
+        read_stored_transcript_mock.assert_called_once_with('en.vtt')
+        fetch_transcript_content_mock.assert_called_once_with('//azure/uk.vtt', 'uk')
+        self.assertEqual(handler_response.json, {'result': 'success', 'content': 'stored_content'})
+        self.assertEqual(not_stored_response.json, {'result': 'success', 'content': 'source_content'})
+
+    @mock.patch('azure_media_services.ams.stored_transcript_exists', side_effect=lambda name: name != 'fr.vtt')
+    @mock.patch('azure_media_services.ams.stored_transcript_url', side_effect=lambda name: '/media/' + name)
+    def test_get_captions(self, _url, _exists):
+        block = self.make_one(
+            captions=[
+                {'src': '//azure/en.vtt', 'srclang': 'en'},
+                {'src': '//azure/uk.vtt', 'srclang': 'uk'},
+                {'src': '//azure/fr.vtt', 'srclang': 'fr'},
+            ],
+            # The French copy is missing (e.g. the course was imported from another instance):
+            stored_transcripts={'//azure/en.vtt': 'en.vtt', '//azure/fr.vtt': 'fr.vtt'}
+        )
+
+        self.assertEqual(block.get_captions(), [
+            {'src': '/media/en.vtt', 'srclang': 'en'},
+            {'src': '//azure/uk.vtt', 'srclang': 'uk'},
+            {'src': '//azure/fr.vtt', 'srclang': 'fr'},
+        ])
+
+    @mock.patch('azure_media_services.ams.stored_transcript_exists', return_value=True)
+    @mock.patch('azure_media_services.ams.log.exception')
+    @mock.patch('azure_media_services.ams.store_transcript')
+    def test_clean_studio_edits_stores_transcripts(self, store_transcript, logger_mock, _exists):
+        def store(src, _lang):
+            if src == '//azure/missing.vtt':
+                raise requests.RequestException()
+            return 'uk.vtt'
+
+        store_transcript.side_effect = store
+        block = self.make_one(stored_transcripts={'//azure/en.vtt': 'en.vtt'})
+        data = {'captions': [
+            {'src': '//azure/en.vtt', 'srclang': 'en'},
+            {'src': '//azure/uk.vtt', 'srclang': 'uk'},
+            {'src': '//azure/missing.vtt', 'srclang': 'fr'},
+        ]}
+
+        block.clean_studio_edits(data)
+
+        self.assertEqual(data['stored_transcripts'], {'//azure/en.vtt': 'en.vtt', '//azure/uk.vtt': 'uk.vtt'})
+        self.assertItemsEqual(store_transcript.call_args_list, [
+            mock.call('//azure/uk.vtt', 'uk'), mock.call('//azure/missing.vtt', 'fr')
+        ])
+        logger_mock.assert_called_once()
+
+    @mock.patch('azure_media_services.ams.log.exception')
+    @mock.patch('azure_media_services.transcripts._get_storage')
+    @mock.patch('azure_media_services.transcripts.fetch_transcript_content', side_effect=['', '<tt/>'])
+    def test_clean_studio_edits_keeps_source_of_unknown_transcripts(self, _fetch, get_storage, _logger):
+        block = self.make_one()
+        data = {'captions': [{'src': '//azure/en.vtt', 'srclang': 'en'}, {'src': '//azure/uk.ttml', 'srclang': 'uk'}]}
+
+        block.clean_studio_edits(data)
+
+        self.assertEqual(data['stored_transcripts'], {})
+        get_storage.return_value.save.assert_not_called()
+
+    @mock.patch('azure_media_services.ams.get_video_asset_info', return_value={
+        'asset': {'Id': 'asset_id'},
+        'locator_sas': {'Path': 'https://account.blob.core.windows.net/asset-1?sig=abc'},
+        'asset_files': [{'Name': 'video.mp4'}, {'Name': 'video_000001.png'}],
+    })
+    def test_clean_studio_edits_resolves_poster(self, get_video_asset_info):
+        block = self.make_one()
+        data = {'edx_video_id': 'edx_video_id'}
+
+        block.clean_studio_edits(data)
+        get_video_asset_info.side_effect = IOError()
+        data_without_asset = {'edx_video_id': 'edx_video_id'}
+        with mock.patch('azure_media_services.ams.log.warning'):
+            block.clean_studio_edits(data_without_asset)
+
+        get_video_asset_info.assert_called_with('org_name', 'edx_video_id')
+        self.assertEqual(data['poster_url'], 'https://account.blob.core.windows.net/asset-1/video_000001.png?sig=abc')
+        self.assertEqual(data_without_asset['poster_url'], '')
+
+    def test_video_sources(self):
+        url = '//ams/locator/video.ism/manifest'
+        block = self.make_one()
+        data = {'video_url': url}
+
+        block.clean_studio_edits(data)
+        block.video_url, block.video_sources = url, data['video_sources']
+        context = block._get_context_for_template(embedded=True)
+
+        self.assertEqual([source['protocol'] for source in context['video_sources']], ['dash', 'smooth', 'hls'])
+        self.assertEqual(context['video_sources'][1]['src'], url)
+        self.assertIs(block.get_video_sources(), block.video_sources)
+
+        block.video_url = '//ams/locator/other.ism/manifest'
+        self.assertEqual(block.get_video_sources()[1]['src'], block.video_url)
+
+    def test_report_progress(self):
+        block = self.make_one(video_url='//ams/video.ism/manifest')
+
+        def report(segments):
+            request = mock.Mock(method="POST", body=json.dumps({'segments': segments, 'duration': 100}))
+            return block.report_progress(request).json
+
+        self.assertEqual(report([[0, 10], [10, 30.5]]), {
+            'result': 'success', 'watched_seconds': 30.5, 'watched_fraction': 0.305, 'completed': False
+        })
+        report([[20, 30], [40, 60]])
+        report([[30, 40], [60, 99], [99, 150]])
+
+        self.assertEqual(block.watched_intervals, [0, 100])
+        self.assertTrue(block.get_watched_progress()['completed'])
+        self.assertEqual([call[0][1] for call in block.runtime.publish.call_args_list], [
+            'edx.video.progress', 'edx.video.progress', 'edx.video.progress', 'completion'
+        ])
+        self.assertEqual(block.runtime.publish.call_args_list[-2][0][2]['milestone'], 75)
+
+    def test_custom_completion_depends_on_progress_tracking(self):
+        block = self.make_one()
+        self.assertTrue(AMSXBlock.has_custom_completion)
+        self.assertTrue(block.has_custom_completion)
+        with override_settings(AZURE_MEDIA_SERVICES={'PROGRESS_HEARTBEAT_INTERVAL': 0}):
+            self.assertFalse(AMSXBlock.has_custom_completion)
+            self.assertFalse(block.has_custom_completion)
+
+    def test_report_progress_invalid_data(self):
+        block = self.make_one()
+        for data in ({'segments': [[0, 10]]}, {'segments': [['start', 10]], 'duration': 100},
+                     {'segments': [[0, 10]], 'duration': 'NaN'}):
+            handler_response = block.report_progress(mock.Mock(method="POST", body=json.dumps(data)))
+            self.assertEqual(handler_response.json['result'], 'error')
+        self.assertEqual(block.watched_intervals, [])
+
+    def make_transcript_source_response(self, status_code=200, headers=None, content=b''):
+        response = mock.Mock(status_code=status_code, headers=headers or {})
+        response.iter_content.side_effect = lambda size: (content[i:i + size] for i in range(0, len(content), size))
+        return response
+
+    @mock.patch('azure_media_services.transcripts.get_http_session')
+    def test_transcript_proxy_gzip(self, get_http_session):
+        content = b'WEBVTT\n\n' + b'00:00:01.000 --> 00:00:02.000\nHello\n\n' * 5000
+        source_response = self.make_transcript_source_response(
+            headers={'Content-Type': 'application/octet-stream', 'ETag': '"v1"', 'Content-Length': str(len(content))},
+            content=content
+        )
+        get_http_session.return_value.get.return_value = source_response
+        block = self.make_one(captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}])
+
+        response = block.transcript(Request.blank('/', headers={'Accept-Encoding': 'gzip, deflate'}), 'en')
+
+        get_http_session.return_value.get.assert_called_once_with(
+            'https://azure/en.vtt', headers={}, timeout=mock.ANY, stream=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/vtt')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['ETag'], '"v1"')
+        self.assertNotIn('Content-Length', response.headers)
+        body = b''.join(response.app_iter)
+        self.assertLess(len(body), len(content) / 10)
+        self.assertEqual(zlib.decompress(body, 16 + zlib.MAX_WBITS), content)
+        source_response.close.assert_called_once_with()
+
+    @mock.patch('azure_media_services.transcripts.get_http_session')
+    def test_transcript_proxy_range_and_not_modified(self, get_http_session):
+        block = self.make_one(captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}])
+        get_http_session.return_value.get.return_value = self.make_transcript_source_response(
+            206, {'Content-Type': 'text/vtt', 'Content-Range': 'bytes 0-5/100', 'Content-Length': '6'}, b'WEBVTT'
+        )
+
+        response = block.transcript(
+            Request.blank('/', headers={'Range': 'bytes=0-5', 'Accept-Encoding': 'gzip'}), 'en'
+        )
+
+        self.assertEqual(get_http_session.return_value.get.call_args[1]['headers'], {'Range': 'bytes=0-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], 'bytes 0-5/100')
+        self.assertEqual(response.headers['Content-Length'], '6')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(b''.join(response.app_iter), b'WEBVTT')
+
+        get_http_session.return_value.get.return_value = self.make_transcript_source_response(304, {'ETag': '"v1"'})
+        response = block.transcript(Request.blank('/', headers={'If-None-Match': '"v1"'}), 'en')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], '"v1"')
+
+    def test_transcript_proxy_unknown_language(self):
+        block = self.make_one(captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}])
+
+        self.assertEqual(block.transcript(Request.blank('/'), 'uk').status_code, 404)
+
+    def test_proxied_captions(self):
+        block = self.make_one(captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}])
+        block.runtime.handler_url.side_effect = lambda _block, handler, suffix: '/handler/{}/{}'.format(handler, suffix)
+
+        self.assertEqual(block.get_captions(proxied=True), [{'src': '/handler/transcript/en', 'srclang': 'en'}])
+        self.assertEqual(block.get_captions(), [{'src': '//azure/en.vtt', 'srclang': 'en'}])
+        with mock.patch('azure_media_services.ams.fetch_transcript_content', return_value='WEBVTT') as fetch:
+            block.fetch_transcript(mock.Mock(method="POST", body=json.dumps({
+                'srcUrl': '/handler/transcript/en', 'srcLang': 'en'
+            })))
+        fetch.assert_called_once_with('//azure/en.vtt', 'en')
+
+    @mock.patch('azure_media_services.ams.stored_transcript_exists', return_value=True)
+    @mock.patch('azure_media_services.ams.stored_transcript_url', side_effect=lambda name: '/media/' + name)
+    @mock.patch(
+        'azure_media_services.ams.reverse', side_effect=lambda _name, kwargs: '/embed/' + kwargs['usage_key_string']
+    )
+    def test_submit_studio_edits_stores_render_context(self, _reverse, _url, _exists):
+        block = self.make_one(share='all', stored_transcripts={'//azure/en.vtt': 'en.vtt'})
+        request = Request.blank('/', method='POST', body=json.dumps({
+            'values': {
+                'video_url': '//azure/video.ism/manifest', 'captions': [{'src': '//azure/en.vtt', 'srclang': 'en'}]
+            },
+            'defaults': []
+        }))
+
+        response = block.submit_studio_edits(request)
+        _reverse.reset_mock()
+        with mock.patch.object(block, 'build_render_context') as build_render_context:
+            context = block._get_context_for_template(embedded=False)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(block.render_context['video_url'], '//azure/video.ism/manifest')
+        build_render_context.assert_not_called()
+        _reverse.assert_not_called()
+        # Storage URLs are resolved on render:
+        self.assertEqual(context['captions'], [{'src': '/media/en.vtt', 'srclang': 'en'}])
+        self.assertEqual(context['embed_url'], 'http://lms.com/embed/usage_id?embedded=true')
+
+    def test_render_context_of_other_block_or_version_is_rebuilt(self):
+        block = self.make_one(video_url='//azure/old.ism/manifest')
+        block.render_context = block.build_render_context()
+        self.assertIs(block.get_render_context(), block.render_context)
+
+        # Duplicated block (or rerun course) has the settings of the original one:
+        duplicate = self.make_one(video_url='//azure/old.ism/manifest', render_context=block.render_context)
+        duplicate.scope_ids = mock.Mock(usage_id='duplicate_usage_id')
+        self.assertIsNot(duplicate.get_render_context(), block.render_context)
+
+        # Context saved by an older version of the block:
+        block.render_context = dict(block.render_context, version=RENDER_CONTEXT_VERSION - 1)
+        block.video_url = '//azure/new.ism/manifest'
+        self.assertEqual(block.get_render_context()['video_url'], '//azure/new.ism/manifest')
+
+        # Blocks saved before the context was introduced:
+        block.render_context = {}
+        self.assertEqual(block.get_render_context()['video_url'], '//azure/new.ism/manifest')
+
+    @mock.patch('azure_media_services.ams.get_protection_token', return_value={
+        'token': 'jwt', 'expires_at': 1500003600, 'refresh_in': 3300
+    })
+    def test_protection_token(self, get_protection_token):
+        block = self.make_one(protection_type='AES', verification_key='dmVyaWZpY2F0aW9uX2tleQ==')
+
+        context = block._get_context_for_template(embedded=True)
+        handler_response = block.refresh_protection_token(mock.Mock(method="POST", body=json.dumps({})))
+
+        self.assertEqual(context['auth_token'], 'jwt')
+        self.assertEqual(context['auth_token_refresh_in'], 3300)
+        get_protection_token.assert_called_with(
+            block.runtime.user_id, 'dmVyaWZpY2F0aW9uX2tleQ==', block.token_issuer, block.token_scope
+        )
+        self.assertEqual(handler_response.json, {
+            'result': 'success', 'token': 'jwt', 'expires_at': 1500003600, 'refresh_in': 3300
+        })
+
+    def test_refresh_protection_token_of_unprotected_video(self):
+        block = self.make_one()
+
+        handler_response = block.refresh_protection_token(mock.Mock(method="POST", body=json.dumps({})))
+
+        self.assertEqual(handler_response.json['result'], 'error')
+
     @mock.patch('azure_media_services.ams.reverse', return_value='/embed_url/')
     def test_get_embed_url(self, reverse):
         block = self.make_one()
@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+
+from django.core.cache import cache
+import mock
+
+from azure_media_services import assets
+from azure_media_services.cache import SingleFlight
+
+
+class GetVideoAssetInfoTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = mock.Mock(
+            get_input_asset_by_video_id=mock.Mock(return_value={'Id': 'asset_id'}),
+            get_asset_locators=mock.Mock(side_effect=lambda asset_id, locator_type: {'Path': locator_type}),
+            get_asset_files=mock.Mock(return_value=['asset_file'])
+        )
+        for target, value in (
+            ('azure_video_pipeline.utils.get_media_service_client', mock.Mock(return_value=self.client)),
+            ('azure_video_pipeline.media_service.LocatorTypes', mock.Mock(OnDemandOrigin='OnDemandOrigin', SAS='SAS')),
+        ):
+            patcher = mock.patch(target, value)
+            self.addCleanup(patcher.stop)
+            setattr(self, target.rsplit('.', 1)[1], patcher.start())
+
+    def test_lookups_are_cached(self):
+        expected = {
+            'asset': {'Id': 'asset_id'},
+            'locator_on_demand': {'Path': 'OnDemandOrigin'},
+            'locator_sas': {'Path': 'SAS'},
+            'asset_files': ['asset_file'],
+        }
+
+        self.assertEqual(assets.get_video_asset_info('org', 'edx_video_id'), expected)
+        self.assertEqual(assets.get_video_asset_info('org', 'edx_video_id'), expected)
+
+        self.get_media_service_client.assert_called_once_with('org')
+        self.client.get_input_asset_by_video_id.assert_called_once_with('edx_video_id', 'ENCODED')
+        self.assertEqual(self.client.get_asset_locators.call_count, 2)
+        self.client.get_asset_files.assert_called_once_with('asset_id')
+
+    def test_missing_asset_is_not_cached(self):
+        self.client.get_input_asset_by_video_id.return_value = None
+
+        self.assertIsNone(assets.get_video_asset_info('org', 'edx_video_id')['asset'])
+        self.assertIsNone(assets.get_video_asset_info('org', 'edx_video_id')['asset'])
+
+        self.assertEqual(self.client.get_input_asset_by_video_id.call_count, 2)
+        self.client.get_asset_locators.assert_not_called()
+
+    def test_expiring_locator_is_not_cached(self):
+        expires_at = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(time.time() + 60))
+        self.client.get_asset_locators.side_effect = lambda asset_id, locator_type: {
+            'Path': locator_type, 'ExpirationDateTime': expires_at
+        }
+
+        assets.get_video_asset_info('org', 'edx_video_id')
+        assets.get_video_asset_info('org', 'edx_video_id')
+
+        self.assertEqual(self.client.get_asset_locators.call_count, 4)
+
+    def test_locator_expires_at(self):
+        self.assertEqual(assets.locator_expires_at({'ExpirationDateTime': '/Date(1528879735970)/'}), 1528879735.97)
+        self.assertEqual(assets.locator_expires_at({'ExpirationDateTime': '2018-06-13T08:48:55.97'}), 1528879735)
+        self.assertIsNone(assets.locator_expires_at({'ExpirationDateTime': 'tomorrow'}))
+        self.assertIsNone(assets.locator_expires_at({}))
+
+    def test_get_poster_url(self):
+        locator_sas = {'Path': 'https://account.blob.core.windows.net/asset-1?sv=2015&sig=abc'}
+        asset_files = [
+            {'Name': 'video.mp4'}, {'Name': 'Thumbnail 000002.JPG'}, {'Name': 'Thumbnail 000001.JPG'}
+        ]
+
+        self.assertEqual(
+            assets.get_poster_url(asset_files, locator_sas),
+            'https://account.blob.core.windows.net/asset-1/Thumbnail%20000001.JPG?sv=2015&sig=abc'
+        )
+        self.assertIsNone(assets.get_poster_url([{'Name': 'video.mp4'}], locator_sas))
+        self.assertIsNone(assets.get_poster_url(asset_files, None))
+
+
+class SingleFlightTests(unittest.TestCase):
+
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+
+        def wait_and_return():
+            release.wait()
+            return 'result'
+
+        func = mock.Mock(side_effect=wait_and_return)
+        results = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight.do('key', func))) for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        func.assert_called_once_with()
+        self.assertEqual(results, ['result'] * 5)
@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from azure_media_services import bundle
+from azure_media_services.resources import load_resource
+
+
+class StaticBundleTests(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        bundle.clear()
+        self.addCleanup(bundle.clear)
+
+    def patch_manifest(self, manifest):
+        def load(path):
+            if path == 'public/bundle/manifest.json':
+                return json.dumps(manifest)
+            return load_resource(path)
+
+        patcher = mock.patch('azure_media_services.bundle.load_resource', side_effect=load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_build(self):
+        manifest = bundle.build(self.output_dir)
+
+        self.assertEqual(sorted(manifest), ['player.css', 'player.js', 'vttcue.js'])
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)),
+            sorted([entry['file'] for entry in manifest.values()] + ['manifest.json'])
+        )
+        with open(os.path.join(self.output_dir, manifest['player.js']['file'])) as player_bundle:
+            self.assertIn('AzureMediaServicesBlock', player_bundle.read())
+
+        # Rebuilding replaces bundles of the same content by the same files:
+        self.assertEqual(bundle.build(self.output_dir), manifest)
+        self.assertEqual(len(os.listdir(self.output_dir)), 4)
+
+    def test_get_bundle_paths(self):
+        manifest = bundle.build(self.output_dir)
+        self.patch_manifest(manifest)
+
+        self.assertEqual(bundle.get_bundle_paths(), {
+            name: 'public/bundle/{}'.format(entry['file']) for name, entry in manifest.items()
+        })
+
+    def test_get_bundle_paths_outdated(self):
+        manifest = bundle.build(self.output_dir)
+        manifest['player.js']['sources_digest'] = 'outdated'
+        self.patch_manifest(manifest)
+
+        self.assertEqual(bundle.get_bundle_paths(), {})
+
+    @mock.patch('azure_media_services.bundle.load_resource', side_effect=IOError)
+    def test_get_bundle_paths_not_built(self, _load_resource):
+        self.assertEqual(bundle.get_bundle_paths(), {})
@@ -0,0 +1,93 @@
+import unittest
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+import mock
+
+from azure_media_services import embed
+from azure_media_services.ams import _embed_player
+
+
+class UsageKey(str):
+    course_key = 'course-v1:org+course+run'
+
+
+@mock.patch('xmodule.modulestore.django.modulestore')
+class EmbedCacheTests(unittest.TestCase):
+
+    usage_key = UsageKey('block-v1:org+course+run+type@azure_media_services+block@1')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_settings_are_cached(self, modulestore):
+        modulestore.return_value.get_item.return_value = mock.Mock(share='all', protection_type='AES')
+
+        settings = embed.get_block_embed_settings(self.usage_key)
+        self.assertEqual(embed.get_block_embed_settings(self.usage_key), settings)
+
+        self.assertEqual(settings, {'share': 'all', 'protection_type': 'AES'})
+
+        modulestore.return_value.get_item.assert_called_once_with(self.usage_key)
+
+    def test_publish_invalidates_share_and_etag(self, modulestore):
+        modulestore.return_value.get_item.return_value = mock.Mock(share='all', protection_type='')
+        embed.get_block_embed_settings(self.usage_key)
+        etag = embed.get_embed_etag(self.usage_key)
+        self.assertEqual(embed.get_embed_etag(self.usage_key), etag)
+
+        modulestore.return_value.get_item.return_value = mock.Mock(share='off', protection_type='')
+        embed.course_published_handler(None, course_key=self.usage_key.course_key)
+
+        self.assertEqual(embed.get_block_embed_settings(self.usage_key)['share'], 'off')
+        self.assertNotEqual(embed.get_embed_etag(self.usage_key), etag)
+
+
+@mock.patch('azure_media_services.ams.get_embed_etag', return_value='v1')
+@mock.patch('lms.djangoapps.courseware.views.views.render_xblock', side_effect=lambda *args, **kwargs: HttpResponse())
+class EmbedPlayerViewTests(unittest.TestCase):
+
+    def get(self, **headers):
+        request = RequestFactory().get('/embed/', **headers)
+        request.user = mock.Mock(is_authenticated=mock.Mock(return_value=False))
+        return _embed_player(request, 'block-v1:org+course+run+type@azure_media_services+block@1')
+
+    @mock.patch('azure_media_services.ams.get_block_embed_settings', return_value={
+        'share': 'all', 'protection_type': ''
+    })
+    def test_shared_player_is_cacheable(self, _settings, render_xblock, _etag):
+        response = self.get()
+        not_modified_response = self.get(HTTP_IF_NONE_MATCH='"v1"')
+
+        self.assertEqual(response['ETag'], '"v1"')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(not_modified_response.status_code, 304)
+        render_xblock.assert_called_once()
+
+    @mock.patch('azure_media_services.ams.get_block_embed_settings', return_value={
+        'share': 'all', 'protection_type': ''
+    })
+    def test_shared_player_setting_cookies_is_private(self, _settings, render_xblock, _etag):
+        def render(*args, **kwargs):
+            response = HttpResponse()
+            response.set_cookie('sessionid', 'session')
+            return response
+        render_xblock.side_effect = render
+
+        response = self.get()
+
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Cookie')
+
+    @mock.patch('azure_media_services.ams.get_block_embed_settings', return_value={
+        'share': 'all', 'protection_type': 'AES'
+    })
+    def test_protected_player_is_not_cached(self, _settings, render_xblock, _etag):
+        response = self.get(HTTP_IF_NONE_MATCH='"v1"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(sorted(response['Cache-Control'].split(', ')), ['no-store', 'private'])
+        render_xblock.assert_called_once()
@@ -0,0 +1,91 @@
+import json
+import unittest
+
+from django.core.cache import cache
+import mock
+from xblock.field_data import DictFieldData
+
+from azure_media_services import metrics, transcripts
+from azure_media_services.ams import AMSXBlock
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = metrics.MemorySink()
+        previous = metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, previous)
+
+    def test_timed_reports_labels(self):
+        with metrics.timed('handler', handler='fetch_transcript'):
+            metrics.label(cache='hit')
+
+        self.assertEqual(len(self.sink.histogram('handler', handler='fetch_transcript', cache='hit')), 1)
+        self.assertEqual(self.sink.histogram('handler', cache='miss'), [])
+
+    def test_label_annotates_innermost_timer(self):
+        with metrics.timed('handler', handler='outer'):
+            with metrics.timed('azure.call', method='inner'):
+                metrics.label(cache='miss')
+
+        self.assertEqual(len(self.sink.histogram('azure.call', cache='miss')), 1)
+        self.assertEqual(self.sink.histogram('handler', cache='miss'), [])
+
+    def test_error_status(self):
+        with self.assertRaises(ValueError):
+            with metrics.timed('handler', handler='failing'):
+                raise ValueError()
+
+        self.assertEqual(len(self.sink.histogram('handler', status='error')), 1)
+
+    @mock.patch('azure_media_services.metrics.random.random', return_value=0.5)
+    def test_sampling(self, _random):
+        with mock.patch('azure_media_services.metrics.get_sample_rate', return_value=0.1):
+            with metrics.timed('view'):
+                pass
+            metrics.increment('cache')
+        with mock.patch('azure_media_services.metrics.get_sample_rate', return_value=0.9):
+            with metrics.timed('view'):
+                pass
+            metrics.increment('cache')
+
+        self.assertEqual(len(self.sink.histogram('view')), 1)
+        self.assertEqual(self.sink.count('cache'), 1)
+
+    def test_disabled(self):
+        metrics.set_sink(None)
+        with metrics.timed('view') as timer:
+            timer.label(cache='hit')
+        metrics.increment('cache')
+
+        self.assertEqual(self.sink.timings, {})
+        self.assertEqual(self.sink.counters, {})
+
+    def test_statsd_format(self):
+        sink = metrics.StatsdSink(host='localhost', port=8125, prefix='ams')
+        sink.send = mock.Mock()
+
+        sink.timing('handler', 12.5, {'org': 'edX', 'handler': 'fetch_transcript'}, 0.5)
+        sink.increment('cache', 1, {}, 1)
+
+        self.assertEqual(sink.send.call_args_list, [
+            mock.call('ams.handler:12.500|ms|@0.5|#handler:fetch_transcript,org:edX'),
+            mock.call('ams.cache:1|c'),
+        ])
+
+    def test_handler_is_instrumented(self):
+        cache.clear()
+        transcripts.clear_local_cache()
+        block = AMSXBlock(mock.Mock(), DictFieldData({}), mock.Mock())
+        block.location = mock.Mock(org='org_name')
+        request = mock.Mock(method="POST", body=json.dumps({'srcUrl': 'https://host/en.vtt', 'srcLang': 'en'}))
+
+        with mock.patch('azure_media_services.transcripts.get_http_session') as get_http_session:
+            get_http_session.return_value.get.return_value = mock.Mock(status_code=200, content='WEBVTT', headers={})
+            block.fetch_transcript(request)
+            block.fetch_transcript(request)
+
+        self.assertEqual(len(self.sink.histogram('handler', handler='fetch_transcript', org='org_name')), 2)
+        self.assertEqual(len(self.sink.histogram('handler', handler='fetch_transcript', cache='miss')), 1)
+        self.assertEqual(len(self.sink.histogram('http.transcript', status=200)), 1)
+        self.assertEqual(self.sink.count('cache', cache='transcript', result='hit'), 1)
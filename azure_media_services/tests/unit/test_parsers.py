@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from azure_media_services.parsers import format_timestamp, normalize_to_webvtt, parse_timestamp, parse_transcript
+
+
+class ParseTranscriptTests(unittest.TestCase):
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp('00:01.5'), 1.5)
+        self.assertEqual(parse_timestamp('01:02:03.004'), 3723.004)
+        self.assertEqual(parse_timestamp('00:00:10,250'), 10.25)
+        with self.assertRaises(ValueError):
+            parse_timestamp('10.250')
+
+    def test_parse_webvtt(self):
+        content = (
+            u'﻿WEBVTT - Lecture 1\r\n\r\n'
+            u'NOTE This is a comment\r\n\r\n'
+            u'STYLE\r\n::cue { color: red }\r\n\r\n'
+            u'intro\r\n00:00:00.000 --> 00:00:02.500 align:start position:10%\r\n'
+            u'<v Lecturer>Hello &amp; welcome</v>\r\n\r\n'
+            u'00:02.500 --> 00:04.000\r\nsecond\r\nline\r\n'
+        ).encode('utf-8')
+
+        self.assertEqual(parse_transcript(content), {
+            'start': [0.0, 2.5],
+            'end': [2.5, 4.0],
+            'text': [u'Hello & welcome', u'second\nline'],
+        })
+
+    def test_parse_srt(self):
+        content = (
+            '2\n00:00:05,000 --> 00:00:06,000\nLater cue\n\n'
+            '1\n00:00:01,000 --> 00:00:02,000\nFirst cue\n'
+        )
+
+        self.assertEqual(parse_transcript(content), {
+            'start': [1.0, 5.0],
+            'end': [2.0, 6.0],
+            'text': ['First cue', 'Later cue'],
+        })
+
+    def test_parse_malformed_timing(self):
+        with self.assertRaises(ValueError):
+            parse_transcript('WEBVTT\n\n00:00:01 --> 00:00:02\nNo milliseconds\n')
+
+    def test_parse_empty(self):
+        for content in ('', b'', u'\ufeff', ' \r\n\t\n'):
+            self.assertEqual(parse_transcript(content), {'start': [], 'end': [], 'text': []})
+
+    def test_format_timestamp(self):
+        self.assertEqual(format_timestamp(3723.004), '01:02:03.004')
+        self.assertEqual(format_timestamp(0.9996), '00:00:01.000')
+
+    def test_normalize_srt_to_webvtt(self):
+        content = '1\r\n00:00:01,000 --> 00:00:02,500\r\nFish & <i>chips</i>\r\n'
+
+        self.assertEqual(
+            normalize_to_webvtt(content),
+            b'WEBVTT\n\n00:00:01.000 --> 00:00:02.500\nFish &amp; chips\n'
+        )
+
+    def test_normalize_unknown_format(self):
+        for content in ('', ' \n', '<tt xmlns="http://www.w3.org/ns/ttml"><body/></tt>'):
+            with self.assertRaises(ValueError):
+                normalize_to_webvtt(content)
+
+    def test_normalize_webvtt_keeps_markup(self):
+        content = u'\ufeffWEBVTT\r\n\r\n00:01.000 --> 00:02.000\r\n<v Lecturer>Hello</v>\r\n'.encode('utf-8')
+
+        self.assertEqual(normalize_to_webvtt(content), b'WEBVTT\n\n00:01.000 --> 00:02.000\n<v Lecturer>Hello</v>\n')
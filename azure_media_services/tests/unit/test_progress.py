@@ -0,0 +1,46 @@
+import random
+import unittest
+
+from azure_media_services.progress import add_interval, watched_fraction, watched_seconds
+
+
+class WatchedIntervalsTests(unittest.TestCase):
+
+    def test_add_interval(self):
+        intervals = []
+        add_interval(intervals, 10, 20)
+        add_interval(intervals, 30, 40)
+        self.assertEqual(intervals, [10, 20, 30, 40])
+
+        add_interval(intervals, 0, 5)
+        add_interval(intervals, 50, 60)
+        self.assertEqual(intervals, [0, 5, 10, 20, 30, 40, 50, 60])
+
+        add_interval(intervals, 15, 35)
+        self.assertEqual(intervals, [0, 5, 10, 40, 50, 60])
+
+        # Intervals closer than the merge gap are merged, empty ones are ignored:
+        add_interval(intervals, 40.5, 45)
+        add_interval(intervals, 7, 7)
+        self.assertEqual(intervals, [0, 5, 10, 45, 50, 60])
+
+        add_interval(intervals, 2, 70)
+        self.assertEqual(intervals, [0, 70])
+
+    def test_add_interval_matches_brute_force(self):
+        random.seed(0)
+        intervals = []
+        watched = set()
+        for _ in range(500):
+            start = random.randint(0, 999)
+            end = start + random.randint(1, 20)
+            add_interval(intervals, start, end, gap=0)
+            watched.update(range(start, end))
+
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertEqual(watched_seconds(intervals), len(watched))
+
+    def test_watched_fraction(self):
+        self.assertEqual(watched_fraction([0, 30, 60, 90], 120), 0.5)
+        self.assertEqual(watched_fraction([0, 130], 120), 1.0)
+        self.assertEqual(watched_fraction([0, 30], 0), 0.0)
@@ -0,0 +1,111 @@
+from timeit import default_timer
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+import mock
+import requests
+
+from azure_media_services import assets, resilience
+from azure_media_services.tests.fake_ams import FakeAMSServer, FakeMediaServiceClient
+
+
+POLICY_SETTINGS = {
+    'AZURE_CALL_DEADLINE': 0.5,
+    'AZURE_CALL_RETRIES': 2,
+    'AZURE_RETRY_BACKOFF': 0.01,
+    'AZURE_CIRCUIT_FAILURES': 3,
+    'AZURE_CIRCUIT_RESET_TIMEOUT': 0.2,
+}
+
+
+class AzureCallPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        settings_override = override_settings(AZURE_MEDIA_SERVICES=POLICY_SETTINGS)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        resilience.reset_circuit_breakers()
+        self.server = FakeAMSServer().start()
+        self.addCleanup(self.server.stop)
+        self.client = FakeMediaServiceClient(self.server.url)
+        for target, value in (
+            ('azure_video_pipeline.utils.get_media_service_client', mock.Mock(return_value=self.client)),
+            ('azure_video_pipeline.media_service.LocatorTypes', mock.Mock(OnDemandOrigin='OnDemandOrigin', SAS='SAS')),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_transient_failures_are_retried(self):
+        self.server.failures = [503, 500]
+
+        info = assets.get_video_asset_info('org', 'video')
+
+        self.assertEqual(info['asset']['Id'], 'asset-video')
+        self.assertEqual(info['locator_sas'], {'Path': '//ams.streaming/SAS/'})
+        self.assertEqual(self.server.requests, 6)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.failures = [404]
+
+        with self.assertRaises(requests.HTTPError):
+            resilience.call_azure('org', 'get_asset_files', self.client.get_asset_files, 'asset', idempotent=True)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_not_idempotent_calls_are_not_retried(self):
+        self.server.failures = [503]
+
+        with self.assertRaises(resilience.AzureServiceError):
+            resilience.call_azure('org', 'get_asset_files', self.client.get_asset_files, 'asset')
+        self.assertEqual(self.server.requests, 1)
+
+    def test_deadline(self):
+        self.server.latency = 2
+        started = default_timer()
+
+        with self.assertRaises(resilience.DeadlineExceeded):
+            assets.get_video_asset_info('org', 'video')
+        self.assertLess(default_timer() - started, 1)
+
+    def test_circuit_breaker(self):
+        self.server.failures = [503] * 3
+        with self.assertRaises(resilience.AzureServiceError):
+            assets.get_video_asset_info('org', 'video')
+
+        # The open circuit rejects calls without contacting Azure, other organizations are not affected:
+        with self.assertRaises(resilience.CircuitOpenError):
+            assets.get_video_asset_info('org', 'video')
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(assets.get_video_asset_info('other_org', 'video')['asset']['Id'], 'asset-video')
+
+        # A trial call closes the circuit once the reset timeout has passed:
+        resilience.get_circuit_breaker('org').opened_at -= 0.2
+        self.assertEqual(assets.get_video_asset_info('org', 'video')['asset']['Id'], 'asset-video')
+        self.assertEqual(resilience.get_circuit_breaker('org').state, resilience.CircuitBreaker.CLOSED)
+
+    def test_failed_trial_call_opens_circuit(self):
+        breaker = resilience.CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        breaker.record_failure()
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.OPEN)
+
+    @mock.patch('edxval.models.Video.objects.get')
+    def test_unavailable_azure_message(self, _video_get):
+        from azure_media_services.ams import AMSXBlock
+
+        block = AMSXBlock(mock.Mock(), mock.Mock(), mock.Mock())
+        block.location = mock.Mock(org='org')
+        self.server.failures = [503] * 3
+
+        result = block.resolve_captions_and_video_info('video')
+
+        self.assertEqual(
+            result['error_message'], 'Azure Media Services is temporarily unavailable, please try again later.'
+        )
+        self.assertEqual(result['video_info'], {})
@@ -0,0 +1,38 @@
+import unittest
+
+import mock
+
+from azure_media_services import resources
+
+
+class ResourcesCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        resources.clear()
+        self.addCleanup(resources.clear)
+
+    @mock.patch('azure_media_services.resources.loader.load_unicode', return_value=u'content')
+    def test_resource_is_loaded_once(self, load_unicode):
+        self.assertEqual(resources.load_resource('static/js/player.js'), u'content')
+        self.assertEqual(resources.load_resource('static/js/player.js'), u'content')
+
+        load_unicode.assert_called_once_with('static/js/player.js')
+
+    @mock.patch(
+        'azure_media_services.resources.loader.load_unicode',
+        return_value=u'{% load i18n %}{{ name }}: {% trans "Save" %}'
+    )
+    def test_template_is_compiled_once(self, load_unicode):
+        template = resources.get_template('templates/template.html')
+
+        self.assertIs(resources.get_template('templates/template.html'), template)
+        self.assertEqual(resources.render_template('templates/template.html', {'name': 'AMS'}), u'AMS: Save')
+        load_unicode.assert_called_once_with('templates/template.html')
+
+    def test_preload(self):
+        resources.preload()
+
+        for path in resources.STUDENT_VIEW_RESOURCES + resources.STUDIO_VIEW_RESOURCES:
+            self.assertIn(path, resources._resources)
+        self.assertIn(resources.STUDENT_VIEW_TEMPLATE, resources._templates)
+        self.assertIn(resources.STUDIO_VIEW_TEMPLATE, resources._templates)
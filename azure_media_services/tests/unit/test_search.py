@@ -0,0 +1,162 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+import mock
+
+from azure_media_services import search, transcripts
+from azure_media_services.ams import AMSXBlock
+
+COURSE_KEY = 'course-v1:org+course+run'
+
+LECTURE = b"""WEBVTT
+
+00:00:01.000 --> 00:00:04.000
+Welcome to the course on distributed systems.
+
+00:00:04.000 --> 00:00:08.000
+Distributed consensus is hard.
+"""
+
+
+def make_block(usage_id, display_name='Lecture', content=LECTURE, captions=None):
+    block = mock.Mock(location=usage_id, display_name=display_name)
+    block.get_captions.return_value = captions or [{'src': '//azure/{}.vtt'.format(usage_id), 'srclang': 'en'}]
+    block.read_transcript.return_value = content
+    return block
+
+
+class TranscriptsSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        transcripts.clear_local_cache()
+        search.clear_local_cache()
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.storage.location)
+        patcher = mock.patch('azure_media_services.search._get_storage', return_value=self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_build_segment(self):
+        segment = search.build_segment('Lecture', {'en': {
+            'start': [1.0, 4.0], 'end': [4.0, 8.0], 'text': ['Hello, hello world', 'World!']
+        }})
+
+        self.assertEqual(segment['languages']['en']['terms'], {'hello': [0], 'world': [0, 1]})
+
+    def test_search(self):
+        search.update_course_index(COURSE_KEY, [make_block('block-1'), make_block('block-2', content=b'WEBVTT\n')])
+
+        self.assertEqual(search.search(COURSE_KEY, 'DISTRIBUTED consensus'), [{
+            'usage_id': 'block-1', 'display_name': 'Lecture', 'language': 'en',
+            'start': 4.0, 'end': 8.0, 'text': 'Distributed consensus is hard.'
+        }])
+        self.assertEqual([match['start'] for match in search.search(COURSE_KEY, 'distributed')], [1.0, 4.0])
+        self.assertEqual(len(search.search(COURSE_KEY, 'distributed', limit=1)), 1)
+        self.assertEqual(search.search(COURSE_KEY, 'distributed', language='uk'), [])
+        self.assertEqual(search.search(COURSE_KEY, 'distributed databases'), [])
+        self.assertEqual(search.search(COURSE_KEY, '...'), [])
+
+    def test_search_accessible_blocks(self):
+        search.update_course_index(COURSE_KEY, [make_block('block-1'), make_block('block-2'), make_block('block-3')])
+        is_accessible = mock.Mock(side_effect=lambda usage_id: usage_id != 'block-1')
+
+        matches = search.search(COURSE_KEY, 'distributed', limit=2, is_accessible=is_accessible)
+
+        self.assertEqual([match['usage_id'] for match in matches], ['block-2', 'block-2'])
+        self.assertEqual(is_accessible.call_args_list, [mock.call('block-1'), mock.call('block-2')])
+
+    def test_incremental_update(self):
+        first, second = make_block('block-1'), make_block('block-2')
+        self.assertEqual(search.update_course_index(COURSE_KEY, [first, second]), 2)
+        self.assertEqual(len(search.search(COURSE_KEY, 'welcome')), 2)
+
+        changed = make_block('block-2', captions=[{'src': '//azure/new.vtt', 'srclang': 'en'}], content=b'WEBVTT\n')
+        self.assertEqual(search.update_course_index(COURSE_KEY, [first, changed]), 1)
+        self.assertEqual(first.read_transcript.call_count, 1)
+        self.assertEqual([match['usage_id'] for match in search.search(COURSE_KEY, 'welcome')], ['block-1'])
+
+        self.assertEqual(search.update_course_index(COURSE_KEY, [changed]), 0)
+        self.assertEqual(search.search(COURSE_KEY, 'welcome'), [])
+        self.assertEqual(len(self.storage.listdir(search._course_dir(COURSE_KEY))[1]), 2)
+
+    @mock.patch('azure_media_services.search.log.exception')
+    def test_not_available_transcript_is_retried(self, _logger):
+        block = make_block('block-1')
+        block.read_transcript.side_effect = IOError()
+
+        self.assertEqual(search.update_course_index(COURSE_KEY, [block]), 0)
+        self.assertEqual(search.read_manifest(COURSE_KEY), {})
+
+    @mock.patch('azure_media_services.search.log.exception')
+    def test_previous_segment_is_kept_if_reindexing_fails(self, _logger):
+        search.update_course_index(COURSE_KEY, [make_block('block-1')])
+        manifest = search.read_manifest(COURSE_KEY)
+        changed = make_block('block-1', captions=[{'src': '//azure/new.vtt', 'srclang': 'en'}])
+        changed.read_transcript.side_effect = IOError()
+
+        self.assertEqual(search.update_course_index(COURSE_KEY, [changed]), 0)
+        self.assertEqual(search.read_manifest(COURSE_KEY), manifest)
+        self.assertEqual(len(search.search(COURSE_KEY, 'welcome')), 1)
+
+    @mock.patch('lms.djangoapps.courseware.access.has_access', side_effect=lambda user, action, block, course_key: (
+        block == 'item-block-1'
+    ))
+    @mock.patch('xmodule.modulestore.django.modulestore')
+    def test_search_handler(self, modulestore, has_access):
+        modulestore.return_value.get_item.side_effect = lambda usage_key: 'item-' + usage_key
+        search.update_course_index(COURSE_KEY, [make_block('block-1'), make_block('block-2'), make_block('block-3')])
+        block = AMSXBlock(mock.Mock(user_id=10), mock.Mock(), mock.Mock())
+        block.location = mock.Mock(org='org_name', course_key=COURSE_KEY, __str__=lambda _self: 'block-3')
+
+        with mock.patch('opaque_keys.edx.keys.UsageKey.from_string', side_effect=lambda usage_id: usage_id):
+            response = block.search_transcripts(mock.Mock(method='POST', body=json.dumps({'query': 'consensus'})))
+        error_response = block.search_transcripts(mock.Mock(method='POST', body=json.dumps({'query': ' '})))
+
+        self.assertEqual(response.json['result'], 'success')
+        # The user can't access block-2 (e.g. it is not released yet), the current block is always accessible:
+        self.assertEqual([match['usage_id'] for match in response.json['matches']], ['block-1', 'block-3'])
+        has_access.assert_called_with(
+            block.runtime.get_real_user.return_value, 'load', 'item-block-2', COURSE_KEY
+        )
+        self.assertEqual(error_response.json['result'], 'error')
+
+    def test_search_handler_invalid_query(self):
+        block = AMSXBlock(mock.Mock(user_id=10), mock.Mock(), mock.Mock())
+        block.location = mock.Mock(org='org_name', course_key=COURSE_KEY)
+
+        for query in (['consensus'], {'text': 'consensus'}, 42):
+            response = block.search_transcripts(mock.Mock(method='POST', body=json.dumps({'query': query})))
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json, {'error': 'Invalid search query'})
+
+    def test_search_handler_of_anonymous_user(self):
+        search.update_course_index(COURSE_KEY, [make_block('block-1'), make_block('block-2')])
+        block = AMSXBlock(mock.Mock(user_id=None), mock.Mock(), mock.Mock())
+        block.location = mock.Mock(org='org_name', course_key=COURSE_KEY, __str__=lambda _self: 'block-2')
+
+        response = block.search_transcripts(mock.Mock(method='POST', body=json.dumps({'query': 'consensus'})))
+
+        self.assertEqual([match['usage_id'] for match in response.json['matches']], ['block-2'])
+
+    @mock.patch('azure_media_services.search.get_indexing_executor')
+    def test_course_published_handler(self, get_indexing_executor):
+        search.course_published_handler(None, COURSE_KEY)
+
+        get_indexing_executor.return_value.submit.assert_called_once_with(
+            search._index_course_in_background, COURSE_KEY
+        )
+
+    @mock.patch('django.db.close_old_connections')
+    @mock.patch('azure_media_services.search.log.exception')
+    @mock.patch('azure_media_services.search.index_course', side_effect=IOError())
+    def test_index_course_in_background(self, index_course, logger, close_old_connections):
+        search._index_course_in_background(COURSE_KEY)
+
+        index_course.assert_called_once_with(COURSE_KEY)
+        self.assertEqual(logger.call_count, 1)
+        close_old_connections.assert_called_once_with()
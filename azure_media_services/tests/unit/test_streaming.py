@@ -0,0 +1,28 @@
+import unittest
+
+from azure_media_services.streaming import get_streaming_sources
+
+MANIFEST_URL = '//ams.streaming.mediaservices.windows.net/locator/video.ism/manifest'
+
+
+class StreamingSourcesTests(unittest.TestCase):
+
+    def test_sources_of_smooth_manifest(self):
+        self.assertEqual(get_streaming_sources(MANIFEST_URL), [
+            {'protocol': 'dash', 'src': MANIFEST_URL + '(format=mpd-time-csf)', 'type': 'application/dash+xml'},
+            {'protocol': 'smooth', 'src': MANIFEST_URL, 'type': 'application/vnd.ms-sstr+xml'},
+            {'protocol': 'hls', 'src': MANIFEST_URL + '(format=m3u8-aapl)', 'type': 'application/vnd.apple.mpegurl'},
+        ])
+
+    def test_sources_of_formatted_manifest_with_query(self):
+        sources = get_streaming_sources(MANIFEST_URL + '(format=m3u8-aapl)?filter=720p', protocols=('smooth', 'dash'))
+
+        self.assertEqual([source['src'] for source in sources], [
+            MANIFEST_URL + '?filter=720p', MANIFEST_URL + '(format=mpd-time-csf)?filter=720p'
+        ])
+
+    def test_sources_of_other_urls(self):
+        self.assertEqual(get_streaming_sources(''), [])
+        self.assertEqual(get_streaming_sources('https://cdn/video.mp4'), [
+            {'protocol': 'smooth', 'src': 'https://cdn/video.mp4', 'type': 'application/vnd.ms-sstr+xml'}
+        ])
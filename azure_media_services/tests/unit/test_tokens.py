@@ -0,0 +1,61 @@
+import base64
+import unittest
+
+from django.core.cache import cache
+import jwt
+import mock
+
+from azure_media_services import tokens
+
+
+class ProtectionTokenTests(unittest.TestCase):
+
+    signing_key = b'signing-key-of-the-content-policy'
+    verification_key = base64.b64encode(signing_key).decode('ascii')
+
+    def setUp(self):
+        cache.clear()
+        tokens.clear_local_cache()
+
+    @mock.patch('azure_media_services.tokens.time.time', return_value=1500000000)
+    def test_issue_token(self, _time):
+        token = tokens.issue_token(42, self.verification_key, 'http://issuer/', 'urn:scope')
+
+        claims = jwt.decode(token['token'], self.signing_key, algorithms=['HS256'], audience='urn:scope', options={
+            'verify_exp': False, 'verify_nbf': False
+        })
+        self.assertEqual(claims, {
+            'iss': 'http://issuer/', 'aud': 'urn:scope', 'sub': '42',
+            'nbf': 1500000000 - tokens.TOKEN_CLOCK_SKEW, 'exp': 1500000000 + tokens.DEFAULT_TOKEN_LIFETIME,
+        })
+        self.assertEqual(token['expires_at'], 1500000000 + tokens.DEFAULT_TOKEN_LIFETIME)
+
+    def test_invalid_verification_key(self):
+        with self.assertRaises(ValueError):
+            tokens.issue_token(42, 'not base64!', 'http://issuer/', 'urn:scope')
+
+    @mock.patch('azure_media_services.tokens.issue_token', wraps=tokens.issue_token)
+    def test_token_is_cached_per_user(self, issue_token):
+        first = tokens.get_protection_token(1, self.verification_key, 'http://issuer/', 'urn:scope')
+        self.assertEqual(tokens.get_protection_token(1, self.verification_key, 'http://issuer/', 'urn:scope'), first)
+        tokens.get_protection_token(2, self.verification_key, 'http://issuer/', 'urn:scope')
+
+        self.assertEqual(issue_token.call_count, 2)
+        self.assertEqual(first['refresh_in'], tokens.DEFAULT_TOKEN_LIFETIME - tokens.TOKEN_REFRESH_MARGIN)
+
+    @mock.patch('azure_media_services.tokens.issue_token', wraps=tokens.issue_token)
+    def test_token_is_replaced_before_expiration(self, issue_token):
+        with mock.patch('azure_media_services.tokens.time.time', return_value=1500000000):
+            first = tokens.get_protection_token(1, self.verification_key, 'http://issuer/', 'urn:scope')
+        tokens.clear_local_cache()
+        expiring_at = first['expires_at'] - tokens.TOKEN_REFRESH_MARGIN
+        # Shared cache entry outlived its TTL (e.g. a cache without expiration):
+        with mock.patch('azure_media_services.tokens.get_django_cache') as get_django_cache:
+            get_django_cache.return_value.get.return_value = {
+                'token': first['token'], 'expires_at': first['expires_at']
+            }
+            with mock.patch('azure_media_services.tokens.time.time', return_value=expiring_at):
+                second = tokens.get_protection_token(1, self.verification_key, 'http://issuer/', 'urn:scope')
+
+        self.assertEqual(issue_token.call_count, 2)
+        self.assertGreater(second['expires_at'], first['expires_at'])
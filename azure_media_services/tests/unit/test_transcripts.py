@@ -0,0 +1,148 @@
+import hashlib
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+import mock
+import requests
+
+from azure_media_services import transcripts
+
+
+class FetchTranscriptContentTests(unittest.TestCase):
+
+    url = 'https://account.blob.core.windows.net/asset/transcript_en.vtt?sv=2012-02-12&sig=signature'
+
+    def setUp(self):
+        cache.clear()
+        transcripts.clear_local_cache()
+        patcher = mock.patch('azure_media_services.transcripts.get_http_session')
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            transcripts.normalize_url('//Account.BLOB.core.windows.net/asset/t.vtt?sig=s&sv=1#cue'),
+            'https://account.blob.core.windows.net/asset/t.vtt?sig=s&sv=1'
+        )
+        self.assertEqual(
+            transcripts.transcript_cache_key('HTTPS://account.blob.core.windows.net/a.vtt?b=2&a=1', 'en'),
+            transcripts.transcript_cache_key('https://account.blob.core.windows.net/a.vtt?a=1&b=2', 'en')
+        )
+
+    def test_local_cache_size_is_read_on_first_use(self):
+        with mock.patch.dict('azure_media_services.cache._local_caches', clear=True):
+            with override_settings(AZURE_MEDIA_SERVICES={'TRANSCRIPT_CACHE_MAX_ENTRIES': 3}):
+                local_cache = transcripts._get_local_cache()
+            self.assertEqual(local_cache.max_entries, 3)
+            self.assertIs(transcripts._get_local_cache(), local_cache)
+            self.assertIsNot(transcripts._get_local_cues_cache(), local_cache)
+
+    def test_fetch_is_cached(self):
+        self.session.get.return_value = mock.Mock(status_code=200, content='WEBVTT', headers={})
+
+        self.assertEqual(transcripts.fetch_transcript_content(self.url, 'en'), 'WEBVTT')
+        self.assertEqual(transcripts.fetch_transcript_content(self.url, 'en'), 'WEBVTT')
+
+        self.session.get.assert_called_once_with(self.url, headers={}, timeout=transcripts.DEFAULT_HTTP_TIMEOUT)
+
+    def test_shared_cache_is_used_when_local_is_empty(self):
+        self.session.get.return_value = mock.Mock(status_code=200, content='WEBVTT', headers={})
+        transcripts.fetch_transcript_content(self.url, 'en')
+        transcripts.clear_local_cache()
+
+        self.assertEqual(transcripts.fetch_transcript_content(self.url, 'en'), 'WEBVTT')
+        self.assertEqual(self.session.get.call_count, 1)
+
+    @mock.patch('azure_media_services.transcripts.time.time')
+    def test_outdated_entry_is_revalidated(self, time_mock):
+        time_mock.return_value = 1000
+        self.session.get.return_value = mock.Mock(
+            status_code=200, content='WEBVTT', headers={'ETag': '"0x8D"', 'Last-Modified': 'Wed, 01 Aug 2018'}
+        )
+        transcripts.fetch_transcript_content(self.url, 'en')
+
+        time_mock.return_value = 1000 + transcripts.DEFAULT_TRANSCRIPT_CACHE_TTL
+        self.session.get.return_value = mock.Mock(status_code=304, content='', headers={})
+
+        self.assertEqual(transcripts.fetch_transcript_content(self.url, 'en'), 'WEBVTT')
+        self.session.get.assert_called_with(
+            self.url,
+            headers={'If-None-Match': '"0x8D"', 'If-Modified-Since': 'Wed, 01 Aug 2018'},
+            timeout=transcripts.DEFAULT_HTTP_TIMEOUT
+        )
+
+        # Revalidated entry is fresh again:
+        self.assertEqual(transcripts.fetch_transcript_content(self.url, 'en'), 'WEBVTT')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_failed_fetch_is_not_cached(self):
+        self.session.get.return_value = mock.Mock(
+            status_code=403, raise_for_status=mock.Mock(side_effect=requests.HTTPError())
+        )
+
+        with self.assertRaises(requests.RequestException):
+            transcripts.fetch_transcript_content(self.url, 'en')
+        with self.assertRaises(requests.RequestException):
+            transcripts.fetch_transcript_content(self.url, 'en')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    @mock.patch('azure_media_services.transcripts.parse_transcript', return_value={'start': [], 'end': [], 'text': []})
+    def test_cues_are_parsed_once_per_content(self, parse_transcript_mock):
+        self.session.get.return_value = mock.Mock(status_code=200, content='WEBVTT', headers={})
+
+        cues = transcripts.fetch_transcript_cues(self.url, 'en')
+        transcripts.clear_local_cache()
+
+        self.assertEqual(transcripts.fetch_transcript_cues(self.url, 'en'), cues)
+        parse_transcript_mock.assert_called_once_with('WEBVTT')
+
+
+@mock.patch('azure_media_services.transcripts._get_storage')
+@mock.patch('azure_media_services.transcripts.fetch_transcript_content', return_value='WEBVTT\r\n')
+class StoredTranscriptsTests(unittest.TestCase):
+
+    def setUp(self):
+        transcripts.clear_local_cache()
+
+    def test_store_transcript(self, fetch_transcript_content, get_storage):
+        storage = get_storage.return_value
+        storage.exists.return_value = False
+        storage.save.side_effect = lambda name, content: name
+
+        name = transcripts.store_transcript('//host/en.vtt', 'en')
+
+        fetch_transcript_content.assert_called_once_with('//host/en.vtt', 'en')
+        self.assertEqual(name, 'azure_media_services/transcripts/{}.vtt'.format(hashlib.sha1(b'WEBVTT\n').hexdigest()))
+        self.assertEqual(storage.save.call_args[0][1].read(), b'WEBVTT\n')
+
+    def test_same_content_is_stored_once(self, _fetch_transcript_content, get_storage):
+        storage = get_storage.return_value
+        storage.exists.return_value = True
+
+        transcripts.store_transcript('//host/en.vtt', 'en')
+
+        storage.save.assert_not_called()
+
+    def test_read_stored_transcript_is_cached(self, _fetch_transcript_content, get_storage):
+        get_storage.return_value.open.return_value.read.return_value = 'WEBVTT'
+
+        self.assertEqual(transcripts.read_stored_transcript('name.vtt'), 'WEBVTT')
+        self.assertEqual(transcripts.read_stored_transcript('name.vtt'), 'WEBVTT')
+
+        get_storage.return_value.open.assert_called_once_with('name.vtt')
+
+    def test_stored_transcript_exists_is_cached(self, _fetch_transcript_content, get_storage):
+        get_storage.return_value.exists.return_value = False
+
+        self.assertFalse(transcripts.stored_transcript_exists('name.vtt'))
+        self.assertFalse(transcripts.stored_transcript_exists('name.vtt'))
+
+        get_storage.return_value.exists.assert_called_once_with('name.vtt')
+
+    def test_unknown_format_is_not_stored(self, fetch_transcript_content, get_storage):
+        fetch_transcript_content.return_value = '<tt xmlns="http://www.w3.org/ns/ttml"><body/></tt>'
+
+        with self.assertRaises(ValueError):
+            transcripts.store_transcript('//host/en.ttml', 'en')
+        get_storage.return_value.save.assert_not_called()
@@ -0,0 +1,81 @@
+import unittest
+
+import mock
+import requests
+from six import StringIO
+
+from azure_media_services import warmup
+from azure_media_services.management.commands import warm_ams_caches
+
+
+def make_block(edx_video_id='edx_video_id', captions=(), error_message=''):
+    block = mock.Mock(edx_video_id=edx_video_id, captions=list(captions))
+    block.get_stored_transcripts.return_value = {}
+    block.location = mock.Mock(org='org_name')
+    block.resolve_captions_and_video_info.return_value = {'error_message': error_message}
+    return block
+
+
+@mock.patch('azure_media_services.warmup.fetch_transcript_cues')
+class WarmUpTests(unittest.TestCase):
+
+    def test_warm_up(self, fetch_transcript_cues):
+        blocks = [
+            make_block(captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}]),
+            make_block(),
+            make_block('other_video_id', error_message='Target Video is no longer available'),
+        ]
+        on_result = mock.Mock()
+
+        results = warmup.warm_up(blocks, workers=2, rate=0, on_result=on_result)
+
+        # The video shared by blocks is resolved once:
+        self.assertEqual(
+            sum(block.resolve_captions_and_video_info.call_count for block in blocks[:2]), 1
+        )
+        blocks[2].resolve_captions_and_video_info.assert_called_once_with('other_video_id')
+        fetch_transcript_cues.assert_called_once_with('//azure/en.vtt', 'en')
+        self.assertEqual([result.ok for result in results], [True, True, False])
+        self.assertEqual(results[2].errors, ['other_video_id: Target Video is no longer available'])
+        self.assertEqual(on_result.call_count, 3)
+
+    def test_failures_are_reported(self, fetch_transcript_cues):
+        fetch_transcript_cues.side_effect = requests.RequestException('404')
+        block = make_block(captions=[{'src': '//azure/en.vtt', 'srclang': 'en'}])
+        failing_block = make_block('failing_video_id')
+        failing_block.resolve_captions_and_video_info.side_effect = KeyError('Id')
+
+        with mock.patch('azure_media_services.warmup.log.exception'):
+            results = warmup.warm_up([block, failing_block], rate=0)
+
+        self.assertEqual(results[0].errors, ['transcript [en]: 404'])
+        self.assertEqual(results[1].errors, ["KeyError('Id',)"])
+
+    @mock.patch('azure_media_services.management.commands.warm_ams_caches.modulestore')
+    def test_command(self, modulestore, _fetch_transcript_cues):
+        modulestore.return_value.get_course_summaries.return_value = [mock.Mock(id='course_key')]
+        modulestore.return_value.get_items.return_value = [make_block(), make_block('other', error_message='gone')]
+        command = warm_ams_caches.Command(stdout=StringIO(), stderr=StringIO())
+
+        command.handle(course_ids=[], workers=1, rate=0, skip_transcripts=False, search_index=False)
+
+        modulestore.return_value.get_items.assert_called_once_with('course_key', qualifiers={
+            'category': 'azure_media_services'
+        })
+        self.assertIn('Done: 1 blocks warmed up, 1 failed.', command.stdout._out.getvalue())
+        self.assertIn('other: gone', command.stderr._out.getvalue())
+
+
+class RateLimiterTests(unittest.TestCase):
+
+    @mock.patch('azure_media_services.warmup.time.sleep')
+    @mock.patch('azure_media_services.warmup.default_timer', return_value=100.0)
+    def test_acquire_waits_for_tokens(self, default_timer, sleep):
+        limiter = warmup.RateLimiter(rate=2)
+        sleep.side_effect = lambda seconds: setattr(default_timer, 'return_value', default_timer.return_value + seconds)
+
+        limiter.acquire(2)
+        sleep.assert_not_called()
+
+        limiter.acquire()
+        sleep.assert_called_once_with(0.5)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Short-lived JWT tokens of the protected (AES/PlayReady) content.
+
+Tokens are signed with the block verification key (Azure content key policy restriction) and cached
+per user and content key until shortly before they expire, so a token is signed once per its lifetime
+rather than on every page render.
+"""
+import base64
+import binascii
+import hashlib
+import time
+
+from .cache import get_django_cache, get_local_cache, LRUCache, make_cache_key
+from .utils import get_setting
+
+SIGNING_ALGORITHM = 'HS256'
+# Lifetime (seconds) of the issued tokens:
+DEFAULT_TOKEN_LIFETIME = 60 * 60
+# Cached token is replaced with a new one this number of seconds before it expires:
+TOKEN_REFRESH_MARGIN = 5 * 60
+# Allowed clock difference between the LMS and Azure key delivery service:
+TOKEN_CLOCK_SKEW = 5 * 60
+DEFAULT_TOKEN_CACHE_MAX_ENTRIES = 1024
+
+_signing_keys = LRUCache(max_entries=64)
+
+
+def _get_tokens_cache():
+    return get_local_cache('tokens', 'TOKEN_CACHE_MAX_ENTRIES', DEFAULT_TOKEN_CACHE_MAX_ENTRIES)
+
+
+def _key_digest(verification_key):
+    return hashlib.sha256(verification_key.encode('utf-8')).hexdigest()
+
+
+def get_signing_key(verification_key):
+    """
+    Return decoded signing key of the Base64 encoded verification key.
+
+    :raise ValueError: if the verification key is not a valid Base64 string
+    """
+    digest = _key_digest(verification_key)
+    signing_key = _signing_keys.get(digest)
+    if signing_key is None:
+        try:
+            signing_key = base64.b64decode(verification_key)
+        except (TypeError, binascii.Error):
+            raise ValueError("Verification key is not a valid Base64 string")
+        _signing_keys.set(digest, signing_key)
+    return signing_key
+
+
+def issue_token(user_id, verification_key, issuer, scope):
+    """
+    Sign a new token of the user for the content protected with the verification key.
+
+    :return: dict of `token` and `expires_at` (UNIX timestamp)
+    :raise ValueError: if the verification key is invalid
+    """
+    import jwt
+
+    now = int(time.time())
+    claims = {
+        'iss': issuer,
+        'aud': scope,
+        'nbf': now - TOKEN_CLOCK_SKEW,
+        'exp': now + get_setting('TOKEN_LIFETIME', DEFAULT_TOKEN_LIFETIME),
+    }
+    if user_id is not None:
+        claims['sub'] = u'{}'.format(user_id)
+    token = jwt.encode(claims, get_signing_key(verification_key), algorithm=SIGNING_ALGORITHM)
+    if isinstance(token, bytes):
+        token = token.decode('ascii')
+    return {'token': token, 'expires_at': claims['exp']}
+
+
+def get_protection_token(user_id, verification_key, issuer, scope):
+    """
+    Return cached token of the user for the content (see `issue_token`), issuing a new one if it expires soon.
+
+    :return: dict of `token`, `expires_at` (UNIX timestamp) and `refresh_in` (seconds till the token
+        should be replaced)
+    :raise ValueError: if the verification key is invalid
+    """
+    key = make_cache_key('protection_token', user_id, _key_digest(verification_key), issuer, scope)
+    now = int(time.time())
+
+    entry = _get_tokens_cache().get(key)
+    if entry is None:
+        entry = get_django_cache().get(key)
+    if entry is None or entry['expires_at'] - now <= TOKEN_REFRESH_MARGIN:
+        entry = issue_token(user_id, verification_key, issuer, scope)
+        ttl = int(entry['expires_at'] - now - TOKEN_REFRESH_MARGIN)
+        if ttl > 0:
+            get_django_cache().set(key, entry, ttl)
+            _get_tokens_cache().set(key, entry, ttl=ttl)
+    else:
+        _get_tokens_cache().set(key, entry, ttl=int(entry['expires_at'] - now - TOKEN_REFRESH_MARGIN))
+
+    return dict(entry, refresh_in=max(int(entry['expires_at'] - now - TOKEN_REFRESH_MARGIN), 0))
+
+
+def clear_local_cache():
+    _signing_keys.clear()
+    _get_tokens_cache().clear()
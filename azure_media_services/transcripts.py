@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Transcripts fetching from Azure storage through a pooled HTTP session and a revalidating content cache.
+
+Selected transcripts can also be copied (normalized to WebVTT) into Django default storage under
+content-hashed names, so learners are served from our own storage instead of Azure.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+
+from six.moves.urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from . import metrics
+from .cache import get_django_cache, get_local_cache, make_cache_key
+from .parsers import normalize_to_webvtt, parse_transcript
+from .utils import get_setting
+
+log = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds for outbound transcript requests.
+DEFAULT_HTTP_TIMEOUT = (3.05, 10)
+DEFAULT_HTTP_POOL_SIZE = 10
+# Period (seconds) the cached transcript is served without contacting Azure storage.
+DEFAULT_TRANSCRIPT_CACHE_TTL = 60 * 60
+# Period (seconds) the stale transcript is kept to be revalidated with a conditional GET.
+DEFAULT_TRANSCRIPT_CACHE_STALE_TTL = 24 * 60 * 60
+DEFAULT_TRANSCRIPT_CACHE_MAX_ENTRIES = 256
+STORED_TRANSCRIPTS_DIR = 'azure_media_services/transcripts'
+TRANSCRIPT_CHUNK_SIZE = 64 * 1024
+# Content types of the transcripts stored in Azure with a generic content type, by file extension:
+TRANSCRIPT_CONTENT_TYPES = {
+    '.vtt': 'text/vtt',
+    '.ttml': 'application/ttml+xml',
+    '.dfxp': 'application/ttml+xml',
+    '.xml': 'application/ttml+xml',
+}
+GENERIC_CONTENT_TYPES = ('', 'application/octet-stream', 'binary/octet-stream')
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Return module-level HTTP session which keeps connections to Azure storage alive between requests.
+    """
+    global _http_session
+
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with _http_session_lock:
+            if _http_session is None:
+                pool_size = get_setting('HTTP_POOL_SIZE', DEFAULT_HTTP_POOL_SIZE)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def _get_local_cache():
+    return get_local_cache('transcripts', 'TRANSCRIPT_CACHE_MAX_ENTRIES', DEFAULT_TRANSCRIPT_CACHE_MAX_ENTRIES)
+
+
+def _get_local_cues_cache():
+    return get_local_cache('transcripts_cues', 'TRANSCRIPT_CACHE_MAX_ENTRIES', DEFAULT_TRANSCRIPT_CACHE_MAX_ENTRIES)
+
+
+def get_http_timeout():
+    return tuple(get_setting('HTTP_TIMEOUT', DEFAULT_HTTP_TIMEOUT))
+
+
+def normalize_url(url):
+    """
+    Normalize transcript URL so that equivalent URLs share the same cache entry.
+
+    Scheme and host are lower-cased, protocol-relative URLs are treated as `https` ones
+    and query parameters (SAS token parts) are sorted.
+    """
+    if url.startswith('//'):
+        url = 'https:' + url
+    scheme, netloc, path, query, _fragment = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme.lower(), netloc.lower(), path, query, ''))
+
+
+def _request_url(url):
+    # Captions sources are usually stored protocol-relative (see `AMSXBlock.drop_http_or_https`):
+    return 'https:' + url if url.startswith('//') else url
+
+
+def transcript_cache_key(url, language):
+    return make_cache_key('transcript', normalize_url(url), language)
+
+
+def _get_cached_entry(key):
+    entry = _get_local_cache().get(key)
+    if entry is None:
+        entry = get_django_cache().get(key)
+        if entry is not None:
+            _get_local_cache().set(key, entry)
+    return entry
+
+
+def _set_cached_entry(key, entry):
+    stale_ttl = get_setting('TRANSCRIPT_CACHE_STALE_TTL', DEFAULT_TRANSCRIPT_CACHE_STALE_TTL)
+    _get_local_cache().set(key, entry, ttl=stale_ttl)
+    get_django_cache().set(key, entry, stale_ttl)
+
+
+def fetch_transcript_content(url, language):
+    """
+    Return transcript content, fetching it from Azure storage only if the cached copy is outdated.
+
+    Outdated copies are revalidated with a conditional GET (`ETag`/`Last-Modified`), so unchanged
+    transcripts are not downloaded again.
+
+    :param url: transcript URL (SAS URL to the Azure storage blob)
+    :param language: transcript language code
+    :return: transcript's raw content
+    :raise requests.RequestException: if the transcript can't be fetched
+    """
+    key = transcript_cache_key(url, language)
+    entry = _get_cached_entry(key)
+    now = time.time()
+
+    if entry is not None and now - entry['fetched_at'] < get_setting(
+            'TRANSCRIPT_CACHE_TTL', DEFAULT_TRANSCRIPT_CACHE_TTL
+    ):
+        metrics.increment('cache', cache='transcript', result='hit')
+        metrics.label(cache='hit')
+        return entry['content']
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    with metrics.timed('http.transcript', language=language) as timer:
+        response = get_http_session().get(_request_url(url), headers=headers, timeout=get_http_timeout())
+        timer.label(status=response.status_code)
+
+    if entry is not None and response.status_code == 304:
+        log.debug("Transcript is not modified: language [%s]", language)
+        result = 'revalidated'
+        entry = dict(entry, fetched_at=now)
+    else:
+        response.raise_for_status()
+        entry = {
+            'content': response.content,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': now,
+        }
+        result = 'miss'
+
+    metrics.increment('cache', cache='transcript', result=result)
+    metrics.label(cache=result)
+    _set_cached_entry(key, entry)
+    return entry['content']
+
+
+def open_transcript_stream(url, language, headers=None):
+    """
+    Send GET request of the transcript without reading its body; the caller must close the response.
+
+    :param headers: request headers (e.g. `Range`, `If-None-Match` of the client request)
+    :return: `requests` response streaming the transcript (see `iter_transcript_stream`)
+    :raise requests.RequestException: if the transcript source can't be connected
+    """
+    with metrics.timed('http.transcript', language=language, stream=True) as timer:
+        response = get_http_session().get(
+            _request_url(url), headers=headers or {}, timeout=get_http_timeout(), stream=True
+        )
+        timer.label(status=response.status_code)
+    return response
+
+
+def iter_transcript_stream(response, chunk_size=TRANSCRIPT_CHUNK_SIZE):
+    """
+    Yield the streamed transcript body in chunks, closing the response at the end (or when the consumer stops).
+    """
+    try:
+        for chunk in response.iter_content(chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+def iter_gzip(chunks, level=6):
+    """
+    Compress chunks into a gzip stream on the fly.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def get_transcript_content_type(url, content_type):
+    """
+    Return content type of the transcript: the source one unless it is generic, then - by the file extension.
+    """
+    if (content_type or '').split(';')[0].strip().lower() not in GENERIC_CONTENT_TYPES:
+        return content_type
+    extension = os.path.splitext(urlsplit(url).path)[1].lower()
+    return TRANSCRIPT_CONTENT_TYPES.get(extension, 'text/plain')
+
+
+def get_transcript_cues(content):
+    """
+    Return transcript content parsed into compact cues (see `parsers.parse_transcript`).
+
+    Parsed cues are cached by the transcript content digest, so a transcript is parsed
+    once per its content change.
+
+    :raise ValueError: if the transcript can't be parsed
+    """
+    key = make_cache_key('transcript_cues', hashlib.md5(content).hexdigest())
+
+    cues = _get_local_cues_cache().get(key)
+    if cues is None:
+        cues = get_django_cache().get(key)
+        if cues is None:
+            cues = parse_transcript(content)
+            get_django_cache().set(
+                key, cues, get_setting('TRANSCRIPT_CACHE_STALE_TTL', DEFAULT_TRANSCRIPT_CACHE_STALE_TTL)
+            )
+        _get_local_cues_cache().set(key, cues)
+    return cues
+
+
+def fetch_transcript_cues(url, language):
+    """
+    Return fetched transcript parsed into compact cues.
+
+    :raise requests.RequestException: if the transcript can't be fetched
+    :raise ValueError: if the transcript can't be parsed
+    """
+    return get_transcript_cues(fetch_transcript_content(url, language))
+
+
+def _get_storage():
+    from django.core.files.storage import default_storage
+
+    return default_storage
+
+
+def store_transcript(url, language):
+    """
+    Fetch the transcript, normalize it to WebVTT and save it into Django default storage.
+
+    The stored file name is the content digest, so the file never changes and can be cached
+    by browsers and CDN without expiration; the same content is stored once.
+
+    :return: storage name of the stored transcript
+    :raise requests.RequestException: if the transcript can't be fetched
+    :raise ValueError: if the transcript can't be parsed
+    :raise IOError: if the transcript can't be saved
+    """
+    from django.core.files.base import ContentFile
+
+    content = normalize_to_webvtt(fetch_transcript_content(url, language))
+    name = '{}/{}.vtt'.format(STORED_TRANSCRIPTS_DIR, hashlib.sha1(content).hexdigest())
+    storage = _get_storage()
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(content))
+    _get_local_cache().set(make_cache_key('stored_transcript_exists', name), True)
+    return name
+
+
+def stored_transcript_exists(name):
+    """
+    Check if the stored transcript copy is in the storage.
+
+    Stored copies are never deleted, so the result is kept in memory for `TRANSCRIPT_CACHE_TTL` seconds.
+    """
+    key = make_cache_key('stored_transcript_exists', name)
+    exists = _get_local_cache().get(key)
+    if exists is None:
+        exists = _get_storage().exists(name)
+        _get_local_cache().set(key, exists, ttl=get_setting('TRANSCRIPT_CACHE_TTL', DEFAULT_TRANSCRIPT_CACHE_TTL))
+    return exists
+
+
+def stored_transcript_url(name):
+    return _get_storage().url(name)
+
+
+def read_stored_transcript(name):
+    """
+    Return content of the stored transcript; stored transcripts never change, so the content is kept in memory.
+
+    :raise IOError: if the transcript can't be read
+    """
+    key = make_cache_key('stored_transcript', name)
+    content = _get_local_cache().get(key)
+    if content is None:
+        stored_file = _get_storage().open(name)
+        try:
+            content = stored_file.read()
+        finally:
+            stored_file.close()
+        _get_local_cache().set(key, content)
+    return content
+
+
+def clear_local_cache():
+    """
+    Drop process-local transcripts caches (Django cache entries are left intact).
+    """
+    _get_local_cache().clear()
+    _get_local_cues_cache().clear()
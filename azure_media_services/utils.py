@@ -4,6 +4,10 @@ Copyright (c) Microsoft Corporation. All Rights Reserved.
 
 Licensed under the MIT license. See LICENSE file on the project webpage for details.
 """
+import base64
+import json
+import pkgutil
+import sys
 
 
 def _(text):
@@ -22,3 +26,38 @@ class AssetsMode(object):
     amp = "amp"
     combined = "combined"
     off = "off"
+
+
+def get_setting(name, default=None):
+    """
+    Return the xBlock setting value from Django `AZURE_MEDIA_SERVICES` settings dict.
+    """
+    from django.conf import settings
+
+    return getattr(settings, 'AZURE_MEDIA_SERVICES', {}).get(name, default)
+
+
+def encode_cursor(*values):
+    """
+    Encode keyset pagination position (values of the ordering fields of the last item) into opaque string.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode keyset pagination position encoded with `encode_cursor`.
+
+    :raise ValueError: if cursor is malformed
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+    except (TypeError, UnicodeError) as error:
+        raise ValueError("Malformed cursor: {}".format(error))
+
+
+def azure_video_pipeline_installed():
+    """
+    Check if `azure_video_pipeline` app is installed, without importing it.
+    """
+    return 'azure_video_pipeline' in sys.modules or pkgutil.find_loader('azure_video_pipeline') is not None
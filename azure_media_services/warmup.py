@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) Microsoft Corporation. All Rights Reserved.
+
+Licensed under the MIT license. See LICENSE file on the project webpage for details.
+
+Cache warm-up of AMS xBlocks: Azure asset lookups and transcripts are resolved in advance
+(e.g. after a course import or a cache flush), so the first learners and authors don't pay for them.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from timeit import default_timer
+
+from django.db import connections
+
+from .transcripts import fetch_transcript_cues
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WARMUP_WORKERS = 4
+# Azure requests per second:
+DEFAULT_WARMUP_RATE = 10
+# Azure Media Services lookups needed to resolve a video (asset, two locators and asset files):
+VIDEO_LOOKUPS = 4
+
+
+class RateLimiter(object):
+    """
+    Thread-safe token bucket: `acquire` blocks until the requested number of calls is allowed.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Allow `rate` calls per second on average and up to `burst` calls at once (`rate` by default).
+
+        Rate 0 disables limiting.
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = default_timer()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if self.rate <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = default_timer()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class WarmUpResult(object):
+    """
+    Outcome of a single block warm-up.
+    """
+
+    def __init__(self, block, errors):
+        """
+        Keep the block location and the list of failure messages (empty on success).
+        """
+        self.location = block.location
+        self.edx_video_id = block.edx_video_id
+        self.errors = errors
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def warm_up_block(block, limiter, resolve_video=True, with_transcripts=True):
+    """
+    Resolve the block video info and captions and fetch its transcripts, filling the caches.
+
+    :param limiter: `RateLimiter` of Azure requests
+    :param resolve_video: False if the block video is resolved by another block
+    :return: `WarmUpResult`
+    """
+    errors = []
+    try:
+        if resolve_video and block.edx_video_id:
+            limiter.acquire(VIDEO_LOOKUPS)
+            error_message = block.resolve_captions_and_video_info(block.edx_video_id)['error_message']
+            if error_message:
+                errors.append(u'{}: {}'.format(block.edx_video_id, error_message))
+
+        if with_transcripts:
+            stored_transcripts = block.get_stored_transcripts()
+            for caption in block.captions:
+                if not caption.get('src') or caption['src'] in stored_transcripts:
+                    continue
+                limiter.acquire()
+                try:
+                    fetch_transcript_cues(caption['src'], caption.get('srclang'))
+                except (IOError, ValueError) as error:
+                    errors.append(u'transcript [{}]: {}'.format(caption.get('srclang'), error))
+    except Exception as error:
+        log.exception("Cache warm-up failure: %s", block.location)
+        errors.append(u'{!r}'.format(error))
+    finally:
+        # Database connections are per thread, they are not reused by other workers:
+        connections.close_all()
+    return WarmUpResult(block, errors)
+
+
+def warm_up(blocks, workers=DEFAULT_WARMUP_WORKERS, rate=DEFAULT_WARMUP_RATE, with_transcripts=True,
+            on_result=None):
+    """
+    Warm up caches of the blocks on a pool of `workers` threads, limiting Azure requests to `rate` per second.
+
+    Blocks referring the same video resolve it once.
+
+    :param on_result: callback called with each `WarmUpResult` as soon as it is ready
+    :return: list of `WarmUpResult`
+    """
+    limiter = RateLimiter(rate)
+    resolved_videos = set()
+    lock = threading.Lock()
+
+    def warm(block):
+        video_key = (block.location.org, block.edx_video_id)
+        with lock:
+            resolve_video = video_key not in resolved_videos
+            resolved_videos.add(video_key)
+        result = warm_up_block(block, limiter, resolve_video, with_transcripts)
+        if on_result:
+            with lock:
+                on_result(result)
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        return list(executor.map(warm, blocks))
+    finally:
+        executor.shutdown()
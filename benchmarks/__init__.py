@@ -0,0 +1,6 @@
+"""
+Offline benchmarks of the Azure Media Services xBlock.
+
+Importing the package applies the test settings: stubs of edx-platform modules and Django configuration.
+"""
+import azure_media_services.tests  # noqa: F401
@@ -0,0 +1,88 @@
+"""
+Import time of the xBlock package and the modules it pulls in eagerly.
+
+Every import is measured in a fresh interpreter with minimal Django settings and without the test stubs,
+so heavy and optional dependencies (edx-platform, `azure_video_pipeline`, requests, PyJWT) must not be
+imported until they are used. Exits with 1 if any of them is imported eagerly.
+
+On Python 3.7+ the slowest imports reported by `python -X importtime` are also printed.
+
+Usage: python -m benchmarks.bench_import [repeat]
+"""
+from __future__ import print_function
+
+import json
+import subprocess
+import sys
+
+MODULES = ('azure_media_services', 'azure_media_services.ams')
+LAZY_DEPENDENCIES = ('azure_video_pipeline', 'edxval', 'jwt', 'lms', 'mock', 'requests', 'util', 'xmodule')
+TOP_IMPORTS = 10
+
+PROBE = """
+import json, sys, time
+from django.conf import settings
+settings.configure()
+import django
+django.setup()
+before = set(sys.modules)
+start = time.time()
+__import__({module!r})
+elapsed = time.time() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    rss = None
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(set(sys.modules) - before), 'rss': rss}}))
+"""
+
+
+def probe(module):
+    output = subprocess.check_output([sys.executable, '-c', PROBE.format(module=module)])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def importtime(module, top=TOP_IMPORTS):
+    """
+    Return the slowest (cumulative) imports of the module as [(microseconds, module name)].
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    _, stderr = process.communicate()
+    timings = []
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings.append((int(cumulative), name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def eager_dependencies(modules):
+    return sorted({name.split('.')[0] for name in modules} & set(LAZY_DEPENDENCIES))
+
+
+def main(repeat=5):
+    failed = False
+    for module in MODULES:
+        results = [probe(module) for _ in range(repeat)]
+        elapsed = min(result['elapsed'] for result in results)
+        loaded = results[0]['modules']
+        print('{:<28} {:8.1f} ms  {:4d} new modules  max RSS {} KB'.format(
+            module, 1000.0 * elapsed, len(loaded), results[0]['rss']
+        ))
+        eager = eager_dependencies(loaded)
+        if eager:
+            failed = True
+            print('  imported eagerly: {}'.format(', '.join(eager)))
+        if sys.version_info >= (3, 7):
+            for cumulative, name in importtime(module):
+                print('  {:8.1f} ms  {}'.format(cumulative / 1000.0, name))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:2]]))
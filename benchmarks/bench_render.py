@@ -0,0 +1,40 @@
+"""
+Per-render time of AMSXBlock views with and without the process-wide resources cache.
+
+Usage: python -m benchmarks.bench_render [iterations]
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+import mock
+
+from azure_media_services import resources
+from azure_media_services.ams import AMSXBlock
+from .fixtures import make_block
+
+
+def measure(view, iterations, cold):
+    setup = resources.clear if cold else resources.preload
+    timings = timeit.repeat(view, setup=setup, repeat=iterations, number=1)
+    return 1000.0 * sum(timings) / len(timings)
+
+
+def main(iterations):
+    block = make_block()
+    views = (
+        ('student_view', lambda: block.student_view({})),
+        ('studio_view', lambda: block.studio_view({})),
+    )
+    with mock.patch.object(AMSXBlock, 'get_embed_url', return_value=None), \
+            mock.patch('azure_video_pipeline.utils.get_azure_config', return_value={}):
+        print('{:<14}{:>18}{:>18}'.format('view', 'uncached, ms', 'cached, ms'))
+        for name, view in views:
+            print('{:<14}{:>18.3f}{:>18.3f}'.format(
+                name, measure(view, iterations, cold=True), measure(view, iterations, cold=False)
+            ))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,162 @@
+"""
+Offline stand-ins for the xBlock dependencies used by benchmarks.
+
+The xBlock runtime is mocked and edx modules are stubbed by `azure_media_services.tests`; Azure Media Services
+is replaced with a fake client with configurable latency and Azure storage - with a local HTTP server.
+"""
+from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+
+import mock
+from six.moves import BaseHTTPServer, socketserver
+from xblock.field_data import DictFieldData
+
+from azure_media_services.ams import AMSXBlock
+
+VIDEO_URL = '//ams.streaming.mediaservices.windows.net/locator/video.ism/manifest'
+
+
+def make_block(**fields):
+    field_data = {
+        'video_url': VIDEO_URL,
+        'captions': [
+            {'kind': 'subtitles', 'src': '//ams.blob.core.windows.net/asset/en.vtt', 'srclang': 'en', 'label': 'en'}
+        ],
+    }
+    field_data.update(fields)
+    block = AMSXBlock(mock.Mock(), DictFieldData(field_data), mock.Mock())
+    block.location = mock.Mock(org='org_name', course_key='course_key')
+    block.scope_ids = mock.Mock(usage_id='usage_id', user_id=1)
+    return block
+
+
+def make_transcript(cues_count):
+    lines = ['WEBVTT', '']
+    for index in range(cues_count):
+        start = timedelta(seconds=2 * index)
+        end = timedelta(seconds=2 * index + 2)
+        lines += [
+            '{}'.format(index + 1),
+            '0{}.000 --> 0{}.000'.format(start, end),
+            'Cue number {} of the benchmark transcript.'.format(index + 1),
+            '',
+        ]
+    return '\n'.join(lines).encode('utf-8')
+
+
+class FakeMediaServiceClient(object):
+    """
+    Azure Media Services client answering every lookup after `latency` seconds.
+    """
+
+    def __init__(self, latency):
+        """
+        Set the latency of a single lookup.
+        """
+        self.latency = latency
+
+    def get_input_asset_by_video_id(self, edx_video_id, asset_type):
+        time.sleep(self.latency)
+        return {'Id': 'asset-{}'.format(edx_video_id)}
+
+    def get_asset_locators(self, asset_id, locator_type):
+        time.sleep(self.latency)
+        return {
+            'Path': 'https://ams.streaming.mediaservices.windows.net/{}/{}/'.format(asset_id, locator_type),
+            'ExpirationDateTime': (datetime.utcnow() + timedelta(days=365)).strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def get_asset_files(self, asset_id):
+        time.sleep(self.latency)
+        return [{'Name': 'video.mp4', 'ContentFileSize': '1024'}, {'Name': 'en.vtt', 'ContentFileSize': '100'}]
+
+
+class FakeStreamVideos(object):
+    """
+    Minimal queryset of course stream videos: filters are accepted and ignored, so only the handler cost is measured.
+    """
+
+    def __init__(self, count):
+        """
+        Generate `count` videos.
+        """
+        created = datetime(2018, 1, 1)
+        self.rows = [
+            {
+                'edx_video_id': 'edx-video-{:06d}'.format(index),
+                'client_video_id': 'Video {}.mp4'.format(index),
+                'status': 'file_complete',
+                'created': created - timedelta(minutes=index),
+            }
+            for index in range(count)
+        ]
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    def values(self, *fields):
+        return self
+
+    def __getitem__(self, item):
+        return self.rows[item]
+
+
+class _TranscriptRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Response is written with a single send, as Azure storage does, to avoid delayed ACK stalls:
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa: N802
+        content = self.server.content
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/vtt')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+
+class TranscriptServer(object):
+    """
+    Local HTTP server standing in for Azure storage, serves the same transcript at any path.
+    """
+
+    def __init__(self, content):
+        """
+        Bind the server to a free localhost port.
+        """
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _TranscriptRequestHandler)
+        self.httpd.content = content
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
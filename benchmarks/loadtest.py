@@ -0,0 +1,342 @@
+"""
+Load test of the xBlock handlers and the embedded player against a fake Azure Media Services server.
+
+Runs on a single box: the fake AMS server (see `azure_media_services.tests.fake_ams`) serves asset, locator
+and asset files lookups and transcript blobs with the configured latency and error rate from a separate
+process, so that it doesn't compete with the tested code for the GIL.
+
+The driver is open-loop: requests of the operations mix are scheduled at the target rate (Poisson arrivals)
+and run by a pool of workers standing in for the application server threads. Latency is measured from
+the scheduled start, so a saturated pool shows up as growing tail latency rather than as a lower request
+rate. Reports per operation throughput, p50/p95/p99/max latency and errors, workers saturation (busy time
+share, queueing delay, peak backlog) and Azure calls made.
+
+Usage (from the repository root):
+
+    python -m benchmarks.loadtest --rps 200 --duration 30 --workers 16 --azure-latency 0.05 --error-rate 0.01
+"""
+from __future__ import division, print_function
+
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+import multiprocessing
+import random
+import sys
+import time
+from timeit import default_timer
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+import mock
+
+from azure_media_services import metrics, resilience
+from azure_media_services.ams import _embed_player, AMSXBlock
+from azure_media_services.tests.fake_ams import FakeAMSServer, FakeMediaServiceClient
+from . import fixtures, runner
+from .suite import clear_caches, handler_request
+
+TRANSCRIPT_CUES_COUNT = 1500
+COURSE_KEY = 'course-v1:org+course+run'
+DEFAULT_MIX = 'get_captions_and_video_info=2,fetch_transcript=3,publish_event=10,embed_player=1'
+
+
+class UsageKey(str):
+
+    course_key = COURSE_KEY
+
+    def replace(self, **kwargs):
+        return self
+
+
+class AnonymousUser(object):
+
+    def is_authenticated(self):
+        return False
+
+
+class FakeModulestore(object):
+
+    def __init__(self, share):
+        """
+        Serve every block with the given share setting (not protected).
+
+        Settings cached by the embedded player are plain values, as they must be picklable.
+        """
+        self.block = mock.Mock(share=share, protection_type='')
+
+    def fill_in_run(self, course_key):
+        return course_key
+
+    def get_item(self, usage_key):
+        return self.block
+
+
+def render_xblock(request, usage_key_string, check_if_enrolled=True):
+    block = fixtures.make_block()
+    return HttpResponse(block.student_view({}).content)
+
+
+def _serve_fake_ams(connection, latency, error_rate, transcript):
+    server = FakeAMSServer(latency, error_rate, transcript)
+    connection.send(server.url)
+    server.serve_forever(poll_interval=0.05)
+
+
+@contextmanager
+def fake_ams_process(latency, error_rate, transcript):
+    """
+    Run the fake AMS server in a child process, yield its URL.
+    """
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve_fake_ams, args=(child_connection, latency, error_rate, transcript)
+    )
+    process.daemon = True
+    process.start()
+    try:
+        yield connection.recv()
+    finally:
+        process.terminate()
+        process.join()
+
+
+@contextmanager
+def patched_dependencies(ams_url):
+    """
+    Point the media service client to the fake server, stub edx-platform calls of the tested operations.
+
+    Stubs are plain functions rather than mocks, which would record every call of a long run.
+    """
+    video = object()
+    video_info = {'url': fixtures.VIDEO_URL, 'files': []}
+
+    def get_captions_info(video, path_locator_sas):
+        return [{'download_url': '{}/blobs/en.vtt'.format(ams_url), 'language': 'en'}]
+
+    with mock.patch.object(AMSXBlock, 'get_embed_url', return_value=None), \
+            mock.patch('azure_video_pipeline.utils.get_azure_config', return_value={}), \
+            mock.patch('azure_video_pipeline.utils.get_captions_info', get_captions_info), \
+            mock.patch('azure_video_pipeline.utils.get_video_info', lambda *args: video_info), \
+            mock.patch('azure_video_pipeline.utils.get_media_service_client', lambda org: FakeMediaServiceClient(
+                ams_url
+            )), \
+            mock.patch('azure_video_pipeline.media_service.LocatorTypes') as locator_types, \
+            mock.patch('edxval.models.Video') as video_model, \
+            mock.patch('lms.djangoapps.courseware.views.views.render_xblock', render_xblock), \
+            mock.patch('opaque_keys.edx.keys.UsageKey.from_string', UsageKey), \
+            mock.patch('xmodule.modulestore.django.modulestore', lambda store=FakeModulestore('all'): store):
+        video_model.DoesNotExist = type('DoesNotExist', (Exception,), {})
+        video_model.objects.get = lambda **kwargs: video
+        locator_types.OnDemandOrigin, locator_types.SAS = 'OnDemandOrigin', 'SAS'
+        yield
+
+
+def get_operations(ams_url, videos_count):
+    """
+    Return dict of operations by name; an operation makes one request and returns True on success.
+
+    Every request gets its own block instance, as in the LMS, videos are picked at random.
+    """
+    request_factory = RequestFactory()
+
+    def video_id():
+        return 'edx-video-{:06d}'.format(random.randrange(videos_count))
+
+    def get_captions_and_video_info():
+        response = fixtures.make_block().get_captions_and_video_info(handler_request({'edx_video_id': video_id()}))
+        return not response.json['error_message']
+
+    def fetch_transcript():
+        response = fixtures.make_block().fetch_transcript(handler_request({
+            'srcUrl': '{}/blobs/asset-{}/en.vtt'.format(ams_url, video_id()), 'srcLang': 'en'
+        }))
+        return response.json['result'] == 'success'
+
+    def publish_event():
+        response = fixtures.make_block().publish_event(handler_request({
+            'event_type': 'edx.video.position.changed', 'old_time': 10, 'new_time': 20
+        }))
+        return response.json['result'] == 'success'
+
+    def embed_player():
+        usage_key_string = 'block-v1:org+course+run+type@azure_media_services+block@{}'.format(video_id())
+        request = request_factory.get('/embed/{}'.format(usage_key_string))
+        request.user = AnonymousUser()
+        return _embed_player(request, usage_key_string).status_code == 200
+
+    return {
+        'get_captions_and_video_info': get_captions_and_video_info,
+        'fetch_transcript': fetch_transcript,
+        'publish_event': publish_event,
+        'embed_player': embed_player,
+    }
+
+
+def parse_mix(value):
+    """
+    Parse operations mix `name=weight,...` into a list of (name, weight).
+    """
+    mix = []
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+def run_load(operations, mix, rps, duration, workers):
+    """
+    Issue requests at `rps` for `duration` seconds on `workers` threads.
+
+    :return: list of (operation, scheduled, started, finished, error) tuples and the test duration; error is None
+        on success, 'failed' if the operation has reported a failure or the name of the raised exception class
+    """
+    names = [name for name, _ in mix]
+    cumulative_weights = []
+    for _, weight in mix:
+        cumulative_weights.append(weight + (cumulative_weights[-1] if cumulative_weights else 0))
+    records = []
+
+    def call(name, scheduled):
+        started = default_timer()
+        try:
+            error = None if operations[name]() else 'failed'
+        except Exception as exception:  # pylint: disable=broad-except
+            # Exceptions are bugs of the tested code or of the harness rather than handled failures:
+            error = type(exception).__name__
+        records.append((name, scheduled, started, default_timer(), error))
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    start = default_timer()
+    scheduled = start
+    while True:
+        scheduled += random.expovariate(rps)
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - default_timer()
+        if delay > 0:
+            time.sleep(delay)
+        point = random.random() * cumulative_weights[-1]
+        name = next(name for name, weight in zip(names, cumulative_weights) if point < weight)
+        executor.submit(call, name, scheduled)
+    executor.shutdown(wait=True)
+    return records, default_timer() - start
+
+
+def peak(events):
+    """
+    Return max running sum of (time, change) events.
+    """
+    current = highest = 0
+    for _, change in sorted(events):
+        current += change
+        highest = max(highest, current)
+    return highest
+
+
+def summarize_load(records, elapsed, workers):
+    results = {}
+    for name in sorted(set(record[0] for record in records)):
+        selected = [record for record in records if record[0] == name]
+        results[name] = runner.summarize([finished - scheduled for _, scheduled, _, finished, _ in selected], elapsed)
+        results[name]['max'] = 1000 * max(finished - scheduled for _, scheduled, _, finished, _ in selected)
+        results[name]['errors'] = sum(1 for record in selected if record[4] is not None)
+
+    busy = sum(finished - started for _, _, started, finished, _ in records)
+    queue_delays = sorted(started - scheduled for _, scheduled, started, _, _ in records)
+    saturation = {
+        'busy': busy / (workers * elapsed) if elapsed else 0.0,
+        'peak_busy': peak([(started, 1) for _, _, started, _, _ in records] +
+                          [(finished, -1) for _, _, _, finished, _ in records]),
+        'peak_backlog': peak([(scheduled, 1) for _, scheduled, _, _, _ in records] +
+                             [(started, -1) for _, _, started, _, _ in records]),
+        'queue_p50': 1000 * runner.percentile(queue_delays, 50),
+        'queue_p99': 1000 * runner.percentile(queue_delays, 99),
+    }
+    return results, saturation
+
+
+def print_report(records, elapsed, workers, rps, sink):
+    """
+    Print the load test results, return the number of operations which have raised exceptions.
+    """
+    results, saturation = summarize_load(records, elapsed, workers)
+    results['total'] = runner.summarize([finished - scheduled for _, scheduled, _, finished, _ in records], elapsed)
+    results['total']['max'] = max(result['max'] for name, result in results.items() if name != 'total')
+    results['total']['errors'] = sum(result['errors'] for name, result in results.items() if name != 'total')
+
+    print('{:<32}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+        'operation', 'requests', 'req/s', 'errors', 'p50, ms', 'p95, ms', 'p99, ms', 'max, ms'
+    ))
+    for name in sorted(results, key=lambda name: (name == 'total', name)):
+        result = results[name]
+        print('{:<32}{:>10}{:>10.1f}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+            name, result['calls'], result['throughput'], result['errors'],
+            result['p50'], result['p95'], result['p99'], result['max']
+        ))
+    print('\nTarget rate {:.1f} req/s, achieved {:.1f} req/s in {:.1f}s.'.format(
+        rps, results['total']['throughput'], elapsed
+    ))
+    print('Workers: {}, busy {:.1%} of the time, peak {} busy; queueing delay p50 {:.2f} ms, p99 {:.2f} ms, '
+          'peak backlog {} requests.'.format(
+              workers, saturation['busy'], saturation['peak_busy'],
+              saturation['queue_p50'], saturation['queue_p99'], saturation['peak_backlog']
+          ))
+
+    azure_calls = sink.histogram('azure.call')
+    print('Azure calls: {}, p50 {:.2f} ms, p99 {:.2f} ms; {} retries, {} rejected by the circuit breaker.'.format(
+        len(azure_calls), runner.percentile(azure_calls, 50), runner.percentile(azure_calls, 99),
+        sink.count('azure.retry'), sink.count('azure.rejected')
+    ))
+    exceptions = Counter((name, error) for name, _, _, _, error in records if error not in (None, 'failed'))
+    if exceptions:
+        print('Exceptions: {}.'.format(', '.join(
+            '{} {} x{}'.format(name, error, count) for (name, error), count in sorted(exceptions.items())
+        )))
+    hits, misses = sink.count('cache', result='hit'), sink.count('cache', result='miss')
+    if hits + misses:
+        print('Cache hit ratio {:.1%} ({} lookups).'.format(hits / (hits + misses), hits + misses))
+    return sum(exceptions.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--rps', type=float, default=100, help='target request rate, requests per second')
+    parser.add_argument('-d', '--duration', type=float, default=20, help='test duration, seconds')
+    parser.add_argument('-w', '--workers', type=int, default=16, help='concurrent workers (server threads)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='operations weights, name=weight,...')
+    parser.add_argument('--videos', type=int, default=200, help='number of distinct videos requested')
+    parser.add_argument('--azure-latency', type=float, default=0.05, help='fake Azure response latency, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of failed fake Azure responses')
+    parser.add_argument('--seed', type=int, help='random seed of arrivals and operations')
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    # Handled Azure failures are logged on every request:
+    logging.getLogger('azure_media_services').setLevel(logging.CRITICAL)
+    transcript = fixtures.make_transcript(TRANSCRIPT_CUES_COUNT)
+
+    with fake_ams_process(args.azure_latency, args.error_rate, transcript) as ams_url, \
+            patched_dependencies(ams_url):
+        operations = get_operations(ams_url, args.videos)
+        unknown = [name for name, _ in args.mix if name not in operations]
+        if unknown:
+            print('Unknown operations: {}; available: {}.'.format(', '.join(unknown), ', '.join(sorted(operations))))
+            return 2
+
+        clear_caches()
+        resilience.reset_circuit_breakers()
+        sink = metrics.MemorySink()
+        previous_sink = metrics.set_sink(sink)
+        try:
+            records, elapsed = run_load(operations, args.mix, args.rps, args.duration, args.workers)
+        finally:
+            metrics.set_sink(previous_sink)
+    # Operations raising exceptions are broken, so the run fails:
+    return 1 if print_report(records, elapsed, args.workers, args.rps, sink) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
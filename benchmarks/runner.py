@@ -0,0 +1,123 @@
+"""
+Benchmark runner: latency percentiles, throughput and comparison with the stored baseline.
+"""
+from __future__ import division, print_function
+
+import gc
+import json
+import math
+from timeit import default_timer
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of the sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(timings, elapsed):
+    """
+    Summarize per-call timings (seconds) into milliseconds percentiles and calls per second.
+    """
+    timings = sorted(timings)
+    return {
+        'calls': len(timings),
+        'throughput': len(timings) / elapsed if elapsed else 0.0,
+        'p50': 1000 * percentile(timings, 50),
+        'p95': 1000 * percentile(timings, 95),
+        'p99': 1000 * percentile(timings, 99),
+    }
+
+
+def autorange(func, min_time=0.002):
+    """
+    Return the number of calls per sample making the sample last at least `min_time` seconds.
+    """
+    number = 1
+    while True:
+        started = default_timer()
+        for _ in range(number):
+            func()
+        if default_timer() - started >= min_time:
+            return number
+        number *= 2
+
+
+def run(func, iterations, setup=None, number=None, warmup=5, rounds=3):
+    """
+    Take `iterations` timing samples of `func` (after `warmup` calls), return per-call latency summary.
+
+    Each sample times `number` consecutive calls (picked automatically if not given, so fast functions
+    are not dominated by the timer resolution); `setup` runs before each sample and is not timed.
+    Benchmarks of cold paths should pass `number=1` and clear caches in `setup`.
+
+    Measurement is repeated `rounds` times and the round with the lowest median is kept,
+    so that a background load spike does not show up as a regression.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    if number is None:
+        number = autorange(func)
+
+    best = None
+    for _ in range(rounds):
+        gc.collect()
+        timings = []
+        for _ in range(iterations):
+            if setup:
+                setup()
+            started = default_timer()
+            for _ in range(number):
+                func()
+            timings.append((default_timer() - started) / number)
+        result = summarize(timings, sum(timings))
+        result['calls'] *= number
+        if best is None or result['p50'] < best['p50']:
+            best = result
+    return best
+
+
+def print_results(results, baseline=None):
+    print('{:<44}{:>10}{:>12}{:>10}{:>10}{:>10}{:>12}'.format(
+        'benchmark', 'calls', 'calls/s', 'p50, ms', 'p95, ms', 'p99, ms', 'vs p50'
+    ))
+    for name in sorted(results):
+        result = results[name]
+        change = ''
+        if baseline and name in baseline and baseline[name]['p50']:
+            change = '{:+.1%}'.format(result['p50'] / baseline[name]['p50'] - 1)
+        print('{:<44}{:>10}{:>12.1f}{:>10.3f}{:>10.3f}{:>10.3f}{:>12}'.format(
+            name, result['calls'], result['throughput'], result['p50'], result['p95'], result['p99'], change
+        ))
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Return names of the benchmarks whose median latency grew over the baseline by more than `tolerance`.
+
+    Tail percentiles are too noisy between runs to gate on, they are only reported.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        if result['p50'] > expected['p50'] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as baseline_file:
+        json.dump(results, baseline_file, indent=2, sort_keys=True)
@@ -0,0 +1,169 @@
+"""
+Benchmark suite of AMSXBlock render paths and handlers.
+
+Runs offline: the xBlock runtime is mocked, Azure Media Services is faked with a configurable latency
+and transcripts are served by a local HTTP server. Reports throughput and p50/p95/p99 latency per benchmark.
+
+Usage (from the repository root):
+
+    python -m benchmarks.suite --save-baseline   # on the base revision
+    python -m benchmarks.suite --compare         # on the changed revision, exits with 1 on regression
+
+Baselines are machine specific, so both runs should be made on the same machine.
+"""
+from __future__ import print_function
+
+import argparse
+from contextlib import contextmanager
+import json
+import os
+import sys
+
+from django.core.cache import cache
+import mock
+
+from azure_media_services import resources, transcripts
+from azure_media_services.ams import AMSXBlock
+from . import fixtures, runner
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_TOLERANCE = 0.2
+STREAM_VIDEOS_COUNT = 5000
+TRANSCRIPT_CUES_COUNT = 1500
+EVENTS_BATCH_SIZE = 50
+
+
+def handler_request(data):
+    return mock.Mock(method='POST', body=json.dumps(data))
+
+
+@contextmanager
+def patched_dependencies(azure_latency):
+    client = fixtures.FakeMediaServiceClient(azure_latency)
+    video_info = {'url': fixtures.VIDEO_URL, 'files': []}
+    with mock.patch.object(AMSXBlock, 'get_embed_url', return_value=None), \
+            mock.patch('azure_video_pipeline.utils.get_azure_config', return_value={}), \
+            mock.patch('azure_video_pipeline.utils.get_captions_info', return_value=[]), \
+            mock.patch('azure_video_pipeline.utils.get_video_info', return_value=video_info), \
+            mock.patch('edxval.models.Video') as video_model, \
+            mock.patch('azure_video_pipeline.utils.get_media_service_client', return_value=client), \
+            mock.patch('azure_video_pipeline.media_service.LocatorTypes') as locator_types:
+        video_model.DoesNotExist = type('DoesNotExist', (Exception,), {})
+        locator_types.OnDemandOrigin, locator_types.SAS = 2, 1
+        yield
+
+
+def clear_caches():
+    cache.clear()
+    transcripts.clear_local_cache()
+
+
+def get_benchmarks(transcript_url):
+    """
+    Return list of (name, function, setup, number) tuples (see `runner.run`).
+    """
+    block = fixtures.make_block()
+
+    def reset_runtime():
+        # Mocked runtime records every call, which would make later calls slower:
+        block.runtime.reset_mock()
+
+    def clear_resources():
+        reset_runtime()
+        resources.clear()
+
+    def clear_all_caches():
+        reset_runtime()
+        clear_caches()
+
+    stream_videos = fixtures.FakeStreamVideos(STREAM_VIDEOS_COUNT)
+    video_request = {'edx_video_id': 'edx-video-000001'}
+    transcript_request = {'srcUrl': transcript_url, 'srcLang': 'en'}
+    events = [
+        {'event_type': 'edx.video.position.changed', 'old_time': index, 'new_time': index + 1}
+        for index in range(EVENTS_BATCH_SIZE)
+    ]
+
+    def stream_videos_page(data):
+        with mock.patch.object(AMSXBlock, 'get_list_stream_videos', return_value=stream_videos):
+            return block.get_stream_videos(handler_request(data))
+
+    return [
+        ('student_view', lambda: block.student_view({}), reset_runtime, None),
+        ('student_view.cold_resources', lambda: block.student_view({}), clear_resources, 1),
+        ('studio_view', lambda: block.studio_view({}), reset_runtime, None),
+        ('_get_context_for_template', lambda: block._get_context_for_template(False), reset_runtime, None),
+        ('get_stream_videos.first_page', lambda: stream_videos_page({}), reset_runtime, None),
+        ('get_stream_videos.max_page', lambda: stream_videos_page(
+            {'page_size': 200, 'search': 'video'}
+        ), reset_runtime, None),
+        ('get_captions_and_video_info.cold', lambda: block.get_captions_and_video_info(
+            handler_request(video_request)
+        ), clear_all_caches, 1),
+        ('get_captions_and_video_info.warm', lambda: block.get_captions_and_video_info(
+            handler_request(video_request)
+        ), reset_runtime, None),
+        ('fetch_transcript.cold', lambda: block.fetch_transcript(
+            handler_request(transcript_request)
+        ), clear_all_caches, 1),
+        ('fetch_transcript.warm', lambda: block.fetch_transcript(
+            handler_request(transcript_request)
+        ), reset_runtime, None),
+        ('fetch_transcript.cues_warm', lambda: block.fetch_transcript(
+            handler_request(dict(transcript_request, format='cues'))
+        ), reset_runtime, None),
+        ('publish_event.single', lambda: block.publish_event(handler_request(events[0])), reset_runtime, None),
+        ('publish_event.batch_{}'.format(EVENTS_BATCH_SIZE), lambda: block.publish_event(
+            handler_request(events)
+        ), reset_runtime, None),
+    ]
+
+
+def run_suite(iterations, rounds, azure_latency, only=None):
+    results = {}
+    content = fixtures.make_transcript(TRANSCRIPT_CUES_COUNT)
+    with fixtures.TranscriptServer(content) as server, patched_dependencies(azure_latency):
+        clear_caches()
+        for name, func, setup, number in get_benchmarks(server.url + '/asset/en.vtt'):
+            if only and only not in name:
+                continue
+            results[name] = runner.run(func, iterations, setup=setup, number=number, rounds=rounds)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-n', '--iterations', type=int, default=200, help='timing samples per benchmark')
+    parser.add_argument('-r', '--rounds', type=int, default=3, help='measurement rounds, the best one is kept')
+    parser.add_argument('--azure-latency', type=float, default=0.02, help='fake Azure lookup latency, seconds')
+    parser.add_argument('-k', dest='only', help='run only benchmarks with this substring in the name')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file path')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='fail if results regressed against the baseline')
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE, help='allowed median latency growth, fraction'
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.iterations, args.rounds, args.azure_latency, args.only)
+    baseline = runner.load_baseline(args.baseline) if os.path.exists(args.baseline) else None
+    runner.print_results(results, baseline)
+
+    if args.save_baseline:
+        runner.save_baseline(args.baseline, results)
+        print('Baseline is saved to {}'.format(args.baseline))
+
+    if args.compare:
+        if baseline is None:
+            print('No baseline at {}, run with --save-baseline first.'.format(args.baseline))
+            return 2
+        regressions = runner.find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressed over {:.0%}: {}'.format(args.tolerance, ', '.join(regressions)))
+            return 1
+        print('No regressions over {:.0%}.'.format(args.tolerance))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
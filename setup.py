@@ -39,14 +39,20 @@ setup(
     install_requires=[
         'PyJWT',
         'bleach',
+        'futures; python_version == "2.7"',
         'mako',
         'requests>=2.9.1,<3.0.0',
+        'six',
         'XBlock>=0.4.10,<2.0.0',
         'xblock-utils>=1.0.2,<=1.0.5',
     ],
+    extras_require={
+        # Minification of the static bundles (see `make bundle`):
+        'bundle': ['rcssmin', 'rjsmin'],
+    },
     entry_points={
         'xblock.v1': [
-            'azure_media_services = azure_media_services:AMSXBlock',
+            'azure_media_services = azure_media_services.ams:AMSXBlock',
         ]
     },
     package_data=package_data("azure_media_services", ["static", "templates", "public", "translations"]),